@@ -0,0 +1,241 @@
+import os
+import shutil
+import struct
+import subprocess
+
+OPT_LEVELS = ("0", "1", "2", "3", "lto")
+HOST_ARCH = str(struct.calcsize("P") * 8)
+
+
+class Backend:
+    """
+    Base class for the C compilers `main.compile_c` can drive.
+
+    Subclasses set `name` and implement `locate`, and may override the flag
+    helpers when the compiler does not speak the gcc command line.
+    """
+    name = None
+    exe_suffix = ".exe" if os.name == "nt" else ""
+    static_lib_suffix = ".a"
+    shared_lib_suffix = ".dll" if os.name == "nt" else ".so"
+
+    def __init__(self, path, arch):
+        self.path = path
+        self.arch = arch
+        self._version = None
+
+    @classmethod
+    def locate(cls, arch):
+        """
+        Finds the compiler executable for the given architecture.
+
+        Args:
+            arch (str): Target architecture mode ('32' or '64').
+
+        Returns:
+            str | None: Path to the compiler, or None if it is not available.
+        """
+        raise NotImplementedError
+
+    def version(self):
+        if self._version is None:
+            self._version = self.query_version()
+        return self._version
+
+    def query_version(self):
+        try:
+            output = subprocess.check_output([self.path, "--version"], stderr=subprocess.STDOUT)
+        except (OSError, subprocess.CalledProcessError):
+            return "unknown"
+        lines = output.decode(errors="replace").splitlines()
+        return lines[0].strip() if lines else "unknown"
+
+    def opt_flags(self, opt):
+        if opt is None:
+            return []
+        if opt == "lto":
+            return ["-O3", "-flto"]
+        return [f"-O{opt}"]
+
+    def arch_flags(self):
+        if self.arch != HOST_ARCH:
+            return [f"-m{self.arch}"]
+        return []
+
+    def link_flags(self):
+        return [] if os.name == "nt" else ["-lm"]
+
+    def pic_flags(self):
+        return [] if os.name == "nt" else ["-fPIC"]
+
+    def library_flags(self, library):
+        """
+        Returns the flags that link against a runtime library built by `PYTOCRuntime`.
+        """
+        if library.endswith(self.static_lib_suffix):
+            return [library]
+        lib_dir, lib_name = os.path.split(library)
+        lib_name = os.path.splitext(lib_name)[0].removeprefix("lib")
+        flags = [f"-L{lib_dir}", f"-l{lib_name}"]
+        if os.name != "nt":
+            flags.append(f"-Wl,-rpath,{lib_dir}")
+        return flags
+
+    def command(self, sources, output_file, compiler_flags=None, opt=None, debug=False, include_dirs=(), libraries=()):
+        """
+        Builds the command line that compiles `sources` into `output_file`.
+
+        Args:
+            sources (list): C source files to compile.
+            output_file (str): The desired output binary file path.
+            compiler_flags (list, optional): Additional flags to pass through.
+            opt (str, optional): Optimization level, one of `OPT_LEVELS`.
+            debug (bool): If True, include debug symbols.
+            include_dirs (list, optional): Header search directories.
+            libraries (list, optional): Static archives or shared libraries to link.
+
+        Returns:
+            list: The command to execute.
+        """
+        cmd = [self.path, *sources, "-o", output_file]
+        cmd.extend(f"-I{directory}" for directory in include_dirs)
+        cmd.extend(self.arch_flags())
+        cmd.extend(self.opt_flags(opt))
+        if compiler_flags:
+            cmd.extend(compiler_flags)
+        if debug:
+            cmd.append("-g")
+        for library in libraries:
+            cmd.extend(self.library_flags(library))
+        cmd.extend(self.link_flags())
+        return cmd
+
+    def object_command(self, source, object_file, opt=None, debug=False, include_dirs=(), pic=False, defines=()):
+        cmd = [self.path, "-c", source, "-o", object_file]
+        cmd.extend(f"-I{directory}" for directory in include_dirs)
+        cmd.extend(f"-D{define}" for define in defines)
+        cmd.extend(self.arch_flags())
+        cmd.extend(self.opt_flags(opt))
+        if debug:
+            cmd.append("-g")
+        if pic:
+            cmd.extend(self.pic_flags())
+        return cmd
+
+    def archive_command(self, archive, objects, opt=None):
+        # LTO objects need the plugin-aware archiver to get a symbol index.
+        ar = (opt == "lto" and shutil.which(f"{self.name}-ar")) or shutil.which("ar") or "ar"
+        return [ar, "rcs", archive, *objects]
+
+    def shared_command(self, library, objects, opt=None, debug=False):
+        cmd = [self.path, "-shared", *objects, "-o", library]
+        cmd.extend(self.arch_flags())
+        cmd.extend(self.opt_flags(opt))
+        cmd.extend(self.pic_flags())
+        if debug:
+            cmd.append("-g")
+        cmd.extend(self.link_flags())
+        return cmd
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.path!r}, arch={self.arch!r})"
+
+
+class BundledTCCBackend(Backend):
+    """The Windows TCC shipped in `tcc/tcc-win{arch}/`."""
+    name = "tcc-win"
+    exe_suffix = ".exe"
+
+    @classmethod
+    def locate(cls, arch):
+        if os.name != "nt":
+            return None
+        base_dir = os.path.abspath(os.path.dirname(__file__))
+        tcc_path = os.path.join(base_dir, f"tcc/tcc-win{arch}/tcc.exe")
+        return tcc_path if os.path.isfile(tcc_path) else None
+
+    def query_version(self):
+        try:
+            output = subprocess.check_output([self.path, "-v"], stderr=subprocess.STDOUT)
+        except (OSError, subprocess.CalledProcessError):
+            return "unknown"
+        return output.decode(errors="replace").strip()
+
+    def opt_flags(self, opt):
+        # TCC is a single pass compiler and ignores optimization levels.
+        return []
+
+    def arch_flags(self):
+        # The bundled compilers are already per-architecture.
+        return []
+
+    def link_flags(self):
+        return []
+
+    def archive_command(self, archive, objects, opt=None):
+        return [self.path, "-ar", "rcs", archive, *objects]
+
+
+class TCCBackend(BundledTCCBackend):
+    """A TCC installed on the host `PATH`."""
+    name = "tcc"
+    exe_suffix = Backend.exe_suffix
+
+    @classmethod
+    def locate(cls, arch):
+        return shutil.which("tcc")
+
+    def link_flags(self):
+        return Backend.link_flags(self)
+
+
+class GCCBackend(Backend):
+    name = "gcc"
+
+    @classmethod
+    def locate(cls, arch):
+        return shutil.which("gcc")
+
+
+class ClangBackend(Backend):
+    name = "clang"
+
+    @classmethod
+    def locate(cls, arch):
+        return shutil.which("clang")
+
+    def archive_command(self, archive, objects, opt=None):
+        ar = (opt == "lto" and shutil.which("llvm-ar")) or shutil.which("ar") or "ar"
+        return [ar, "rcs", archive, *objects]
+
+
+# Probe order used by `find_backend` when no backend is requested.
+BACKENDS = {
+    backend.name: backend
+    for backend in (BundledTCCBackend, TCCBackend, GCCBackend, ClangBackend)
+}
+
+
+def find_backend(name=None, arch=HOST_ARCH):
+    """
+    Resolves a backend by name, or picks the first available one.
+
+    Args:
+        name (str, optional): Backend name (see `BACKENDS`), or None/'auto' to probe.
+        arch (str): Target architecture mode ('32' or '64').
+
+    Returns:
+        Backend | None: The backend, or None if no matching compiler was found.
+    """
+    if name in (None, "auto"):
+        candidates = BACKENDS.values()
+    elif name in BACKENDS:
+        candidates = [BACKENDS[name]]
+    else:
+        raise ValueError(f"Unknown backend '{name}'. Choose from: auto, {', '.join(BACKENDS)}")
+
+    for backend_cls in candidates:
+        path = backend_cls.locate(arch)
+        if path:
+            return backend_cls(path, arch)
+    return None
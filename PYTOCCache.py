@@ -0,0 +1,201 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+DEFAULT_MAX_SIZE = 512 * 1024 * 1024  # 512 MB
+STATS_FILE = "stats.json"
+
+
+def default_cache_dir():
+    if os.environ.get("PYTOC_CACHE_DIR"):
+        return os.environ["PYTOC_CACHE_DIR"]
+    if os.name == "nt":
+        root = os.environ.get("LOCALAPPDATA", os.path.expanduser("~"))
+    else:
+        root = os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache"))
+    return os.path.join(root, "pytoc")
+
+
+def toolchain_files():
+    """
+    Lists every file whose contents can change the produced executable.
+
+    Returns:
+        list: Sorted paths of the runtime sources, headers and transpiler modules.
+    """
+    files = []
+    for directory, extension in (("include", ".c"), ("headers", ".h"), (".", ".py")):
+        directory = os.path.join(BASE_DIR, directory)
+        for name in sorted(os.listdir(directory)):
+            if name.endswith(extension) and (extension != ".py" or name.startswith("PYTOC")):
+                files.append(os.path.join(directory, name))
+    return files
+
+
+class BuildCache:
+    """
+    Content-addressed store of compiled executables.
+
+    Entries are keyed by a hash of everything that goes into a build (see `key`)
+    and evicted least-recently-used first once the cache grows past `max_size`.
+    """
+
+    def __init__(self, cache_dir=None, max_size=DEFAULT_MAX_SIZE):
+        self.cache_dir = os.path.abspath(cache_dir or default_cache_dir())
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def key(self, source_code, backend, arch, compiler_flags=None, **options):
+        """
+        Computes the cache key for a build.
+
+        Args:
+            source_code (str): The Python source being compiled.
+            backend (PYTOCBackend.Backend): The backend that will compile the C code.
+            arch (str): Target architecture mode ('32' or '64').
+            compiler_flags (list, optional): Additional compiler flags.
+            **options: Every other build setting, e.g. `opt` and `debug`.
+
+        Returns:
+            str: Hex digest identifying the build.
+        """
+        digest = hashlib.sha256()
+
+        def feed(label, data):
+            if isinstance(data, str):
+                data = data.encode("utf-8")
+            digest.update(f"{label}:{len(data)}:".encode("utf-8"))
+            digest.update(data)
+
+        feed("source", source_code)
+        for path in toolchain_files():
+            with open(path, "rb") as f:
+                feed(os.path.relpath(path, BASE_DIR).replace(os.sep, "/"), f.read())
+        feed("backend", f"{backend.name}|{backend.path}|{backend.version()}")
+        feed("arch", arch)
+        feed("flags", json.dumps(list(compiler_flags or [])))
+        feed("options", json.dumps(options, sort_keys=True, default=str))
+        return digest.hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def fetch(self, key, output_file):
+        """
+        Materializes a cached executable at `output_file`, hardlinking when possible.
+
+        Returns:
+            bool: True on a cache hit.
+        """
+        entry = self._entry_path(key)
+        if not os.path.isfile(entry):
+            self.misses += 1
+            return False
+
+        output_file = os.path.abspath(output_file)
+        if os.path.lexists(output_file):
+            os.remove(output_file)
+        try:
+            os.link(entry, output_file)
+        except OSError:
+            shutil.copy2(entry, output_file)
+        # Touch the entry so eviction sees it as recently used.
+        os.utime(entry)
+        self.hits += 1
+        return True
+
+    def store(self, key, output_file):
+        """Copies a freshly built executable into the cache and enforces the size bound."""
+        entry = self._entry_path(key)
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(entry), suffix=".tmp")
+        os.close(fd)
+        try:
+            shutil.copy2(output_file, tmp_path)
+            os.replace(tmp_path, entry)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        os.utime(entry)
+        self.stores += 1
+        self.evict()
+
+    def prepare_output(self, output_file):
+        """Breaks a hardlink to a cache entry so the compiler cannot overwrite the cached copy."""
+        if os.path.isfile(output_file) and os.stat(output_file).st_nlink > 1:
+            os.remove(output_file)
+
+    def entries(self):
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name == STATS_FILE or name.endswith(".tmp"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def evict(self):
+        """Removes least-recently-used entries until the cache fits in `max_size`."""
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            self.evictions += 1
+
+    def clear(self):
+        for _, _, path in self.entries():
+            os.remove(path)
+
+    def load_stats(self):
+        try:
+            with open(os.path.join(self.cache_dir, STATS_FILE), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    def save_stats(self):
+        """Adds this session's counters to the persistent totals and resets them."""
+        totals = self.load_stats()
+        for name in ("hits", "misses", "stores", "evictions"):
+            totals[name] = totals.get(name, 0) + getattr(self, name)
+            setattr(self, name, 0)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(totals, f, indent=4)
+        os.replace(tmp_path, os.path.join(self.cache_dir, STATS_FILE))
+        return totals
+
+    def stats(self):
+        """
+        Returns:
+            dict: Persistent totals plus this session's counters, entry count and size.
+        """
+        totals = self.load_stats()
+        for name in ("hits", "misses", "stores", "evictions"):
+            totals[name] = totals.get(name, 0) + getattr(self, name)
+        lookups = totals["hits"] + totals["misses"]
+        entries = self.entries()
+        totals["hit_rate"] = totals["hits"] / lookups if lookups else 0.0
+        totals["entries"] = len(entries)
+        totals["size"] = sum(size for _, size, _ in entries)
+        totals["max_size"] = self.max_size
+        totals["cache_dir"] = self.cache_dir
+        return totals
@@ -0,0 +1,93 @@
+import ast
+
+CONTINUATION_KEYWORDS = ("else", "elif", "except", "finally")
+
+
+def split_top_level(source_code):
+    """
+    Splits source code into chunks that each hold one or more top-level statements.
+
+    A chunk starts at every non-blank line in column 0, except for lines that
+    continue the previous statement (closing brackets, else/elif/except/finally
+    clauses, lines after decorators or backslash continuations). The split is a
+    heuristic; callers must fall back to a full parse if a chunk does not parse.
+
+    Returns:
+        list: (first_line, text) tuples with 1-based line numbers.
+    """
+    chunks = []
+    current = []
+    start = 1
+    for lineno, line in enumerate(source_code.splitlines(keepends=True), start=1):
+        stripped = line.strip()
+        starts_statement = (
+            stripped
+            and line[0] not in " \t#"
+            and not stripped.startswith((")", "]", "}"))
+            and not (stripped.split(":")[0].split(" ")[0] in CONTINUATION_KEYWORDS)
+        )
+        if starts_statement and current:
+            previous = [text.strip() for text in current if text.strip() and not text.lstrip().startswith("#")]
+            if previous and (previous[-1].startswith("@") or previous[-1].endswith("\\")):
+                starts_statement = False
+        if starts_statement and current:
+            chunks.append((start, "".join(current)))
+            current = []
+            start = lineno
+        current.append(line)
+    if current:
+        chunks.append((start, "".join(current)))
+    return chunks
+
+
+class IncrementalParser:
+    """
+    Re-parses only the top-level statements whose text changed since the last call.
+
+    Parsed chunks are cached by their source text; unchanged chunks are reused
+    with their line numbers shifted to their new position.
+    """
+
+    def __init__(self):
+        self.chunks = {}
+        self.reused = 0
+        self.parsed = 0
+
+    def parse(self, source_code):
+        """
+        Args:
+            source_code (str): The full module source.
+
+        Returns:
+            ast.Module: The parsed module, equivalent to `ast.parse(source_code)`.
+        """
+        self.reused = 0
+        self.parsed = 0
+        chunks = {}
+        body = []
+        try:
+            for start, text in split_top_level(source_code):
+                entry = self.chunks.pop(text, None)
+                if entry is None:
+                    nodes = ast.parse(text).body
+                    entry = [nodes, 1]
+                    self.parsed += 1
+                else:
+                    self.reused += 1
+                nodes, line = entry
+                if line != start:
+                    for node in nodes:
+                        ast.increment_lineno(node, start - line)
+                    entry[1] = start
+                body.extend(nodes)
+                # The same text twice in one file must not share nodes.
+                if text not in chunks:
+                    chunks[text] = entry
+        except SyntaxError:
+            # A chunk boundary fell inside a multi-line construct; parse it whole.
+            self.chunks = {}
+            self.reused = 0
+            self.parsed = 1
+            return ast.parse(source_code)
+        self.chunks = chunks
+        return ast.Module(body=body, type_ignores=[])
@@ -0,0 +1,159 @@
+import ast
+import copy
+
+# Largest return expression, in expression nodes, that is inlined at call sites.
+DEFAULT_THRESHOLD = 16
+
+# Expressions that bind names or suspend; bodies using them are never inlined.
+SCOPED_NODES = (ast.Lambda, ast.ListComp, ast.SetComp, ast.DictComp, ast.GeneratorExp, ast.NamedExpr,
+                ast.Await, ast.Yield, ast.YieldFrom)
+
+
+def binding_counts(tree):
+    """How often each name is bound anywhere in the tree, counting every scope."""
+    counts = {}
+    for node in ast.walk(tree):
+        names = ()
+        if isinstance(node, ast.Name) and not isinstance(node.ctx, ast.Load):
+            names = (node.id,)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names = (node.name,)
+        elif isinstance(node, ast.arg):
+            names = (node.arg,)
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            names = [(alias.asname or alias.name).split(".")[0] for alias in node.names]
+        elif isinstance(node, ast.ExceptHandler) and node.name:
+            names = (node.name,)
+        elif isinstance(node, (ast.Global, ast.Nonlocal)):
+            names = node.names
+        for name in names:
+            counts[name] = counts.get(name, 0) + 1
+    return counts
+
+
+def expr_size(node):
+    return sum(isinstance(n, ast.expr) for n in ast.walk(node))
+
+
+def return_expr(node):
+    """The expression a function body returns, if the body is a single `return`."""
+    body = node.body
+    if body and isinstance(body[0], ast.Expr) and isinstance(body[0].value, ast.Constant) \
+            and isinstance(body[0].value.value, str):
+        body = body[1:]  # docstring
+    if len(body) != 1 or not isinstance(body[0], ast.Return):
+        return None
+    return body[0].value if body[0].value is not None else ast.Constant(value=None)
+
+
+def find_inlinable(tree, threshold=DEFAULT_THRESHOLD):
+    """
+    Finds the module-level functions whose calls can be replaced by their body.
+
+    A function qualifies if its body is a single `return` of an expression of at
+    most `threshold` nodes that only reads its own parameters, it takes plain
+    positional parameters with constant defaults, and its name is bound nowhere
+    else in the program. It may call functions defined before it, so inlining
+    always terminates.
+
+    Args:
+        tree (ast.Module): The module.
+        threshold (int): Largest expression size to inline; 0 disables inlining.
+
+    Returns:
+        dict: Maps each function name to {"params", "defaults", "expr", "source"}, where
+            `defaults` maps parameter names to constant nodes and `source` identifies
+            the definition for cache keys.
+    """
+    if threshold <= 0:
+        return {}
+    counts = binding_counts(tree)
+    functions = {stmt.name for stmt in tree.body if isinstance(stmt, ast.FunctionDef)}
+    defined = set()
+    inlinable = {}
+    for stmt in tree.body:
+        if not isinstance(stmt, ast.FunctionDef):
+            continue
+        name = stmt.name
+        args = stmt.args
+        if (
+            name == "main"
+            or counts.get(name) != 1
+            or stmt.decorator_list
+            or args.posonlyargs or args.vararg or args.kwonlyargs or args.kwarg
+            or not all(isinstance(default, ast.Constant) for default in args.defaults)
+        ):
+            defined.add(name)
+            continue
+        expr = return_expr(stmt)
+        params = [arg.arg for arg in args.args]
+        if expr is not None and expr_size(expr) <= threshold and reads_only(expr, params, functions - defined):
+            inlinable[name] = {
+                "params": params,
+                "defaults": dict(zip(params[len(params) - len(args.defaults):], args.defaults)),
+                "expr": expr,
+                "source": ast.dump(stmt),
+            }
+        defined.add(name)
+    return inlinable
+
+
+def reads_only(expr, params, later):
+    """
+    Whether `expr` only reads `params` and calls functions other than those in
+    `later` (the function itself and those defined after it), so expanding inlined
+    calls always terminates.
+    """
+    if any(isinstance(n, SCOPED_NODES) for n in ast.walk(expr)):
+        return False
+    calls = {id(n.func) for n in ast.walk(expr) if isinstance(n, ast.Call)}
+    for n in ast.walk(expr):
+        if isinstance(n, ast.Name):
+            if id(n) in calls:
+                if n.id in params or n.id in later:
+                    return False
+            elif n.id not in params:
+                return False
+    return True
+
+
+def bind_arguments(info, call):
+    """
+    Matches the arguments of a call to an inlinable function's parameters.
+
+    Returns:
+        list | None: (parameter, expression) pairs in the order Python evaluates the
+            arguments (positional, then keywords as written, then defaults), or None
+            if the call does not bind cleanly and must stay a real call.
+    """
+    params = info["params"]
+    if len(call.args) > len(params) or any(isinstance(arg, ast.Starred) for arg in call.args):
+        return None
+    bound = list(zip(params, call.args))
+    seen = {param for param, _ in bound}
+    for keyword in call.keywords:
+        if keyword.arg is None or keyword.arg not in params or keyword.arg in seen:
+            return None
+        bound.append((keyword.arg, keyword.value))
+        seen.add(keyword.arg)
+    for param in params:
+        if param not in seen:
+            if param not in info["defaults"]:
+                return None
+            bound.append((param, info["defaults"][param]))
+    return bound
+
+
+class Renamer(ast.NodeTransformer):
+    def __init__(self, names):
+        self.names = names
+
+    def visit_Name(self, node):
+        if node.id in self.names:
+            return ast.copy_location(ast.Name(id=self.names[node.id], ctx=node.ctx), node)
+        return node
+
+
+def rename(expr, names):
+    """A copy of `expr` with the parameters in `names` replaced by their temporaries."""
+    return Renamer(names).visit(copy.deepcopy(expr))
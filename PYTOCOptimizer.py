@@ -0,0 +1,401 @@
+import ast
+import copy
+import math
+import operator
+
+# Folded strings longer than this stay runtime expressions to keep the C small.
+MAX_FOLDED_STRING = 4096
+
+INT_MIN = -2 ** 63
+INT_MAX = 2 ** 63 - 1
+
+BINOPS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: operator.pow,
+    ast.LShift: operator.lshift,
+    ast.RShift: operator.rshift,
+    ast.BitOr: operator.or_,
+    ast.BitXor: operator.xor,
+    ast.BitAnd: operator.and_,
+}
+
+UNARYOPS = {
+    ast.Not: operator.not_,
+    ast.USub: operator.neg,
+    ast.UAdd: operator.pos,
+    ast.Invert: operator.invert,
+}
+
+CMPOPS = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+    ast.In: lambda a, b: a in b,
+    ast.NotIn: lambda a, b: a not in b,
+}
+
+# Builtins evaluated at compile time when every argument is a constant.
+FOLDABLE_BUILTINS = {"len": len, "ord": ord, "chr": chr, "abs": abs}
+
+# f-string replacement fields folded at compile time: the runtime formats these
+# exactly like str() (bool is an int).
+FORMATTED_TYPES = (str, int, type(None))
+
+
+def is_const(node):
+    return isinstance(node, ast.Constant)
+
+
+def foldable_value(value):
+    """Whether a folded value can be emitted as a literal by the transpiler."""
+    if isinstance(value, bool) or value is None:
+        return True
+    if isinstance(value, int):
+        return INT_MIN <= value <= INT_MAX
+    if isinstance(value, float):
+        return math.isfinite(value)
+    if isinstance(value, str):
+        return len(value) <= MAX_FOLDED_STRING
+    return False
+
+
+def cheap_binop(op, left, right):
+    # Refuses operations whose result could be huge before evaluating them.
+    if op is ast.Pow and isinstance(left, int) and isinstance(right, int):
+        return right <= 64 or abs(left) <= 1
+    if op is ast.LShift and isinstance(right, int):
+        return right <= 64
+    if op is ast.Mult:
+        for seq, count in ((left, right), (right, left)):
+            if isinstance(seq, str) and isinstance(count, int):
+                return len(seq) * max(count, 0) <= MAX_FOLDED_STRING
+    return True
+
+
+def bound_names(tree):
+    """Every name bound anywhere in the tree; such names may shadow builtins."""
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and not isinstance(node.ctx, ast.Load):
+            names.add(node.id)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names.add(node.name)
+        elif isinstance(node, ast.arg):
+            names.add(node.arg)
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            names.update((alias.asname or alias.name).split(".")[0] for alias in node.names)
+        elif isinstance(node, ast.ExceptHandler) and node.name:
+            names.add(node.name)
+    return names
+
+
+class BindingCounter(ast.NodeVisitor):
+    """Counts how often each name is bound in one scope, not descending into nested scopes."""
+
+    def __init__(self):
+        self.counts = {}
+
+    def bind(self, name):
+        self.counts[name] = self.counts.get(name, 0) + 1
+
+    def visit_Name(self, node):
+        if not isinstance(node.ctx, ast.Load):
+            self.bind(node.id)
+
+    def visit_FunctionDef(self, node):
+        self.bind(node.name)
+        for default in node.args.defaults + node.args.kw_defaults:
+            if default is not None:
+                self.visit(default)
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_ClassDef(self, node):
+        self.bind(node.name)
+
+    def visit_Lambda(self, node):
+        pass
+
+    def visit_Import(self, node):
+        for alias in node.names:
+            self.bind((alias.asname or alias.name).split(".")[0])
+
+    visit_ImportFrom = visit_Import
+
+    def visit_ExceptHandler(self, node):
+        if node.name:
+            self.bind(node.name)
+        self.generic_visit(node)
+
+
+class PYTOCOptimizer(ast.NodeTransformer):
+    """
+    AST pass run before `PYTOCTranspiler` that does work at compile time instead of runtime.
+
+    - Folds arithmetic, comparisons, boolean operators, f-strings and `len`/`ord`/`chr`/`abs`
+      calls whose operands are constants (unless the builtin is shadowed).
+    - Propagates numeric, bool and None constants through locals that are assigned
+      exactly once, at the top level of their scope.
+    - Removes code after `return`/`raise`/`break`/`continue`, always-true assertions,
+      `while False` loops, constant `if` branches and constant expression statements.
+
+    Operations that would raise, overflow a 64-bit int or build huge strings are left
+    for the runtime so behavior does not change.
+    """
+
+    def __init__(self, tree):
+        self.shadowed = bound_names(tree)
+        self.rebound = set()
+        for node in ast.walk(tree):
+            if isinstance(node, (ast.Global, ast.Nonlocal)):
+                self.rebound.update(node.names)
+        self.constants = {}
+
+    # Scopes
+
+    def visit_Module(self, node):
+        node.body = self.optimize_scope(node.body)
+        return node
+
+    def visit_FunctionDef(self, node):
+        # Decorators and defaults run in the enclosing scope.
+        node.decorator_list = [self.visit(d) for d in node.decorator_list]
+        node.args = self.visit(node.args)
+        if node.returns is not None:
+            node.returns = self.visit(node.returns)
+        params = [arg.arg for arg in node.args.posonlyargs + node.args.args + node.args.kwonlyargs]
+        for special in (node.args.vararg, node.args.kwarg):
+            if special is not None:
+                params.append(special.arg)
+        node.body = self.optimize_scope(node.body, params) or [ast.copy_location(ast.Pass(), node)]
+        return node
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_ClassDef(self, node):
+        node.decorator_list = [self.visit(d) for d in node.decorator_list]
+        node.bases = [self.visit(b) for b in node.bases]
+        node.body = self.optimize_scope(node.body)
+        return node
+
+    def visit_arguments(self, node):
+        # Parameter annotations are not evaluated here; only defaults are.
+        node.defaults = [self.visit(d) for d in node.defaults]
+        node.kw_defaults = [self.visit(d) if d is not None else None for d in node.kw_defaults]
+        return node
+
+    def optimize_scope(self, body, params=()):
+        outer = self.constants
+        self.constants = {}
+        counter = BindingCounter()
+        for stmt in body:
+            counter.visit(stmt)
+        single = {
+            name for name, count in counter.counts.items()
+            if count == 1 and name not in params and name not in self.rebound
+        }
+        try:
+            optimized = []
+            for stmt in body:
+                result = self.visit(stmt)
+                if result is None:
+                    continue
+                for new_stmt in result if isinstance(result, list) else [result]:
+                    optimized.append(new_stmt)
+                    if (
+                        isinstance(new_stmt, ast.Assign)
+                        and len(new_stmt.targets) == 1
+                        and isinstance(new_stmt.targets[0], ast.Name)
+                        and new_stmt.targets[0].id in single
+                        and is_const(new_stmt.value)
+                        and not isinstance(new_stmt.value.value, str)
+                        and foldable_value(new_stmt.value.value)
+                    ):
+                        self.constants[new_stmt.targets[0].id] = new_stmt.value.value
+            return self.prune(optimized)
+        finally:
+            self.constants = outer
+
+    def without(self, names):
+        """Hides names bound by a nested scope (lambda parameters, comprehension targets)."""
+        return {name: self.constants.pop(name) for name in list(names) if name in self.constants}
+
+    def visit_Lambda(self, node):
+        node.args = self.visit(node.args)
+        hidden = self.without(arg.arg for arg in ast.walk(node.args) if isinstance(arg, ast.arg))
+        node.body = self.visit(node.body)
+        self.constants.update(hidden)
+        return node
+
+    def visit_comprehension_scope(self, node):
+        targets = {
+            n.id for generator in node.generators for n in ast.walk(generator.target) if isinstance(n, ast.Name)
+        }
+        hidden = self.without(targets)
+        self.generic_visit(node)
+        self.constants.update(hidden)
+        return node
+
+    visit_ListComp = visit_comprehension_scope
+    visit_SetComp = visit_comprehension_scope
+    visit_DictComp = visit_comprehension_scope
+    visit_GeneratorExp = visit_comprehension_scope
+
+    # Dead code
+
+    def generic_visit(self, node):
+        node = super().generic_visit(node)
+        for field in ("body", "orelse", "finalbody"):
+            stmts = getattr(node, field, None)
+            if isinstance(stmts, list) and stmts and isinstance(stmts[0], ast.stmt):
+                pruned = self.prune(stmts)
+                setattr(node, field, pruned or [ast.copy_location(ast.Pass(), stmts[0])])
+        return node
+
+    def prune(self, stmts):
+        """Drops statements that can never run or never have an effect."""
+        result = []
+        for stmt in stmts:
+            if isinstance(stmt, ast.Assert) and is_const(stmt.test) and stmt.test.value:
+                continue
+            if isinstance(stmt, ast.Expr) and is_const(stmt.value):
+                continue
+            if isinstance(stmt, ast.While) and is_const(stmt.test) and not stmt.test.value:
+                result.extend(stmt.orelse)
+                continue
+            if isinstance(stmt, ast.If) and is_const(stmt.test):
+                result.extend(stmt.body if stmt.test.value else stmt.orelse)
+                continue
+            result.append(stmt)
+            if isinstance(stmt, (ast.Return, ast.Raise, ast.Break, ast.Continue)):
+                break
+        return [stmt for stmt in result if not isinstance(stmt, ast.Pass)] or result[:1]
+
+    # Expressions
+
+    def visit_Name(self, node):
+        if isinstance(node.ctx, ast.Load) and node.id in self.constants:
+            return ast.copy_location(ast.Constant(value=self.constants[node.id]), node)
+        return node
+
+    def fold(self, node, compute):
+        try:
+            value = compute()
+        except Exception:
+            return node
+        if not foldable_value(value):
+            return node
+        return ast.copy_location(ast.Constant(value=value), node)
+
+    def visit_BinOp(self, node):
+        self.generic_visit(node)
+        if not (is_const(node.left) and is_const(node.right)):
+            return node
+        op = type(node.op)
+        left, right = node.left.value, node.right.value
+        if op not in BINOPS or not (foldable_value(left) and foldable_value(right)):
+            return node
+        if not cheap_binop(op, left, right):
+            return node
+        return self.fold(node, lambda: BINOPS[op](left, right))
+
+    def visit_UnaryOp(self, node):
+        self.generic_visit(node)
+        if not is_const(node.operand) or not foldable_value(node.operand.value):
+            return node
+        return self.fold(node, lambda: UNARYOPS[type(node.op)](node.operand.value))
+
+    def visit_Compare(self, node):
+        self.generic_visit(node)
+        operands = [node.left, *node.comparators]
+        if not all(is_const(operand) and foldable_value(operand.value) for operand in operands):
+            return node
+
+        def compute():
+            for op, left, right in zip(node.ops, operands, operands[1:]):
+                if not CMPOPS[type(op)](left.value, right.value):
+                    return False
+            return True
+
+        return self.fold(node, compute)
+
+    def visit_BoolOp(self, node):
+        self.generic_visit(node)
+        values = node.values
+        is_and = isinstance(node.op, ast.And)
+        while len(values) > 1 and is_const(values[0]):
+            if bool(values[0].value) != is_and:
+                return values[0]
+            values = values[1:]
+        if len(values) == 1:
+            return values[0]
+        node.values = values
+        return node
+
+    def visit_IfExp(self, node):
+        self.generic_visit(node)
+        if is_const(node.test):
+            return node.body if node.test.value else node.orelse
+        return node
+
+    def visit_FormattedValue(self, node):
+        # The runtime formats a replacement field with to_string() and ignores any
+        # conversion or format spec, so only values it prints exactly like str() are
+        # folded; anything else would make `--no-fold` change the output.
+        self.generic_visit(node)
+        if (
+            not is_const(node.value)
+            or not isinstance(node.value.value, FORMATTED_TYPES)
+            or not foldable_value(node.value.value)
+            or node.conversion not in (-1, ord("s"))
+            or node.format_spec is not None
+        ):
+            return node
+        return self.fold(node, lambda: str(node.value.value))
+
+    def visit_JoinedStr(self, node):
+        self.generic_visit(node)
+        if all(is_const(value) for value in node.values):
+            return self.fold(node, lambda: "".join(value.value for value in node.values))
+        return node
+
+    def visit_Call(self, node):
+        self.generic_visit(node)
+        func = node.func
+        if (
+            isinstance(func, ast.Name)
+            and func.id in FOLDABLE_BUILTINS
+            and func.id not in self.shadowed
+            and not node.keywords
+            and all(is_const(arg) and foldable_value(arg.value) for arg in node.args)
+        ):
+            builtin = FOLDABLE_BUILTINS[func.id]
+            return self.fold(node, lambda: builtin(*(arg.value for arg in node.args)))
+        return node
+
+
+def optimize(tree, copy_tree=True):
+    """
+    Returns an optimized copy of a module; the input tree is left untouched so
+    callers that cache AST nodes (watch mode) can keep reusing them.
+
+    Args:
+        tree (ast.Module): The parsed module.
+        copy_tree (bool): Copy the tree first. Callers that own a freshly parsed
+            tree pass False to have it rewritten in place instead.
+
+    Returns:
+        ast.Module: The optimized module.
+    """
+    if copy_tree:
+        tree = copy.deepcopy(tree)
+    tree = PYTOCOptimizer(tree).visit(tree)
+    return ast.fix_missing_locations(tree)
@@ -0,0 +1,107 @@
+import hashlib
+import os
+import shutil
+import subprocess
+import tempfile
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+SOURCES_DIR = os.path.join(BASE_DIR, "include")
+HEADERS_DIR = os.path.join(BASE_DIR, "headers")
+BUILD_DIR = os.path.join(BASE_DIR, "build", "runtime")
+LIBRARY_NAME = "libpytoc"
+# Defined for runtimes built with `trace_alloc`, and for the programs linked against them.
+TRACE_ALLOC_DEFINE = "PYTOC_TRACE_ALLOC"
+
+
+def runtime_sources():
+    return [os.path.join(SOURCES_DIR, name) for name in sorted(os.listdir(SOURCES_DIR)) if name.endswith(".c")]
+
+
+def runtime_headers():
+    return [os.path.join(HEADERS_DIR, name) for name in sorted(os.listdir(HEADERS_DIR)) if name.endswith(".h")]
+
+
+def runtime_digest(backend, opt=None, debug=False, shared=False, trace_alloc=False):
+    """
+    Hashes everything that affects the built runtime library.
+
+    Returns:
+        str: Hex digest stored next to the library to detect stale builds.
+    """
+    digest = hashlib.sha256()
+    for path in runtime_sources() + runtime_headers():
+        with open(path, "rb") as f:
+            digest.update(os.path.basename(path).encode("utf-8") + b"\0")
+            digest.update(f.read())
+    digest.update(f"{backend.name}|{backend.path}|{backend.version()}|{backend.arch}|{opt}|{debug}|{shared}|{trace_alloc}".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def runtime_path(backend, opt=None, debug=False, shared=False, trace_alloc=False):
+    variant = f"{backend.name}-{backend.arch}-O{opt if opt is not None else 'default'}"
+    if debug:
+        variant += "-g"
+    if trace_alloc:
+        variant += "-trace-alloc"
+    suffix = backend.shared_lib_suffix if shared else backend.static_lib_suffix
+    return os.path.join(BUILD_DIR, variant, LIBRARY_NAME + suffix)
+
+
+def build_runtime(backend, opt=None, debug=False, shared=False, force=False, trace_alloc=False):
+    """
+    Builds the runtime in `include/` into a library once per backend, arch and flags.
+
+    The library is reused until a runtime source, header or the compiler changes.
+
+    Args:
+        backend (PYTOCBackend.Backend): The backend to build with.
+        opt (str, optional): Optimization level ('0', '1', '2', '3' or 'lto').
+        debug (bool): If True, include debug symbols.
+        shared (bool): Build a shared library instead of a static archive.
+        force (bool): Rebuild even if an up-to-date library exists.
+        trace_alloc (bool): Build with PYTOC_TRACE_ALLOC so every allocation is counted (see alloc.h).
+
+    Returns:
+        tuple: (success: bool, library path or error message: str)
+    """
+    library = runtime_path(backend, opt=opt, debug=debug, shared=shared, trace_alloc=trace_alloc)
+    stamp = library + ".stamp"
+    digest = runtime_digest(backend, opt=opt, debug=debug, shared=shared, trace_alloc=trace_alloc)
+
+    if not force and os.path.isfile(library) and os.path.isfile(stamp):
+        with open(stamp, "r", encoding="utf-8") as f:
+            if f.read().strip() == digest:
+                return True, library
+
+    os.makedirs(os.path.dirname(library), exist_ok=True)
+    # Build in a private directory so concurrent builds never see a partial library.
+    work_dir = tempfile.mkdtemp(dir=os.path.dirname(library))
+    try:
+        objects = []
+        for source in runtime_sources():
+            obj = os.path.join(work_dir, os.path.splitext(os.path.basename(source))[0] + ".o")
+            cmd = backend.object_command(source, obj, opt=opt, debug=debug, include_dirs=[HEADERS_DIR], pic=shared,
+                                         defines=[TRACE_ALLOC_DEFINE] if trace_alloc else ())
+            subprocess.check_output(cmd, stderr=subprocess.STDOUT)
+            objects.append(obj)
+
+        tmp_library = os.path.join(work_dir, os.path.basename(library))
+        if shared:
+            cmd = backend.shared_command(tmp_library, objects, opt=opt, debug=debug)
+        else:
+            cmd = backend.archive_command(tmp_library, objects, opt=opt)
+        subprocess.check_output(cmd, stderr=subprocess.STDOUT)
+
+        os.replace(tmp_library, library)
+        tmp_stamp = os.path.join(work_dir, "stamp")
+        with open(tmp_stamp, "w", encoding="utf-8") as f:
+            f.write(digest)
+        os.replace(tmp_stamp, stamp)
+    except subprocess.CalledProcessError as e:
+        return False, f"Runtime build failed:\n{e.output.decode(errors='replace')}"
+    except OSError as e:
+        return False, f"Runtime build failed: {e}"
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return True, library
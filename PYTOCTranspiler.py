@@ -1,6 +1,88 @@
 import ast
-import os
+import contextlib
 import hashlib
+import re
+
+import PYTOCInliner
+import PYTOCTypes
+
+
+def c_string_literal(value):
+    """Quotes a Python string as a C string literal."""
+    escapes = {"\\": "\\\\", '"': '\\"', "\n": "\\n", "\r": "\\r", "\t": "\\t", "\0": "\\0"}
+    out = []
+    for char in value:
+        if char in escapes:
+            out.append(escapes[char])
+        elif ord(char) < 0x20 or ord(char) == 0x7f:
+            out.append(f'\\{ord(char):03o}')
+        elif ord(char) > 0x7f:
+            # Emit UTF-8 bytes as octal escapes; hex escapes would swallow following hex digits.
+            out.extend(f'\\{byte:03o}' for byte in char.encode("utf-8"))
+        else:
+            out.append(char)
+    return '"' + "".join(out) + '"'
+
+
+# Builtin exception classes the runtime defines as `Exc_<name>` in exc.h.
+EXCEPTION_TYPES = (
+    "BaseException", "Exception", "ArithmeticError", "ZeroDivisionError", "OverflowError",
+    "AssertionError", "AttributeError", "LookupError", "IndexError", "KeyError", "NameError",
+    "RuntimeError", "NotImplementedError", "TypeError", "ValueError", "OSError",
+    "FileNotFoundError", "IsADirectoryError", "EOFError", "MemoryError", "StopIteration",
+)
+
+
+# Module attributes the runtime provides, as (header, C expression).
+MODULE_ATTRIBUTES = {
+    ("sys", "stdin"): ("io.h", "stdin_file()"),
+}
+SUPPORTED_MODULES = {module for module, _ in MODULE_ATTRIBUTES}
+
+
+def scope_bindings(body):
+    """
+    Lists the names bound by the statements of one scope, in first-binding order.
+    Nested functions, classes, lambdas and comprehensions are separate scopes.
+    """
+    names = {}
+    nested = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef, ast.Lambda,
+              ast.ListComp, ast.SetComp, ast.DictComp, ast.GeneratorExp)
+    stack = list(reversed(body))
+    while stack:
+        node = stack.pop()
+        if isinstance(node, nested):
+            continue
+        if isinstance(node, ast.Name) and not isinstance(node.ctx, ast.Load):
+            names.setdefault(node.id)
+        elif isinstance(node, ast.ExceptHandler) and node.name:
+            names.setdefault(node.name)
+        stack.extend(reversed(list(ast.iter_child_nodes(node))))
+    return list(names)
+
+
+class CodeBuffer:
+    """
+    Accumulates generated C line by line and joins it once when the output is
+    taken, so building a translation unit costs time linear in its size.
+
+    Statement visitors append to the buffer of the block being transpiled (see
+    `PYTOCTranspiler.visit_body`), nested blocks included, so no block is joined
+    into a string and copied again at each level of nesting.
+    """
+
+    def __init__(self, lines=None):
+        self.lines = [] if lines is None else lines
+
+    def write(self, line):
+        self.lines.append(line)
+
+    def writelines(self, lines):
+        self.lines.extend(lines)
+
+    def getvalue(self):
+        return "\n".join(self.lines)
+
 
 class ScopedEnvironment:
     def __init__(self):
@@ -26,115 +108,155 @@ class ScopedEnvironment:
 
 
 class PYTOCTranspiler:
-    def __init__(self, debug=False):
+    def __init__(self, debug=False, function_cache=None, unbuffered=False, profile=False,
+                 inline_threshold=PYTOCInliner.DEFAULT_THRESHOLD):
         self.debug = debug
+        # Flush stdout after every print() instead of buffering the program's output.
+        self.unbuffered = unbuffered
+        # Wrap every user function in profile_enter()/profile_exit() (see profile.h).
+        self.profile = profile
+        # Functions whose calls are replaced by their body, found by visit_module and
+        # shared with function transpilers. Profiled builds keep every call.
+        self.inline_threshold = inline_threshold
+        self.inline_functions = {}
+        # Maps a hash of a top-level FunctionDef (and the signatures it can call)
+        # to its generated C, so a warm transpiler can skip unchanged functions.
+        self.function_cache = function_cache
+        self.include_recorders = []
+        self.string_recorders = []
         self.indent_level = 0
         self.indent_str = "    "
         self.temp_num = 0
 
-        self.c_code = []
         self.imports = []
+        # Headers already in `imports`, shared with function transpilers like `imports`.
+        self.included = set()
         self.func_defs = []
         self.variables = {}
+        # String literal pool: maps each literal to its static, immortal Value.
         self.constants = {}
         self.functions = {}
         self.tmps = {}
         self.inline_tmps = {}
         self.env = ScopedEnvironment()
-
-        import os
+        # Buffer of the block visit_body() is transpiling; compound statements write into it.
+        self.output = None
+        # Variables proven monomorphic by PYTOCTypes, declared as unboxed C locals.
+        self.native_vars = {}
+        # Boxed locals and parameters of the current scope, released when it exits.
+        self.owned_vars = []
+        # Autorelease pool mark taken on entry to the current function (or main).
+        self.scope_mark = None
+        # Enclosing try frames of the current function as (frame, finalbody) pairs,
+        # innermost last; a `return` pops them and runs their finally blocks.
+        self.try_stack = []
+        # C names of the exceptions being handled, innermost last, for bare `raise`.
+        self.handled_exceptions = []
 
         self.function_map = {
             "print": {
-                "lib": f"\"{os.path.abspath('include/io.c')}\"",
-                "format": "print({0}, {1}, {2})",
+                "lib": "io.h",
+                "format": "print({0}, {1}, {2}, {3})",
                 "type": "Value",
                 "args": [
-                    {"name": "*args", "type": "Value", "default": "create_string(\"\")"},
-                    {"name": "sep", "type": "Value", "default": "create_string(\" \")"},
-                    {"name": "end", "type": "Value", "default": "create_string(\"\\n\")"},
+                    {"name": "*args", "type": "Value", "literal": ""},
+                    {"name": "sep", "type": "Value", "literal": " "},
+                    {"name": "end", "type": "Value", "literal": "\n"},
+                    {"name": "flush", "type": "Value", "default": "None"},
                 ]
             },
             "input": {
-                "lib": f"\"{os.path.abspath('include/io.c')}\"",
+                "lib": "io.h",
                 "format": "input({0})",
                 "type": "Value",
-                "args": [{"name": "prompt", "type": "Value", "default": "create_string(\"\")"}],
+                "args": [{"name": "prompt", "type": "Value", "literal": ""}],
             },
             "int": {
-                "lib": f"\"{os.path.abspath('include/runtime.c')}\"",
+                "lib": "runtime.h",
                 "format": "to_int({0})",
                 "type": "Value",
                 "args": [{"name": "v", "type": "Value"}],
             },
             "str": {
-                "lib": f"\"{os.path.abspath('include/runtime.c')}\"",
+                "lib": "runtime.h",
                 "format": "to_string({0})",
                 "type": "Value",
                 "args": [{"name": "v", "type": "Value"}],
             },
             "float": {
-                "lib": f"\"{os.path.abspath('include/runtime.c')}\"",
+                "lib": "runtime.h",
                 "format": "to_float({0})",
                 "type": "Value",
                 "args": [{"name": "v", "type": "Value"}],
             },
             "list": {
-                "lib": f"\"{os.path.abspath('include/runtime.c')}\"",
+                "lib": "runtime.h",
                 "format": "to_list({0})",
                 "type": "Value",
                 "args": [{"name": "v", "type": "Value"}],
             },
             "len": {
-                "lib": f"\"{os.path.abspath('include/runtime.c')}\"",
+                "lib": "runtime.h",
                 "format": "len({0})",
                 "type": "Value",
                 "args": [{"name": "v", "type": "Value"}],
             },
             "abs": {
-                "lib": f"\"{os.path.abspath('include/runtime.c')}\"",
+                "lib": "runtime.h",
                 "format": "abs_val({0})",
                 "type": "Value",
                 "args": [{"name": "v", "type": "Value"}],
             },
             "max": {
-                "lib": f"\"{os.path.abspath('include/runtime.c')}\"",
+                "lib": "runtime.h",
                 "format": "max_val({0})",
                 "type": "Value",
                 "args": [{"name": "list", "type": "Value"}],
             },
             "min": {
-                "lib": f"\"{os.path.abspath('include/runtime.c')}\"",
+                "lib": "runtime.h",
                 "format": "min_val({0})",
                 "type": "Value",
                 "args": [{"name": "list", "type": "Value"}],
             },
             "sum": {
-                "lib": f"\"{os.path.abspath('include/runtime.c')}\"",
+                "lib": "runtime.h",
                 "format": "sum_val({0})",
                 "type": "Value",
                 "args": [{"name": "list", "type": "Value"}],
             },
+            "any": {
+                "lib": "runtime.h",
+                "format": "any_val({0})",
+                "type": "Value",
+                "args": [{"name": "iterable", "type": "Value"}],
+            },
+            "all": {
+                "lib": "runtime.h",
+                "format": "all_val({0})",
+                "type": "Value",
+                "args": [{"name": "iterable", "type": "Value"}],
+            },
             "bool": {
-                "lib": f"\"{os.path.abspath('include/runtime.c')}\"",
+                "lib": "runtime.h",
                 "format": "bool_val({0})",
                 "type": "Value",
                 "args": [{"name": "v", "type": "Value"}],
             },
             "ord": {
-                "lib": f"\"{os.path.abspath('include/runtime.c')}\"",
+                "lib": "runtime.h",
                 "format": "ord_val({0})",
                 "type": "Value",
                 "args": [{"name": "v", "type": "Value"}],
             },
             "chr": {
-                "lib": f"\"{os.path.abspath('include/runtime.c')}\"",
+                "lib": "runtime.h",
                 "format": "chr_val({0})",
                 "type": "Value",
                 "args": [{"name": "v", "type": "Value"}],
             },
             "range": {
-                "lib": f"\"{os.path.abspath('include/runtime.c')}\"",
+                "lib": "runtime.h",
                 "format": "range_val({0}, {1}, {2})",
                 "type": "Value",
                 "args": [
@@ -144,49 +266,194 @@ class PYTOCTranspiler:
                 ],
             },
             "range_start_stop": {
-                "lib": f"\"{os.path.abspath('include/runtime.c')}\"",
+                "lib": "runtime.h",
                 "format": "range_start_stop({0}, {1})",
                 "type": "Value",
                 "args": [{"name": "start", "type": "int"}, {"name": "stop", "type": "int"}],
             },
             "reversed": {
-                "lib": f"\"{os.path.abspath('include/runtime.c')}\"",
+                "lib": "runtime.h",
                 "format": "reversed_val({0})",
                 "type": "Value",
                 "args": [{"name": "v", "type": "Value"}],
             },
             "upper": {
-                "lib": f"\"{os.path.abspath('include/runtime.c')}\"",
+                "lib": "runtime.h",
                 "format": "upper_val({0})",
                 "type": "Value",
                 "args": [{"name": "v", "type": "Value"}],
             },
             "lower": {
-                "lib": f"\"{os.path.abspath('include/runtime.c')}\"",
+                "lib": "runtime.h",
                 "format": "lower_val({0})",
                 "type": "Value",
                 "args": [{"name": "v", "type": "Value"}],
             },
             "isinstance": {
-                "lib": f"\"{os.path.abspath('include/runtime.c')}\"",
+                "lib": "runtime.h",
                 "format": "isinstance_val({0}, {1})",
                 "type": "Value",
                 "args": [{"name": "v", "type": "Value"}, {"name": "type", "type": "ValueType"}],
             },
             "sorted": {
-                "lib": f"\"{os.path.abspath('include/runtime.c')}\"",
+                "lib": "runtime.h",
                 "format": "sorted_val({0})",
                 "type": "Value",
                 "args": [{"name": "list", "type": "Value"}],
             },
             "set": {
-                "lib": f"\"{os.path.abspath('include/runtime.c')}\"",
+                "lib": "runtime.h",
                 "format": "set_val({0})",
                 "type": "Value",
-                "args": [{"name": "list", "type": "Value"}],
-            }
+                "args": [{"name": "iterable", "type": "Value", "default": "None"}],
+            },
+            "frozenset": {
+                "lib": "runtime.h",
+                "format": "frozenset_val({0})",
+                "type": "Value",
+                "args": [{"name": "iterable", "type": "Value", "default": "None"}],
+            },
+            "enumerate": {
+                "lib": "runtime.h",
+                "format": "enumerate_val({0}, {1})",
+                "type": "Value",
+                "args": [{"name": "iterable", "type": "Value"}, {"name": "start", "type": "Value", "default": "None"}],
+            },
+            "zip": {
+                "lib": "runtime.h",
+                "format": "zip_val({0})",
+                "type": "Value",
+                "args": [{"name": "*iterables", "type": "Value"}],
+            },
+            "iter": {
+                "lib": "runtime.h",
+                "format": "iter_value({0})",
+                "type": "Value",
+                "args": [{"name": "iterable", "type": "Value"}],
+            },
+            "next": {
+                "lib": "runtime.h",
+                "format": "next_val({0}, {1})",
+                "type": "Value",
+                "args": [{"name": "iterator", "type": "Value"}, {"name": "default", "type": "Value", "default": "IterStop"}],
+            },
+            "open": {
+                "lib": "io.h",
+                "format": "open_file({0}, {1})",
+                "type": "Value",
+                "args": [
+                    {"name": "file", "type": "Value"},
+                    {"name": "mode", "type": "Value", "literal": "r"},
+                    {"name": "encoding", "type": "Value", "default": "None"},
+                ],
+            },
+        }
+
+        # Methods called as `obj.name(...)`; the receiver is passed as the first argument.
+        self.method_map = {
+            "append": {
+                "lib": "runtime.h",
+                "format": "list_append({0}, {1})",
+                "type": "Value",
+                "args": [{"name": "self", "type": "Value"}, {"name": "item", "type": "Value"}],
+            },
+            "extend": {
+                "lib": "runtime.h",
+                "format": "list_extend({0}, {1})",
+                "type": "Value",
+                "args": [{"name": "self", "type": "Value"}, {"name": "iterable", "type": "Value"}],
+            },
+            "pop": {
+                "lib": "runtime.h",
+                "format": "list_pop({0}, {1})",
+                "type": "Value",
+                "args": [{"name": "self", "type": "Value"}, {"name": "index", "type": "Value", "default": "None"}],
+            },
+            "insert": {
+                "lib": "runtime.h",
+                "format": "list_insert({0}, {1}, {2})",
+                "type": "Value",
+                "args": [
+                    {"name": "self", "type": "Value"},
+                    {"name": "index", "type": "Value"},
+                    {"name": "item", "type": "Value"},
+                ],
+            },
+            "add": {
+                "lib": "runtime.h",
+                "format": "set_add({0}, {1})",
+                "type": "Value",
+                "args": [{"name": "self", "type": "Value"}, {"name": "item", "type": "Value"}],
+            },
+            "get": {
+                "lib": "runtime.h",
+                "format": "dict_get({0}, {1}, {2})",
+                "type": "Value",
+                "args": [
+                    {"name": "self", "type": "Value"},
+                    {"name": "key", "type": "Value"},
+                    {"name": "default", "type": "Value", "default": "None"},
+                ],
+            },
+            "keys": {
+                "lib": "runtime.h",
+                "format": "dict_keys({0})",
+                "type": "Value",
+                "args": [{"name": "self", "type": "Value"}],
+            },
+            "values": {
+                "lib": "runtime.h",
+                "format": "dict_values({0})",
+                "type": "Value",
+                "args": [{"name": "self", "type": "Value"}],
+            },
+            "items": {
+                "lib": "runtime.h",
+                "format": "dict_items({0})",
+                "type": "Value",
+                "args": [{"name": "self", "type": "Value"}],
+            },
+            "upper": {
+                "lib": "runtime.h",
+                "format": "upper_val({0})",
+                "type": "Value",
+                "args": [{"name": "self", "type": "Value"}],
+            },
+            "lower": {
+                "lib": "runtime.h",
+                "format": "lower_val({0})",
+                "type": "Value",
+                "args": [{"name": "self", "type": "Value"}],
+            },
+            "read": {
+                "lib": "io.h",
+                "format": "file_read({0}, {1})",
+                "type": "Value",
+                "args": [{"name": "self", "type": "Value"}, {"name": "size", "type": "Value", "default": "None"}],
+            },
+            "readline": {
+                "lib": "io.h",
+                "format": "file_readline({0})",
+                "type": "Value",
+                "args": [{"name": "self", "type": "Value"}],
+            },
+            "readlines": {
+                "lib": "io.h",
+                "format": "file_readlines({0})",
+                "type": "Value",
+                "args": [{"name": "self", "type": "Value"}],
+            },
+            "close": {
+                "lib": "io.h",
+                "format": "file_close({0})",
+                "type": "Value",
+                "args": [{"name": "self", "type": "Value"}],
+            },
         }
 
+        # Names bound by `import`, mapped to the module they refer to.
+        self.modules = {}
+
     def debug_log(self, kind, message):
         if self.debug:
             print(f"{self.indent_str * self.indent_level}[{kind}] {message}")
@@ -196,188 +463,329 @@ class PYTOCTranspiler:
         return self.indent_str * self.indent_level
 
     def new_temp(self, prefix="_tmp", code=None):
-        temp_hash = hashlib.md5(str(self.temp_num).encode()).hexdigest()[:8]
+        # The counter makes names unique within the scope: the suffix after the
+        # last underscore is always the counter, so prefixes cannot clash.
+        temp_name = f"{prefix}_{self.temp_num}"
         self.temp_num += 1
-        temp_name = f"{prefix}{temp_hash}"
         if code is not None:
             self.tmps[temp_name] = code
         return temp_name
 
-    def _unique_label(self, prefix="label"):
-        if not hasattr(self, "_label_counter"):
-            self.temp_num = 0
-        label = f"{prefix}_{self.temp_num}"
-        self.temp_num += 1
-        return label
-
     def new_temp_inplace(self, prefix="_tmp", code=None):
-        temp_hash = hashlib.md5(str(self.temp_num).encode()).hexdigest()[:8]
+        temp_name = f"{prefix}_{self.temp_num}"
         self.temp_num += 1
-        temp_name = f"{prefix}{temp_hash}"
         if code is not None:
             self.inline_tmps[temp_name] = code
-        return temp_name.replace("{{ temp_name }}", temp_name)
+        return temp_name
 
-    def visit(self, node):
-        result = self.evaluate(node)
-        if isinstance(result, dict) and result.get('stmt'):
-            self.c_code.append(self.indent + result['code'])
-        return result
-
-    def evaluate(self, node):
-        dispatch = {
-            "Module": self.visit_module,
-            "Assign": self.visit_assign,
-            "AugAssign": self.visit_aug_assign,
-            "Call": self.visit_call,
-            "Name": self.visit_name,
-            "Constant": self.visit_constant,
-            "Expr": self.visit_expr,
-            "List": self.visit_list,
-            "Dict": self.visit_dict,
-            "Tuple": self.visit_tuple,
-            "FunctionDef": self.visit_function_def,
-            "Return": self.visit_return,
-            "BinOp": self.visit_binop,
-            "JoinedStr": self.visit_joined_str,
-            "FormattedValue": self.visit_formatted_value,
-            "For": self.visit_for,
-            "While": self.visit_while,
-            "Compare": self.visit_compare,
-            "Assert": self.visit_assert,
-            "UnaryOp": self.visit_unary_op,
-            "Try": self.visit_try,
-            "ExceptHandler": self.visit_except_handler,
-            "Pass": lambda node: {"code": "", "stmt": False},
-            "Raise": self.visit_raise,
-        }
-        node_type = type(node).__name__
-        if node_type in dispatch:
-            return dispatch[node_type](node)
-        else:
-            raise NotImplementedError(f"Unsupported AST node type: {node_type}")
+    def include(self, header):
+        for recorder in self.include_recorders:
+            recorder.add(header)
+        if header not in self.included:
+            self.included.add(header)
+            self.imports.append(f'#include "{header}"')
+
+    def string_literal(self, value):
+        """
+        Interns a string literal into the program's static pool.
+
+        Returns:
+            str: Name of the immortal `Value` holding the literal.
+        """
+        for recorder in self.string_recorders:
+            recorder.add(value)
+        name = self.constants.get(value)
+        if name is None:
+            # Named by content so cached function bodies keep referring to the right entry.
+            name = "_str" + hashlib.md5(value.encode("utf-8", "surrogatepass")).hexdigest()[:12]
+            self.constants[value] = name
+        return name
+
+    def string_pool(self):
+        return [
+            f"PYTOC_STRING({name}, {c_string_literal(value)});"
+            for value, name in sorted(self.constants.items(), key=lambda item: item[1])
+        ]
 
-    def visit_raise(self, node):
-        if not f'#include "{os.path.abspath("include/exc.c")}"' in self.imports:
-            self.imports.append(f'#include "{os.path.abspath("include/exc.c")}"')
+    def visit(self, node):
+        """
+        Transpiles one node through the class-level dispatch table.
+
+        Returns:
+            dict: `code` (the C), `stmt` (whether it is a statement) and optionally
+                `native` (the statement creates no temporaries to drain).
+        """
+        visitor = self.DISPATCH.get(type(node))
+        if visitor is None:
+            raise NotImplementedError(f"Unsupported AST node type: {type(node).__name__}")
+        return visitor(self, node)
+
+    def native_expr(self, node):
+        """
+        Emits an expression on unboxed C values if its type can be proven.
+
+        Returns:
+            tuple | None: (C code, native type), or None if the expression needs boxed Values.
+        """
+        native_type = PYTOCTypes.expr_type(node, self.native_vars, self.inline_functions)
+        if native_type is None:
+            return None
+        self.include("native.h")
+        return self._native_code(node), native_type
+
+    def _native_code(self, node):
+        if isinstance(node, ast.Constant):
+            value = node.value
+            if isinstance(value, bool):
+                return "1" if value else "0"
+            if isinstance(value, int):
+                return f"{value}LL" if value != PYTOCTypes.INT_MIN else "(-9223372036854775807LL - 1)"
+            return repr(value)
+        if isinstance(node, ast.Name):
+            return node.id
+        if isinstance(node, ast.BinOp):
+            left = self._native_code(node.left)
+            right = self._native_code(node.right)
+            op = node.op.__class__.__name__
+            is_int = PYTOCTypes.expr_type(node, self.native_vars, self.inline_functions) == PYTOCTypes.INT
+            if op in ("Add", "Sub", "Mult"):
+                symbol = {"Add": "+", "Sub": "-", "Mult": "*"}[op]
+                return f"({left} {symbol} {right})"
+            if op == "Div":
+                return f"py_div({left}, {right})"
+            if op == "FloorDiv":
+                return f"py_floordiv_ll({left}, {right})" if is_int else f"py_floordiv_d({left}, {right})"
+            if op == "Mod":
+                return f"py_mod_ll({left}, {right})" if is_int else f"py_mod_d({left}, {right})"
+            if op == "Pow":
+                return f"py_pow_ll({left}, {right})" if is_int else f"pow({left}, {right})"
+        if isinstance(node, ast.UnaryOp):
+            operand = self._native_code(node.operand)
+            symbol = {"Not": "!", "USub": "-", "UAdd": "+"}[node.op.__class__.__name__]
+            return f"({symbol}{operand})"
+        if isinstance(node, ast.Compare):
+            symbols = {"Eq": "==", "NotEq": "!=", "Lt": "<", "LtE": "<=", "Gt": ">", "GtE": ">="}
+            operands = [self._native_code(operand) for operand in [node.left, *node.comparators]]
+            parts = [
+                f"({operands[i]} {symbols[op.__class__.__name__]} {operands[i + 1]})"
+                for i, op in enumerate(node.ops)
+            ]
+            return parts[0] if len(parts) == 1 else f"({' && '.join(parts)})"
+        if isinstance(node, ast.Call):
+            return self.inline_native(node)
+        raise NotImplementedError(f"Unsupported native expression: {type(node).__name__}")
+
+    def boxed_native(self, node):
+        """Returns the boxed Value code for a provably native expression, or None."""
+        native = self.native_expr(node)
+        if native is None:
+            return None
+        code, native_type = native
+        return {"code": PYTOCTypes.BOXERS[native_type].format(code), "stmt": False}
+
+    def native_declarations(self, body):
+        # Unboxed locals live in registers; a longjmp back into a try would restore
+        # stale copies, so scopes with a `try` keep them volatile.
+        qualifier = "volatile " if any(isinstance(n, ast.Try) for stmt in body for n in ast.walk(stmt)) else ""
+        return [
+            f"{qualifier}{PYTOCTypes.C_TYPES[native_type]} {name} = 0;"
+            for name, native_type in sorted(self.native_vars.items())
+        ]
 
-        self.debug_log("Raise", "Visiting raise statement")
-        exc_type = node.exc
-        exc_code = self.visit(exc_type)
-        raise_code = f"raise_exception({exc_type}, {exc_code['code']})"
-        return {"code": raise_code, "stmt": True}
+    def visit_body(self, stmts, mark=None, out=None):
+        """
+        Transpiles a block of statements into indented C lines.
+
+        Temporaries are drained from the autorelease pool after every statement. The
+        block takes its own pool mark first unless `mark` names one set up by the caller
+        (loops take it before the loop so temporaries of the condition are drained too).
+
+        Simple statements return their code; compound statements write their lines
+        straight into `out` at the current indent (returning `"written": True`), and
+        their nested blocks write into the same buffer.
+
+        Args:
+            stmts (list): The statements.
+            mark (str, optional): Pool mark set up by the caller.
+            out (CodeBuffer, optional): Buffer to append to; a new one if omitted.
+
+        Returns:
+            list: The lines of `out`.
+        """
+        if out is None:
+            out = CodeBuffer()
+        if mark is None:
+            mark = self.new_temp("_mark")
+            out.write(f"{self.indent}size_t {mark} = pool_mark();")
+        outer_output, self.output = self.output, out
+        outer_tmps = self.inline_tmps
+        self.inline_tmps = {}
+        for stmt in stmts:
+            result = self.visit(stmt)
+            self.write_inline_tmps()
+            code = result['code']
+            if code:
+                if result['stmt'] and not code.endswith((";", "}")):
+                    code += ";"
+                out.write(self.indent + code)
+            elif result.get('written'):
+                if result['stmt'] and not out.lines[-1].endswith((";", "}")):
+                    out.lines[-1] += ";"
+            else:
+                continue
+            if not result.get('native'):
+                out.write(f"{self.indent}pool_drain({mark});")
+        self.inline_tmps = outer_tmps
+        self.output = outer_output
+        return out.lines
+
+    def write_inline_tmps(self):
+        """Writes the declarations of the pending inline temporaries to the current block."""
+        if self.inline_tmps:
+            self.debug_log("InlineTmps", f"Inlined temporary variables: {self.inline_tmps}")
+        for tmp_name, tmp_code in self.inline_tmps.items():
+            self.output.write(f"{self.indent}{str(tmp_code).replace('{{ temp_name }}', str(tmp_name))};")
+        self.inline_tmps.clear()
 
-    def visit_except_handler(self, node):
-        self.debug_log("ExceptHandler", "Visiting except handler")
+    def scope_declarations(self, body, params=()):
+        """
+        Declares every boxed local of a scope up front, initialized to None, and
+        records them (with the parameters) as owned by the scope.
+        """
+        names = [name for name in scope_bindings(body) if name not in self.native_vars and name not in params]
+        self.owned_vars = [*params, *names]
+        return [f"Value {name} = None;" for name in names]
+
+    def scope_cleanup(self):
+        """Releases the scope's locals and everything it left in the autorelease pool."""
+        lines = [f"release_value({name});" for name in self.owned_vars]
+        lines.append(f"pool_drain({self.scope_mark});")
+        return lines
 
-        # Create a new temporary variable for the exception
-        exc_var = self.new_temp("_exc")
-        self.variables[exc_var] = "Value"
+    def visit_raise(self, node):
+        self.include("exc.h")
+        self.debug_log("Raise", "Visiting raise statement")
 
-        # Generate code for the exception handler
-        handler_code = []
-        if node.type:
-            type_code = self.visit(node.type)['code']
-            handler_code.append(f"if (isinstance({exc_var}, {type_code})) {{")
+        if node.exc is None:
+            if not self.handled_exceptions:
+                raise SyntaxError("No active exception to re-raise")
+            exc_code = self.handled_exceptions[-1]
+        elif isinstance(node.exc, ast.Name) and node.exc.id in EXCEPTION_TYPES:
+            exc_code = f"create_exception(&Exc_{node.exc.id}, None)"
         else:
-            handler_code.append("{")
+            exc_code = self.visit(node.exc)['code']
+        return {"code": f"raise_exception({exc_code})", "stmt": True}
+
+    def exception_match(self, type_node, exc_name):
+        """C condition testing whether `exc_name` is an instance of an except clause's type(s)."""
+        types = type_node.elts if isinstance(type_node, ast.Tuple) else [type_node]
+        checks = []
+        for node in types:
+            if not isinstance(node, ast.Name) or node.id not in EXCEPTION_TYPES:
+                raise NotImplementedError("Only builtin exception types can be caught")
+            checks.append(f"exception_matches({exc_name}, &Exc_{node.id})")
+        return " || ".join(checks)
+
+    def visit_except_handler(self, node, exc_name, clause):
+        """
+        Writes one `except` clause as an if/else-if branch testing `exc_name`, opened
+        with `clause` (the indent, or `} else ` for every clause but the first) and
+        left open for the next one.
+        """
+        self.debug_log("ExceptHandler", "Visiting except handler")
 
+        condition = self.exception_match(node.type, exc_name) if node.type is not None else "1"
+        out = self.output
+        out.write(f"{clause}if ({condition}) {{")
         self.indent_level += 1
-        for stmt in node.body:
-            result = self.visit(stmt)
-            if result['stmt']:
-                handler_code.append(self.indent + result['code'] + ";")
-            else:
-                handler_code.append(self.indent + result['code'])
+        if node.name:
+            out.write(f"{self.indent}assign_value(&{node.name}, {exc_name});")
+        self.handled_exceptions.append(exc_name)
+        self.visit_body(node.body, out=out)
+        self.handled_exceptions.pop()
         self.indent_level -= 1
 
-        handler_code.append(f"{self.indent}}}")
-
-        return {"code": "\n".join(handler_code), "stmt": True}
-
     def visit_try(self, node):
+        """
+        Lowers try/except/else/finally onto the setjmp-based TRY/CATCH/END_TRY macros.
+
+        The body runs under a TryFrame; a raise unwinds to it and the except clauses
+        are tested in order, re-raising if none matches. `finally` wraps everything
+        in a second frame that catches any exception, runs the final block and then
+        re-raises what it caught.
+        """
         self.debug_log("Try", "Visiting try block")
+        self.include("exc.h")
+        out = self.output
+
+        if node.finalbody:
+            frame = self.new_temp("_frame")
+            out.write(f"{self.indent}TryFrame {frame};")
+            out.write(f"{self.indent}TRY({frame})")
+            self.try_stack.append((frame, node.finalbody))
+            self.indent_level += 1
+            if node.handlers:
+                self.try_except(node)
+            else:
+                self.visit_body(node.body, out=out)
+            self.indent_level -= 1
+            self.try_stack.pop()
+            out.write(f"{self.indent}CATCH({frame})")
+            out.write(f"{self.indent}END_TRY({frame})")
+            self.visit_body(node.finalbody, out=out)
+            out.write(f"{self.indent}if ({frame}.exception.type != TYPE_NONE) raise_exception({frame}.exception);")
+        else:
+            self.try_except(node)
+        return {"code": None, "stmt": True, "written": True}
 
-        try_catch_include = f'#include "{os.path.abspath("include/try-catch.c")}"'
-        if try_catch_include not in self.imports:
-            self.imports.append(try_catch_include)
-        exc_include = f'#include "{os.path.abspath("include/exc.c")}"'
-        if exc_include not in self.imports:
-            self.imports.append(exc_include)
-
-        ctx_name = self.new_temp(prefix="_ctx")
-        exc_name = self.new_temp(prefix="_exc")
-        exc_name_2 = self.new_temp("_exc")
+    def try_except(self, node):
+        frame = self.new_temp("_frame")
+        exc_name = self.new_temp("_exc")
+        completed = self.new_temp("_completed")
+        out = self.output
 
-        declaration = f"TryCatchContext {ctx_name};"
-        exc_declaration = f"Exception {exc_name};"
-        self.indent_level -= 1
-        declaration_2 = f"{self.indent}TryCatchContext *{exc_name_2};"
-        try_header = f"{self.indent}TRY(&{ctx_name}) {{"
-        catch_header = f"{self.indent}}} CATCH(&{ctx_name}, {exc_name}) {{"
-        try_ending = f"{self.indent}}} END_TRY(&{ctx_name})"
+        out.write(f"{self.indent}TryFrame {frame};")
+        if node.orelse:
+            out.write(f"{self.indent}volatile int {completed} = 0;")
+        out.write(f"{self.indent}TRY({frame})")
 
-        # Generate TRY body
+        self.try_stack.append((frame, None))
         self.indent_level += 1
-        try_code = []
-        for stmt in node.body:
-            result = self.visit(stmt)
-            code_line = self.indent + result['code']
-            if result['stmt']:
-                code_line += ";"
-            try_code.append(code_line)
+        self.visit_body(node.body, out=out)
+        if node.orelse:
+            out.write(f"{self.indent}{completed} = 1;")
         self.indent_level -= 1
+        self.try_stack.pop()
 
+        out.write(f"{self.indent}CATCH({frame})")
         self.indent_level += 1
-        except_code = []
-
+        out.write(f"{self.indent}Value {exc_name} = {frame}.exception; (void){exc_name};")
+        clause = self.indent
         for handler in node.handlers:
-            if handler.type is not None and hasattr(handler.type, 'id'):
-                exception_type = handler.type.id
-            else:
-                exception_type = "Exception"
+            self.visit_except_handler(handler, exc_name, clause)
+            clause = f"{self.indent}}} else "
+        if not node.handlers or node.handlers[-1].type is not None:
+            out.write(f"{clause}{{")
+            out.write(f"{self.indent}{self.indent_str}raise_exception({exc_name});")
+            out.write(f"{self.indent}}}")
+        else:
+            out.write(f"{self.indent}}}")
+        self.indent_level -= 1
+        out.write(f"{self.indent}END_TRY({frame})")
 
-            # NOTE: `_exc` is a C-side variable you must define in your runtime
-            except_code.append(f"{self.indent}Value {exc_name} = make_value_from_exc({exc_name_2});")
-            check_line = f"{self.indent}if (is_true(isinstance(&{exc_name}, &{exception_type}))) {{"
-            except_code.append(check_line)
-            old_temps_inplace = self.inline_tmps
+        if node.orelse:
+            out.write(f"{self.indent}if ({completed}) {{")
             self.indent_level += 1
-            for stmt in handler.body:
-                self.inline_tmps.clear()
-                result = self.visit(stmt)
-                if self.inline_tmps:
-                    self.debug_log("InlineTmps", f"Inlined temporary variables: {self.inline_tmps}")
-                for tmp_name, tmp_code in self.inline_tmps.items():
-                    line = f"{self.indent}{str(tmp_code).replace('{{ temp_name }}', str(tmp_name))};"
-                    except_code.append(line)
-                line = self.indent + result['code']
-                if result['stmt']:
-                    line += ";"
-                except_code.append(line)
+            self.visit_body(node.orelse, out=out)
             self.indent_level -= 1
-            except_code.append(self.indent + "}")
-
-        # Restore the original inline temporary variables
-        self.inline_tmps = old_temps_inplace
-        self.indent_level -= 1
-
-        full_code = "\n".join([
-            declaration,
-            declaration_2,
-            try_header,
-            *try_code,
-            catch_header,
-            *except_code,
-            try_ending,
-        ])
-
-        return {"code": full_code, "stmt": True}
+            out.write(f"{self.indent}}}")
 
     def visit_unary_op(self, node):
         self.debug_log("UnaryOp", "Visiting unary operation")
-        if not f'#include "{os.path.abspath("include/ops.c")}"' in self.imports:
-            self.imports.append(f'#include "{os.path.abspath("include/ops.c")}"')
+        native = self.boxed_native(node)
+        if native is not None:
+            return native
+        self.include("ops.h")
 
         operand_code = self.visit(node.operand)['code']
         op_class = node.op.__class__.__name__
@@ -398,8 +806,7 @@ class PYTOCTranspiler:
 
     def visit_assert(self, node):
         self.debug_log("Assert", "Visiting assert statement")
-        if not f'#include "{os.path.abspath("include/ops.c")}"' in self.imports:
-            self.imports.append(f'#include "{os.path.abspath("include/ops.c")}"')
+        self.include("ops.h")
 
         condition_code = self.visit(node.test)['code']
         message_code = self.visit(node.msg)['code'] if node.msg else 'None'
@@ -409,8 +816,10 @@ class PYTOCTranspiler:
 
     def visit_compare(self, node):
         self.debug_log("Compare", "Visiting comparison")
-        if not f'#include "{os.path.abspath("include/ops.c")}"' in self.imports:
-            self.imports.append(f'#include "{os.path.abspath("include/ops.c")}"')
+        native = self.boxed_native(node)
+        if native is not None:
+            return native
+        self.include("ops.h")
 
         left_code = self.visit(node.left)['code']
         op_code = node.ops[0].__class__.__name__
@@ -424,6 +833,8 @@ class PYTOCTranspiler:
             "LtE": "le_values",
             "Gt": "gt_values",
             "GtE": "ge_values",
+            "In": "in_values",
+            "NotIn": "not_in_values",
         }
 
         if op_code not in op_map:
@@ -436,40 +847,43 @@ class PYTOCTranspiler:
     def visit_while(self, node):
         self.debug_log("While", "Visiting while loop")
 
-        condition_code = self.visit(node.test)['code']
-        loop_body = []
+        condition_code = self.condition(node.test)
 
+        # One mark for the whole loop, so the condition's temporaries are drained each iteration.
+        mark = self.new_temp("_mark")
+        self.write_inline_tmps()
+        out = self.output
+        out.write(f"{self.indent}size_t {mark} = pool_mark();")
+        out.write(f"{self.indent}while ({condition_code}) {{")
         self.indent_level += 1
-        for stmt in node.body:
-            result = self.visit(stmt)
-            if result['stmt']:
-                loop_body.append(self.indent + result['code'] + ";")
-            else:
-                loop_body.append(self.indent + result['code'])
-
+        self.visit_body(node.body, mark=mark, out=out)
         self.indent_level -= 1
-
-        loop_code = f"{self.indent}while (is_true({condition_code})) {{\n"
-        loop_code += "\n".join(loop_body)
-        loop_code += f"\n{self.indent}}}"
-
-        return {"code": loop_code, "stmt": True}
+        out.write(f"{self.indent}}}")
+        return {"code": None, "stmt": True, "written": True}
 
     def visit_aug_assign(self, node):
         self.debug_log("AugAssign", "Visiting augmented assignment")
-        if not f'#include "{os.path.abspath("include/ops.c")}"' in self.imports:
-            self.imports.append(f'#include "{os.path.abspath("include/ops.c")}"')
+        self.include("ops.h")
 
         target = node.target
-        target_name = target.id
         op = node.op.__class__.__name__
 
+        if isinstance(target, ast.Subscript):
+            return self.visit_subscript_aug_assign(node)
+
+        target_name = target.id
+        if target_name in self.native_vars:
+            value = ast.BinOp(left=ast.Name(id=target_name, ctx=ast.Load()), op=node.op, right=node.value)
+            return {"code": f"{target_name} = {self.native_expr(value)[0]}", "stmt": True, "native": True}
+
         # Map Python AST operator classes to runtime C functions
         op_map = {
-            "Add": "add_values",
+            "Add": "iadd_values",
             "Sub": "sub_values",
             "Mult": "mul_values",
             "Div": "div_values",
+            "BitOr": "or_values",
+            "BitAnd": "and_values",
         }
 
         if op not in op_map:
@@ -477,52 +891,279 @@ class PYTOCTranspiler:
 
         func = op_map[op]
         value_code = self.visit(node.value)['code']
-        code = f"{target_name} = {func}({target_name}, {value_code})"
+        code = f"assign_value(&{target_name}, {func}({target_name}, {value_code}))"
 
         return {"code": code, "stmt": True}
 
+    def visit_subscript_aug_assign(self, node):
+        # `c[k] op= v`: evaluate the container and key once, then read, combine and store.
+        self.include("runtime.h")
+        op_map = {
+            "Add": "iadd_values",
+            "Sub": "sub_values",
+            "Mult": "mul_values",
+            "Div": "div_values",
+        }
+        op = node.op.__class__.__name__
+        if op not in op_map:
+            raise NotImplementedError(f"Unsupported augmented assignment operator: {op}")
+
+        container = self.new_temp_inplace("_container", f"Value {{{{ temp_name }}}} = {self.visit(node.target.value)['code']}")
+        key = self.new_temp_inplace("_key", f"Value {{{{ temp_name }}}} = {self.subscript_key(node.target)}")
+        value_code = self.visit(node.value)['code']
+        code = f"setitem_value({container}, {key}, {op_map[op]}(getitem_value({container}, {key}), {value_code}))"
+        return {"code": code, "stmt": True}
+
     def visit_for(self, node):
         self.debug_log("For", "Visiting for loop")
 
-        loop_var = node.target.id
-        iter_expr = self.visit(node.iter)
-        iter_code = iter_expr['code']
+        range_args = PYTOCTypes.range_args(node.iter)
+        if isinstance(node.target, ast.Name) and range_args is not None and "range" not in self.functions:
+            return self.visit_range_for(node, range_args)
 
-        iter_tmp = self.new_temp("_iter")
-        index_var = self.new_temp("_index")
-
-        # Save the iterable in a temporary variable
-        init_iter = f"Value {iter_tmp} = {iter_code};"
-        loop_header = f"{self.indent}for (int {index_var} = 0; {index_var} < {iter_tmp}.list_val.count; {index_var}++) {{"
+        self.include("runtime.h")
+        setup, conditions, binds = [], [], []
+        self.loop_streams(node.iter, node.target, setup, conditions, binds)
+        mark = self.new_temp("_mark")
 
+        self.write_inline_tmps()
+        out = self.output
+        out.writelines(self.indent + line for line in [*setup, f"size_t {mark} = pool_mark();",
+                                                       f"while ({' && '.join(conditions)}) {{"])
         self.indent_level += 1
-        loop_body = [f"{self.indent}Value {loop_var} = {iter_tmp}.list_val.items[{index_var}];"]
+        out.writelines(self.indent + line for line in binds)
+        self.visit_body(node.body, mark=mark, out=out)
+        self.indent_level -= 1
+        out.write(f"{self.indent}}}")
+        return {"code": None, "stmt": True, "written": True}
+
+    def loop_builtin(self, node):
+        """Name of the builtin a for-loop iterable calls, if it is one `loop_streams` can see through."""
+        if (
+            isinstance(node, ast.Call)
+            and isinstance(node.func, ast.Name)
+            and node.func.id in ("enumerate", "zip", "reversed", "map", "range")
+            and node.func.id not in self.functions
+            and not any(isinstance(arg, ast.Starred) for arg in node.args)
+        ):
+            return node.func.id
+        return None
+
+    def loop_streams(self, node, target, setup, conditions, binds, lengths=None):
+        """
+        Lowers the iterable of a for-loop into the pieces of a C `while` loop.
+
+        enumerate(), zip(), reversed(), map(), range() and dict views are seen
+        through, so the loop walks the underlying containers by index and binds
+        the target directly instead of building iterators, tuples or lists.
+        Anything else is walked with `loop_next`.
+
+        Args:
+            node (ast.expr): The iterable.
+            target (ast.expr | str): The loop target, or a C variable receiving the items fed to map().
+            setup (list): Statements run once before the loop; appended to.
+            conditions (list): C conditions advancing each cursor, tested in order; appended to.
+            binds (list): Statements binding the target at the top of each iteration; appended to.
+            lengths (list, optional): C expressions for the number of items each underlying
+                source yields (0 if unknown); appended to.
+        """
+        if lengths is None:
+            lengths = []
+        builtin = self.loop_builtin(node)
+        unpacked = isinstance(target, (ast.Tuple, ast.List)) and not any(isinstance(e, ast.Starred) for e in target.elts)
+        keywords = {kw.arg for kw in node.keywords} if isinstance(node, ast.Call) else set()
+
+        if builtin == "enumerate" and unpacked and len(target.elts) == 2 and keywords <= {"start"} \
+                and len(node.args) + len(keywords) in (1, 2) and node.args:
+            inner_binds = []
+            self.loop_streams(node.args[0], target.elts[1], setup, conditions, inner_binds, lengths)
+            start = node.args[1] if len(node.args) == 2 else next((kw.value for kw in node.keywords), None)
+            counter = self.new_temp("_count")
+            setup.append(f"long long {counter} = {self.range_bound(start) if start is not None else '0LL'};")
+            binds.extend(self.bind_item(target.elts[0], f"create_int({counter}++)"))
+            binds.extend(inner_binds)
+            return
+
+        if builtin == "zip" and unpacked and not keywords and node.args and len(target.elts) == len(node.args):
+            # && stops at the first exhausted iterable, after advancing the ones before it, as zip() does.
+            for arg, element in zip(node.args, target.elts):
+                self.loop_streams(arg, element, setup, conditions, binds, lengths)
+            return
+
+        if builtin == "map" and not keywords and len(node.args) >= 2:
+            arg_names = []
+            for arg in node.args[1:]:
+                arg_name = self.new_temp("_arg")
+                setup.append(f"Value {arg_name};")
+                self.loop_streams(arg, arg_name, setup, conditions, binds, lengths)
+                arg_names.append(arg_name)
+            call = self.map_call(node.args[0], arg_names)
+            if isinstance(target, (ast.Tuple, ast.List)):
+                # Call once per item, not once per unpacked name.
+                mapped = self.new_temp("_mapped")
+                setup.append(f"Value {mapped};")
+                binds.append(f"{mapped} = {call};")
+                call = mapped
+            binds.extend(self.bind_item(target, call))
+            return
+
+        if builtin == "range" and PYTOCTypes.range_args(node) is not None:
+            bounds = [self.range_bound(arg) for arg in node.args]
+            start, stop, step = ("0LL", bounds[0], "1LL") if len(bounds) == 1 else (bounds + ["1LL"])[:3]
+            start_var, stop_var, step_var = self.new_temp("_start"), self.new_temp("_stop"), self.new_temp("_step")
+            count_var, index_var = self.new_temp("_count"), self.new_temp("_index")
+            setup.extend([
+                f"long long {start_var} = {start};",
+                f"long long {stop_var} = {stop};",
+                f"long long {step_var} = {step};",
+                f"long long {count_var} = range_len({start_var}, {stop_var}, {step_var});",
+                f"long long {index_var} = 0;",
+            ])
+            conditions.append(f"{index_var} < {count_var}")
+            lengths.append(f"(size_t){count_var}")
+            item_code = f"{start_var} + {index_var}++ * {step_var}"
+            if isinstance(target, ast.Name) and self.native_vars.get(target.id) == PYTOCTypes.INT:
+                binds.append(f"{target.id} = {item_code};")
+            else:
+                binds.extend(self.bind_item(target, f"create_int({item_code})"))
+            return
 
-        inline_tmps = self.inline_tmps
+        iter_tmp = self.new_temp("_iter")
+        index_var = self.new_temp("_index")
 
-        for stmt in node.body:
-            self.inline_tmps.clear()
-            result = self.visit(stmt)
-            if self.inline_tmps:
-                self.debug_log("InlineTmps", f"Inlined temporary variables: {self.inline_tmps}")
-            for tmp_name, tmp_code in self.inline_tmps.items():
-                loop_body.append(f"{self.indent}{str(tmp_code).replace('{{ temp_name }}', str(tmp_name))};")
-            if result['stmt']:
-                if result['code'].endswith(";"):
-                    loop_body.append(self.indent + result['code'])
-                else:
-                    loop_body.append(self.indent + result['code'] + ";")
+        if (
+            isinstance(node, ast.Call)
+            and isinstance(node.func, ast.Attribute)
+            and node.func.attr in ("keys", "values", "items")
+            and not node.args
+            and not node.keywords
+            and (node.func.attr != "items" or (unpacked and len(target.elts) == 2))
+        ):
+            receiver = self.visit(node.func.value)["code"]
+            setup.append(f'Value {iter_tmp} = autorelease_value(retain_value(as_dict({receiver}, "{node.func.attr}")));')
+            setup.append(f"size_t {index_var} = 0;")
+            conditions.append(f"{index_var} < (size_t){iter_tmp}.dict_val->count")
+            lengths.append(f"(size_t){iter_tmp}.dict_val->count")
+            entry = f"{iter_tmp}.dict_val->entries[{index_var}]"
+            if node.func.attr == "items":
+                binds.extend(self.bind_item(target.elts[0], f"{entry}.key"))
+                binds.extend(self.bind_item(target.elts[1], f"{entry}.value"))
             else:
-                loop_body.append(self.indent + result['code'])
+                binds.extend(self.bind_item(target, f"{entry}.{'key' if node.func.attr == 'keys' else 'value'}"))
+            binds.append(f"{index_var}++;")
+            return
+
+        item = self.new_temp("_item")
+        if builtin == "reversed" and len(node.args) == 1 and not keywords:
+            iter_code = self.visit(node.args[0])["code"]
+            # Hold the iterable for the whole loop even if the body rebinds its variable.
+            setup.append(f"Value {iter_tmp} = autorelease_value(retain_value(loop_source_reversed({iter_code})));")
+            setup.append(f"size_t {index_var} = loop_end({iter_tmp});")
+            conditions.append(f"loop_prev({iter_tmp}, &{index_var}, &{item})")
+            lengths.append(index_var)
+        else:
+            iter_code = self.visit(node)["code"]
+            setup.append(f"Value {iter_tmp} = autorelease_value(retain_value(loop_source({iter_code})));")
+            setup.append(f"size_t {index_var} = 0;")
+            conditions.append(f"loop_next({iter_tmp}, &{index_var}, &{item})")
+            lengths.append(f"loop_length({iter_tmp})")
+        setup.append(f"Value {item};")
+        binds.extend(self.bind_item(target, item))
+
+    def bind_item(self, target, value_code):
+        if isinstance(target, str):
+            return [f"{target} = {value_code};"]
+        return self.bind_target(target, value_code)
+
+    def map_call(self, func, arg_names):
+        """C call applying map()'s function to the C variables `arg_names` inside a loop."""
+        inline_tmps = len(self.inline_tmps)
+        call = ast.Call(func=func, args=[ast.Name(id=name, ctx=ast.Load()) for name in arg_names], keywords=[])
+        code = self.visit(call)["code"]
+        if len(self.inline_tmps) != inline_tmps:
+            raise NotImplementedError("map() only supports functions taking the items as their arguments")
+        return code
+
+    def map_function(self, func, arity):
+        """C name of a function passed to a runtime map() over `arity` iterables."""
+        if isinstance(func, ast.Name):
+            if func.id in self.functions:
+                if len(self.functions[func.id]["args"]) == arity:
+                    return func.id
+            elif func.id in self.function_map:
+                info = self.function_map[func.id]
+                match = re.fullmatch(r"(\w+)\(\{0\}\)", info["format"])
+                if match and arity == 1:
+                    self.include(info["lib"])
+                    return match.group(1)
+        raise NotImplementedError("map() only supports named functions taking one argument per iterable")
+
+    def bind_target(self, target, value_code):
+        """
+        Returns the C statements that bind a loop target to `value_code`,
+        unpacking tuple targets such as `for k, v in d.items()`.
+        """
+        if isinstance(target, ast.Name):
+            return [f"assign_value(&{target.id}, {value_code});"]
+        if isinstance(target, (ast.Tuple, ast.List)):
+            if any(isinstance(element, ast.Starred) for element in target.elts):
+                raise NotImplementedError("Starred loop targets not supported yet")
+            lines = []
+            for i, element in enumerate(target.elts):
+                lines.extend(self.bind_target(element, f"getitem_value({value_code}, create_int({i}))"))
+            return lines
+        raise NotImplementedError(f"Unsupported loop target: {type(target).__name__}")
+
+    def range_bound(self, node):
+        native = self.native_expr(node)
+        if native is not None and native[1] in (PYTOCTypes.INT, PYTOCTypes.BOOL):
+            return native[0]
+        return f"range_arg({self.visit(node)['code']})"
+
+    def visit_range_for(self, node, range_args):
+        """
+        Lowers `for x in range(...)` to a C counting loop without building the list.
+
+        The trip count is computed up front by `range_len`, so empty ranges, negative
+        steps and step values only known at runtime behave as in Python.
+        """
+        loop_var = node.target.id
+        start, stop, step = "0LL", None, "1LL"
+        bounds = [self.range_bound(arg) for arg in range_args]
+        if len(bounds) == 1:
+            stop = bounds[0]
+        elif len(bounds) == 2:
+            start, stop = bounds
+        else:
+            start, stop, step = bounds
 
-        self.inline_tmps.clear()
-        self.inline_tmps = inline_tmps
+        start_var = self.new_temp("_start")
+        stop_var = self.new_temp("_stop")
+        step_var = self.new_temp("_step")
+        count_var = self.new_temp("_count")
+        index_var = self.new_temp("_index")
 
-        self.indent_level -= 1
-        loop_footer = f"{self.indent}}}"
+        # Separate declarations keep Python's left-to-right argument evaluation.
+        self.write_inline_tmps()
+        out = self.output
+        out.writelines(self.indent + line for line in [
+            f"long long {start_var} = {start};",
+            f"long long {stop_var} = {stop};",
+            f"long long {step_var} = {step};",
+            f"long long {count_var} = range_len({start_var}, {stop_var}, {step_var});",
+            f"for (long long {index_var} = 0; {index_var} < {count_var}; {index_var}++) {{",
+        ])
 
-        full_loop = '\n'.join([init_iter, loop_header] + loop_body + [loop_footer])
-        return {"code": full_loop, "stmt": True}
+        self.indent_level += 1
+        item_code = f"{start_var} + {index_var} * {step_var}"
+        if loop_var in self.native_vars:
+            out.write(f"{self.indent}{loop_var} = {item_code};")
+        else:
+            out.write(f"{self.indent}assign_value(&{loop_var}, create_int({item_code}));")
+        self.visit_body(node.body, out=out)
+        self.indent_level -= 1
+        out.write(f"{self.indent}}}")
+        return {"code": None, "stmt": True, "written": True}
 
     def visit_formatted_value(self, node):
         # This visits the value inside the `{}` of an f-string
@@ -530,14 +1171,13 @@ class PYTOCTranspiler:
         return {"code": f"to_string({value['code']})", "stmt": False}
 
     def visit_joined_str(self, node):
-        if not f'#include "{os.path.abspath("include/ops.c")}"' in self.imports:
-            self.imports.append(f'#include "{os.path.abspath("include/ops.c")}"')
+        self.include("ops.h")
         self.debug_log("JoinedStr", "Visiting joined string")
 
         parts = []
         for value in node.values:
-            if isinstance(value, ast.Str):
-                parts.append(f'create_string("{value.s}")')
+            if isinstance(value, ast.Constant) and isinstance(value.value, str):
+                parts.append(self.string_literal(value.value))
             else:
                 result = self.visit(value)
                 if not result['stmt']:
@@ -555,6 +1195,24 @@ class PYTOCTranspiler:
         if func_name == "main":
             func_name = self.new_temp("_main")
 
+        cache_key = None
+        if self.function_cache is not None:
+            cache_key = self.function_cache_key(node, func_name)
+            cached = self.function_cache.get(cache_key)
+            if cached is not None:
+                self.debug_log("FunctionDef", f"Reusing cached C for: {node.name}")
+                for header in cached["includes"]:
+                    self.include(header)
+                for value in cached["strings"]:
+                    self.string_literal(value)
+                self.func_defs.extend(cached["func_defs"])
+                self.functions.update(cached["functions"])
+                return {"code": None, "stmt": False}
+            func_defs_mark = len(self.func_defs)
+            functions_before = set(self.functions)
+            self.include_recorders.append(set())
+            self.string_recorders.append(set())
+
         # Extract argument names and defaults
         args = [arg.arg for arg in node.args.args]
         defaults = node.args.defaults
@@ -578,7 +1236,27 @@ class PYTOCTranspiler:
         if kwarg_name:
             params.append(f"Value {kwarg_name}")
 
-        func_code_lines = [f"Value {func_name}({', '.join(params)}) {{"]
+        signature = f"{func_name}({', '.join(params)})"
+        func_code_lines = []
+        if self.profile:
+            # The user's code moves to a static body; `func_name` becomes a wrapper that
+            # times it, so recursive calls and calls from other functions are counted too.
+            self.include("profile.h")
+            forwarded = [*args, *([vararg_name] if vararg_name else []), *([kwarg_name] if kwarg_name else [])]
+            body_signature = f"{func_name}__body({', '.join(params)})"
+            func_code_lines.extend([
+                f'static ProfileEntry {func_name}__profile = {{"{node.name}", {node.lineno}}};',
+                f"static Value {body_signature};",
+                f"Value {signature} {{",
+                f"    profile_enter(&{func_name}__profile);",
+                f"    Value _result = {func_name}__body({', '.join(forwarded)});",
+                "    profile_exit();",
+                "    return _result;",
+                "}",
+                "",
+            ])
+            signature = body_signature
+        func_code_lines.append(f"{'static ' if self.profile else ''}Value {signature} {{")
 
         # Handle default values in body
         for arg in args:
@@ -588,14 +1266,37 @@ class PYTOCTranspiler:
                 )
 
         # Spawn a new transpiler with its own scope
-        function_transpiler = PYTOCTranspiler(debug=self.debug)
-        function_transpiler.indent_level = self.indent_level + 1
+        function_transpiler = PYTOCTranspiler(debug=self.debug, profile=self.profile)
+        function_transpiler.indent_level = 1
 
         # Shared state if needed
         function_transpiler.imports = self.imports
+        function_transpiler.included = self.included
         function_transpiler.func_defs = self.func_defs
         function_transpiler.constants = self.constants
         function_transpiler.functions = self.functions
+        function_transpiler.modules = self.modules
+        function_transpiler.include_recorders = self.include_recorders
+        function_transpiler.string_recorders = self.string_recorders
+
+        function_transpiler.inline_functions = self.inline_functions
+        # Each top-level rebinding becomes its own variable, typed separately.
+        all_params = [name for name in (*args, vararg_name, kwarg_name) if name]
+        body = PYTOCTypes.split_rebindings(node.body, params=all_params)
+        function_transpiler.native_vars = PYTOCTypes.infer_native_types(
+            body, params=all_params, shadowed=self.functions, inline=self.inline_functions
+        )
+        for declaration in function_transpiler.native_declarations(body):
+            func_code_lines.append("    " + declaration)
+
+        # Parameters are borrowed from the caller; retain them so they can be rebound.
+        owned_params = [*args, *([kwarg_name] if kwarg_name else [])]
+        for declaration in function_transpiler.scope_declarations(body, owned_params):
+            func_code_lines.append("    " + declaration)
+        for param in owned_params:
+            func_code_lines.append(f"    retain_value({param});")
+        function_transpiler.scope_mark = function_transpiler.new_temp("_mark")
+        func_code_lines.append(f"    size_t {function_transpiler.scope_mark} = pool_mark();")
 
         # Setup a new scope
         function_transpiler.env = ScopedEnvironment()
@@ -609,24 +1310,11 @@ class PYTOCTranspiler:
             function_transpiler.env.set(kwarg_name, "Value")
 
         # Visit function body
-        for stmt in node.body:
-            result = function_transpiler.visit(stmt)
+        function_transpiler.visit_body(body, mark=function_transpiler.scope_mark, out=CodeBuffer(func_code_lines))
 
-            if function_transpiler.inline_tmps:
-                function_transpiler.debug_log("InlineTmps",
-                                              f"Inlined temporary variables: {function_transpiler.inline_tmps}")
-            for tmp_name, tmp_code in function_transpiler.inline_tmps.items():
-                func_code_lines.append(
-                    "    " + tmp_code.replace("{{ temp_name }}", tmp_name) + ";"
-                )
-            function_transpiler.inline_tmps.clear()
-
-            if result['code'] is None:
-                continue
-            if not result['stmt']:
-                func_code_lines.append("    " + result['code'])
-            else:
-                func_code_lines.append("    " + result['code'] + ";")
+        # Falling off the end returns None
+        func_code_lines.extend("    " + line for line in function_transpiler.scope_cleanup())
+        func_code_lines.append("    return None;")
 
         # End of function
         func_code_lines.append("}")
@@ -644,19 +1332,65 @@ class PYTOCTranspiler:
             "type": "Value",
         }
 
+        if cache_key is not None:
+            self.function_cache[cache_key] = {
+                "includes": self.include_recorders.pop(),
+                "strings": self.string_recorders.pop(),
+                "func_defs": self.func_defs[func_defs_mark:],
+                "functions": {name: info for name, info in self.functions.items() if name not in functions_before},
+            }
+
         return {"code": None, "stmt": False}
 
+    def function_cache_key(self, node, func_name):
+        # Call sites fill in defaults from the callee's signature, so the generated
+        # code also depends on every function visible at this point.
+        signatures = sorted(
+            (name, tuple(info["args"]), tuple(sorted(info["defaults"].items())), info["vararg"], info["kwarg"])
+            for name, info in self.functions.items()
+        )
+        digest = hashlib.sha256()
+        digest.update(func_name.encode("utf-8"))
+        digest.update(ast.dump(node).encode("utf-8"))
+        digest.update(repr(signatures).encode("utf-8"))
+        digest.update(repr(sorted(self.modules.items())).encode("utf-8"))
+        digest.update(b"profile" if self.profile else b"")
+        # Calls to inlinable functions are expanded into the caller.
+        digest.update(repr(sorted((name, info["source"]) for name, info in self.inline_functions.items())).encode("utf-8"))
+        return digest.hexdigest()
+
     def visit_return(self, node):
         self.debug_log("Return", "Visiting return statement")
 
-        return_code = self.visit(node.value)['code']
-
-        return {"code": f"return {return_code}", "stmt": True}
+        return_code = self.visit(node.value)['code'] if node.value is not None else "None"
+        ret_var = self.new_temp("_ret")
+
+        # Keep the result alive across the scope cleanup and hand it to the caller's pool.
+        self.write_inline_tmps()
+        out = self.output
+        out.write(f"{self.indent}{{ Value {ret_var} = retain_value({return_code});")
+        self.unwind_try_frames()
+        out.writelines(f"{self.indent}  {line}" for line in self.scope_cleanup())
+        out.write(f"{self.indent}  return autorelease_value({ret_var}); }}")
+        return {"code": None, "stmt": True, "written": True}
+
+    def unwind_try_frames(self):
+        """Pops the function's active try frames, innermost first, writing their finally blocks."""
+        try_stack = self.try_stack
+        for depth in range(len(try_stack) - 1, -1, -1):
+            frame, finalbody = try_stack[depth]
+            self.output.write(f"{self.indent}  TRY_POP({frame});")
+            if finalbody:
+                self.try_stack = try_stack[:depth]
+                self.visit_body(finalbody, out=self.output)
+        self.try_stack = try_stack
 
     def visit_binop(self, node):
         self.debug_log("BinOp", "Visiting binary operation")
-        if not f'#include "{os.path.abspath("include/ops.c")}"' in self.imports:
-            self.imports.append(f'#include "{os.path.abspath("include/ops.c")}"')
+        native = self.boxed_native(node)
+        if native is not None:
+            return native
+        self.include("ops.h")
 
         left_code = self.visit(node.left)['code']
         right_code = self.visit(node.right)['code']
@@ -671,6 +1405,8 @@ class PYTOCTranspiler:
             "Mod": "mod_values",
             "FloorDiv": "floordiv_values",
             "Pow": "pow_values",
+            "BitOr": "or_values",
+            "BitAnd": "and_values",
         }
 
         if op_class not in op_map:
@@ -712,6 +1448,14 @@ class PYTOCTranspiler:
         list_code = f"make_list({len(tmp_items)}, {tmp_var})"
         return {"code": list_code, "stmt": False}
 
+    def visit_set(self, node):
+        self.debug_log("Set", "Visiting set")
+        self.include("runtime.h")
+
+        items = [self.visit(item)['code'] for item in node.elts]
+        tmp_var = self.new_temp_inplace("_set_items", f"Value {{{{ temp_name }}}}[{len(items)}] = {{{', '.join(items)}}}")
+        return {"code": f"make_set({len(items)}, {tmp_var})", "stmt": False}
+
     def visit_dict(self, node):
         self.debug_log("Dict", "Visiting dictionary")
 
@@ -731,61 +1475,284 @@ class PYTOCTranspiler:
 
         return {"code": dict_code, "stmt": False}
 
+    def condition(self, node):
+        """C condition testing the truth of an expression, unboxed when its type is known."""
+        native = self.native_expr(node)
+        if native is not None:
+            return native[0]
+        return f"is_true({self.visit(node)['code']})"
+
+    def isolated(self, visit):
+        """
+        Calls `visit()` with a fresh set of inline temporaries.
+
+        Returns:
+            tuple: What `visit()` returned, and the C declarations of its temporaries.
+        """
+        outer_tmps = self.inline_tmps
+        self.inline_tmps = {}
+        try:
+            result = visit()
+            declarations = [f"{str(code).replace('{{ temp_name }}', name)};" for name, code in self.inline_tmps.items()]
+        finally:
+            self.inline_tmps = outer_tmps
+        return result, declarations
+
+    def comprehension_scope(self, generators):
+        """
+        Names bound by a comprehension and the native types they get inside it:
+        targets counting over range() are unboxed, all others are boxed Values.
+
+        Returns:
+            tuple: (target names in binding order, native type of each unboxed target)
+        """
+        targets = {}
+        for generator in generators:
+            for name in ast.walk(generator.target):
+                if isinstance(name, ast.Name):
+                    targets.setdefault(name.id)
+        natives = {}
+        if "range" not in self.functions:
+            for generator in generators:
+                if isinstance(generator.target, ast.Name) and PYTOCTypes.range_args(generator.iter) is not None:
+                    natives[generator.target.id] = PYTOCTypes.INT
+        # A name bound as a range counter by one clause and as a Value by another stays boxed.
+        for generator in generators:
+            if not isinstance(generator.target, ast.Name) or PYTOCTypes.range_args(generator.iter) is None:
+                for name in ast.walk(generator.target):
+                    if isinstance(name, ast.Name):
+                        natives.pop(name.id, None)
+        return list(targets), natives
+
+    @contextlib.contextmanager
+    def comprehension_env(self, targets, natives):
+        """
+        Rebinds a comprehension's targets in `native_vars` while its body is visited,
+        hiding the enclosing variables of the same name. Only the targets are touched,
+        so entering a comprehension costs nothing per variable of the enclosing scope.
+        """
+        hidden = {name: self.native_vars.pop(name) for name in targets if name in self.native_vars}
+        self.native_vars.update(natives)
+        try:
+            yield
+        finally:
+            for name in natives:
+                del self.native_vars[name]
+            self.native_vars.update(hidden)
+
+    def comprehension(self, generators, prologue, element, epilogue=(), result="None", guard=None):
+        """
+        Compiles the clauses of a comprehension to nested C `while` loops inside a
+        GNU statement expression, so no iterator or intermediate list is built.
+
+        The first iterable is evaluated in the enclosing scope, as in Python. The
+        targets are locals of the statement expression, so they never leak into or
+        clobber the enclosing scope's variables.
+
+        Args:
+            generators (list): The `ast.comprehension` clauses.
+            prologue (callable): Called with the length expressions of the first
+                clause's sources (see `loop_streams`); returns the C lines creating the result.
+            element (callable): Returns the C lines run for each item.
+            epilogue (list): C lines run after the loops.
+            result (str): C expression the statement expression evaluates to.
+            guard (str, optional): C condition tested before every iteration, so reductions can stop early.
+        """
+        self.include("runtime.h")
+        targets, natives = self.comprehension_scope(generators)
+        first_iter = generators[0].iter
+        if any(isinstance(name, ast.Name) and name.id in targets for name in ast.walk(first_iter)):
+            # `[x for x in x]`: the iterable reads the enclosing `x`, so evaluate it before the targets exist.
+            source = self.new_temp_inplace("_source", f"Value {{{{ temp_name }}}} = {self.visit(first_iter)['code']}")
+            first_iter = ast.Name(id=source, ctx=ast.Load())
+
+        with self.comprehension_env(targets, natives):
+            setup, conditions, binds, lengths = [], [], [], []
+            self.loop_streams(first_iter, generators[0].target, setup, conditions, binds, lengths)
+            lines = [
+                f"{PYTOCTypes.C_TYPES[natives[name]]} {name} = 0;" if name in natives else f"Value {name} = None;"
+                for name in targets
+            ]
+            lines.extend(setup)
+            lines.extend(prologue(lengths))
+            lines.extend(self.comprehension_loop(generators, 0, conditions, binds, element, guard))
+        lines.extend(epilogue)
+        lines.extend(f"release_value({name});" for name in targets if name not in natives)
+        lines.append(f"{result};")
+
+        inner = self.indent + self.indent_str
+        return {"code": "({\n" + "\n".join(inner + line for line in lines) + f"\n{self.indent}}})", "stmt": False}
+
+    def comprehension_loop(self, generators, index, conditions, binds, element, guard):
+        # One `while` per clause, each draining its own pool mark after every item.
+        mark = self.new_temp("_mark")
+        if guard is not None:
+            conditions = [guard, *conditions]
+        body = list(binds)
+        depth = 0
+        for test in generators[index].ifs:
+            code, declarations = self.isolated(lambda: self.condition(test))
+            body.extend(self.indent_str * depth + line for line in [*declarations, f"if ({code}) {{"])
+            depth += 1
+        if index + 1 < len(generators):
+            generator = generators[index + 1]
+            setup, inner_conditions, inner_binds = [], [], []
+            _, declarations = self.isolated(
+                lambda: self.loop_streams(generator.iter, generator.target, setup, inner_conditions, inner_binds))
+            inner = [*declarations, *setup,
+                     *self.comprehension_loop(generators, index + 1, inner_conditions, inner_binds, element, guard)]
+        else:
+            lines, declarations = self.isolated(element)
+            inner = [*declarations, *lines]
+        body.extend(self.indent_str * depth + line for line in inner)
+        body.extend(self.indent_str * level + "}" for level in reversed(range(depth)))
+        return [
+            f"size_t {mark} = pool_mark();",
+            f"while ({' && '.join(conditions)}) {{",
+            *(self.indent_str + line for line in body),
+            f"{self.indent_str}pool_drain({mark});",
+            "}",
+        ]
+
+    def visit_comprehension(self, node):
+        """
+        Compiles a list, set or dict comprehension or a generator expression.
+
+        With a single clause and no filter the result is preallocated for the number
+        of items the source holds. Generator expressions that are not consumed by a
+        fused reduction (see `visit_reduction`) are collected eagerly and returned as
+        an iterator over the list.
+        """
+        self.debug_log(type(node).__name__, "Visiting comprehension")
+        result = self.new_temp("_result")
+        preallocate = len(node.generators) == 1 and not node.generators[0].ifs
+
+        def prologue(lengths):
+            size = f"(int){lengths[0]}" if preallocate and len(lengths) == 1 else "0"
+            if isinstance(node, ast.SetComp):
+                return [f"Value {result} = create_set({size});"]
+            if isinstance(node, ast.DictComp):
+                return [f"Value {result} = create_dict({size});"]
+            lines = [f"Value {result} = create_list(0);"]
+            if size != "0":
+                lines.append(f"list_reserve({result}.list_val, {size});")
+            return lines
+
+        def element():
+            if isinstance(node, ast.DictComp):
+                key = self.new_temp_inplace("_key", f"Value {{{{ temp_name }}}} = {self.visit(node.key)['code']}")
+                return [f"dict_set(&{result}, {key}, {self.visit(node.value)['code']});"]
+            if isinstance(node, ast.SetComp):
+                return [f"set_insert(&{result}, {self.visit(node.elt)['code']});"]
+            return [f"list_append({result}, {self.visit(node.elt)['code']});"]
+
+        code = f"iter_value({result})" if isinstance(node, ast.GeneratorExp) else result
+        return self.comprehension(node.generators, prologue, element, result=code)
+
+    def visit_reduction(self, func_name, node):
+        """
+        Fuses sum(), min(), max(), any() or all() with the comprehension that is its
+        only argument, reducing items as they are produced instead of collecting them.
+        Accumulators stay unboxed when the element's type is known; any() and all()
+        stop at the first item that decides the result.
+        """
+        self.debug_log("Call", f"Fusing {func_name}() with its comprehension")
+        with self.comprehension_env(*self.comprehension_scope(node.generators)):
+            native_type = PYTOCTypes.expr_type(node.elt, self.native_vars, self.inline_functions)
+        acc = self.new_temp("_acc")
+        epilogue = []
+        guard = None
+
+        if func_name == "sum":
+            if native_type in (PYTOCTypes.INT, PYTOCTypes.BOOL):
+                declarations = [f"long long {acc} = 0;"]
+                element = lambda: [f"{acc} += {self.native_expr(node.elt)[0]};"]
+                result = f"create_int({acc})"
+            else:
+                self.include("ops.h")
+                declarations = [f"Value {acc} = retain_value(create_int(0));"]
+                element = lambda: [f"assign_value(&{acc}, add_values({acc}, {self.visit(node.elt)['code']}));"]
+                result = f"autorelease_value({acc})"
+        elif func_name in ("min", "max"):
+            self.include("exc.h")
+            seen = self.new_temp("_seen")
+            if native_type is not None:
+                c_type = PYTOCTypes.C_TYPES[native_type]
+                declarations = [f"{c_type} {acc} = 0;", f"int {seen} = 0;"]
+
+                def element():
+                    item = self.new_temp("_item")
+                    compare = ">" if func_name == "max" else "<"
+                    return [
+                        f"{c_type} {item} = {self.native_expr(node.elt)[0]};",
+                        f"if (!{seen} || {item} {compare} {acc}) {acc} = {item};",
+                        f"{seen} = 1;",
+                    ]
+                result = PYTOCTypes.BOXERS[native_type].format(acc)
+            else:
+                self.include("ops.h")
+                declarations = [f"Value {acc} = None;", f"int {seen} = 0;"]
+
+                def element():
+                    item = self.new_temp("_item")
+                    compare = "gt_values" if func_name == "max" else "lt_values"
+                    return [
+                        f"Value {item} = {self.visit(node.elt)['code']};",
+                        f"if (!{seen} || is_true({compare}({item}, {acc}))) assign_value(&{acc}, {item});",
+                        f"{seen} = 1;",
+                    ]
+                result = f"autorelease_value({acc})"
+            epilogue.append(f'if (!{seen}) raise_error(&Exc_ValueError, "{func_name}() arg is an empty sequence");')
+        else:
+            # `_acc` is set once an item decides the result: a true one for any(), a false one for all().
+            declarations = [f"int {acc} = 0;"]
+            negate = "" if func_name == "any" else "!"
+            element = lambda: [f"if ({negate}({self.condition(node.elt)})) {acc} = 1;"]
+            guard = f"!{acc}"
+            result = f"create_bool({'' if func_name == 'any' else '!'}{acc})"
+
+        return self.comprehension(node.generators, lambda lengths: declarations, element, epilogue, result, guard)
+
     def visit_module(self, node):
         self.debug_log("Module", "Visiting module")
 
-        self.imports = [
-            f'#include "{os.path.abspath("include/_global.c")}"',
-            f'#include "{os.path.abspath("include/runtime.c")}"',
-        ]
+        self.imports = []
+        self.included = set()
+        self.include("_global.h")
+        self.include("runtime.h")
 
         self.func_defs.clear()
+        self.inline_functions = {} if self.profile else PYTOCInliner.find_inlinable(node, self.inline_threshold)
         body_code = []
         body_code.append(self.indent)
 
         body_code.append("int main() {")
         self.indent_level += 1
 
-        body_code_tmp = []
-        for stmt in node.body:
-            result = self.visit(stmt)
-            if self.inline_tmps:
-                self.debug_log("InlineTmps", f"Inlined temporary variables: {self.inline_tmps}")
-            for tmp_name, tmp_code in self.inline_tmps.items():
-                body_code_tmp.append(f"{self.indent}{str(tmp_code).replace('{{ temp_name }}', str(tmp_name))};")
-            self.inline_tmps.clear()
-            if result['code'] is None:
-                continue
-            if not result['stmt']:
-                body_code_tmp.append(self.indent + result['code'])
-            else:
-                body_code_tmp.append(self.indent + result['code'] + ";")
+        self.native_vars = PYTOCTypes.infer_native_types(node.body, shadowed=self.functions,
+                                                         inline=self.inline_functions)
+        for declaration in self.native_declarations(node.body):
+            body_code.append(self.indent + declaration)
+        for declaration in self.scope_declarations(node.body):
+            body_code.append(self.indent + declaration)
+        self.scope_mark = self.new_temp("_mark")
+
+        body_code_tmp = self.visit_body(node.body, mark=self.scope_mark)
 
         for tmp_name, tmp_code in self.tmps.items():
             body_code.append(f"{self.indent}{str(tmp_code).replace("{{ temp_name }}", str(tmp_name))};")
 
-
-        inits = []
-        if f'#include "{os.path.abspath("include/exc.c")}"' in self.imports:
-            print("Include exc.c")
-            inits.append(f"{self.indent}init_exc();")
-
-        if inits:
-            for init in inits:
-                body_code.append(init)
-            body_code.append(f"{self.indent}")
-
         if body_code_tmp and self.tmps:
             body_code.append(f"{self.indent}")
         self.tmps.clear()
 
+        if self.unbuffered:
+            self.include("io.h")
+            body_code.append(f"{self.indent}set_output_buffering(0);")
+        body_code.append(f"{self.indent}size_t {self.scope_mark} = pool_mark();")
         body_code.extend(body_code_tmp)
 
-        free_code_lines = []
-        for var_name, var_type in list(self.variables.items()):
-            free_code_lines.append(f"{self.indent}free_value({var_name});")
-
-        body_code.extend(free_code_lines)
+        body_code.extend(self.indent + line for line in self.scope_cleanup())
 
         body_code.append(f"{self.indent}return 0;")
         self.indent_level -= 1
@@ -802,53 +1769,94 @@ class PYTOCTranspiler:
             "",
         ]
 
-        self.c_code = self.imports + [self.indent] + message + self.func_defs + body_code
+        output = CodeBuffer()
+        output.writelines(self.imports)
+        output.write(self.indent)
+        output.writelines(message)
+        pool = self.string_pool()
+        if pool:
+            output.writelines(pool)
+            output.write("")
+        output.writelines(self.func_defs)
+        output.writelines(body_code)
 
-        return {"code": "\n".join(self.c_code), "stmt": False}
+        return {"code": output.getvalue(), "stmt": False}
 
     def visit_assign(self, node):
         self.debug_log("Assign", "Visiting assignment")
 
         target = node.targets[0]
+        if isinstance(target, ast.Subscript):
+            self.include("runtime.h")
+            container = self.visit(target.value)['code']
+            key = self.subscript_key(target)
+            value = self.visit(node.value)['code']
+            return {"code": f"setitem_value({container}, {key}, {value})", "stmt": True}
+
         target_name = target.id
 
-        var_declared = target_name in self.variables
+        if target_name in self.native_vars:
+            return {"code": f"{target_name} = {self.native_expr(node.value)[0]}", "stmt": True, "native": True}
+
         value_node = self.visit(node.value)
 
         if isinstance(node.value, ast.Constant):
             val = node.value.value
 
-            if isinstance(val, int):
-                creation_code = f"create_int({val})"
+            if isinstance(val, bool):
+                self.variables[target_name] = "TYPE_BOOL"
+            elif isinstance(val, int):
                 self.variables[target_name] = "TYPE_INT"
             elif isinstance(val, str):
-                creation_code = f'create_string("{val}")'
                 self.variables[target_name] = "TYPE_STRING"
             elif isinstance(val, float):
-                creation_code = f"create_float({val})"
                 self.variables[target_name] = "TYPE_FLOAT"
             elif val is None:
-                creation_code = "None"
                 self.variables[target_name] = "TYPE_NONE"
             else:
                 raise NotImplementedError(f"Unsupported constant type: {type(val)}")
-        else:
-            creation_code = value_node['code']
+        creation_code = value_node['code']
 
-        if not var_declared:
-            code = f"Value {target_name} = {creation_code}"
-        else:
-            code = f"{target_name} = {creation_code}"
+        return {"code": f"assign_value(&{target_name}, {creation_code})", "stmt": True}
 
-        return {"code": code, "stmt": True}
+    def subscript_key(self, node):
+        if isinstance(node.slice, ast.Slice):
+            raise NotImplementedError("Slicing not supported yet")
+        return self.visit(node.slice)['code']
+
+    def visit_subscript(self, node):
+        self.debug_log("Subscript", "Visiting subscript")
+        self.include("runtime.h")
+        container = self.visit(node.value)['code']
+        key = self.subscript_key(node)
+        return {"code": f"getitem_value({container}, {key})", "stmt": False}
 
     def visit_name(self, node):
+        if node.id in self.native_vars:
+            return self.boxed_native(node)
         return {"code": node.id, "stmt": False}
 
+    def visit_import(self, node):
+        for alias in node.names:
+            if alias.name not in SUPPORTED_MODULES:
+                raise NotImplementedError(f"Module '{alias.name}' not supported")
+            self.modules[alias.asname or alias.name] = alias.name
+        return {"code": "", "stmt": False}
+
+    def visit_attribute(self, node):
+        if isinstance(node.value, ast.Name) and node.value.id in self.modules:
+            key = (self.modules[node.value.id], node.attr)
+            if key not in MODULE_ATTRIBUTES:
+                raise NotImplementedError(f"Attribute '{key[0]}.{key[1]}' not supported")
+            header, code = MODULE_ATTRIBUTES[key]
+            self.include(header)
+            return {"code": code, "stmt": False}
+        raise NotImplementedError("Attribute access not supported yet")
+
     def visit_constant(self, node):
         val = node.value
         if isinstance(val, str):
-            return {"code": f'create_string("{val}")', "stmt": False}
+            return {"code": self.string_literal(val), "stmt": False}
         elif val is None:
             return {"code": "None", "stmt": False}
         elif isinstance(val, bool):
@@ -869,6 +1877,8 @@ class PYTOCTranspiler:
             return {"code": result['code'], "stmt": True}
 
     def visit_call(self, node):
+        if isinstance(node.func, ast.Attribute):
+            return self.visit_method_call(node)
         if not isinstance(node.func, ast.Name):
             raise NotImplementedError("Only direct function calls supported")
 
@@ -881,10 +1891,35 @@ class PYTOCTranspiler:
 
         self.debug_log("Call", f"Visiting call: {func_name}")
 
+        if func_name in EXCEPTION_TYPES and func_name not in self.functions:
+            if len(node.args) > 1 or node.keywords:
+                raise NotImplementedError("Exceptions take at most one message argument")
+            self.include("exc.h")
+            message = self.visit(node.args[0])["code"] if node.args else "None"
+            return {"code": f"create_exception(&Exc_{func_name}, {message})", "stmt": False}
+
+        if func_name == "map" and func_name not in self.functions:
+            return self.visit_map(node)
+
+        if (
+            func_name in ("sum", "min", "max", "any", "all")
+            and func_name not in self.functions
+            and len(node.args) == 1
+            and not node.keywords
+            # any() and all() stop early, which a list comprehension must not do.
+            and isinstance(node.args[0], ast.GeneratorExp if func_name in ("any", "all") else (ast.GeneratorExp, ast.ListComp))
+        ):
+            return self.visit_reduction(func_name, node.args[0])
+
         if func_name not in self.function_map and func_name not in self.functions:
             raise NameError(f"Function '{func_name}' not defined")
 
         if func_name in self.functions:
+            if func_name in self.inline_functions:
+                inlined = self.inline_call(func_name, node)
+                if inlined is not None:
+                    return inlined
+
             func_def = self.functions[func_name]
             expected_arg_count = len(func_def['args'])
             defaults = func_def.get("defaults", {})
@@ -895,24 +1930,131 @@ class PYTOCTranspiler:
             if actual_arg_count > expected_arg_count:
                 raise Exception(f"Too many arguments for function '{func_name}'")
 
+            evaluated_args.extend([None] * (expected_arg_count - actual_arg_count))
+            for kw in node.keywords:
+                if kw.arg is None:
+                    raise NotImplementedError("**kwargs not supported yet")
+                if kw.arg not in func_def['args']:
+                    raise TypeError(f"{func_name}() got an unexpected keyword argument '{kw.arg}'")
+                index = func_def['args'].index(kw.arg)
+                if evaluated_args[index] is not None:
+                    raise TypeError(f"{func_name}() got multiple values for argument '{kw.arg}'")
+                evaluated_args[index] = self.visit(kw.value)['code']
+
             # Fill in missing arguments with defaults if available
-            if actual_arg_count < expected_arg_count:
-                missing = expected_arg_count - actual_arg_count
-                for i in range(missing):
-                    arg_name = func_def['args'][actual_arg_count + i]
+            for i, arg_name in enumerate(func_def['args']):
+                if evaluated_args[i] is None:
                     if arg_name not in defaults:
                         raise Exception(f"No default value for argument '{arg_name}' in function '{func_name}'")
-                    evaluated_args.append(defaults[arg_name])
+                    evaluated_args[i] = defaults[arg_name]
 
             code = f"{func_name}({', '.join(evaluated_args)})"
             return {"code": code, "stmt": False}
 
         func_info = self.function_map[func_name]
+        pos_args = [self.visit(arg)["code"] for arg in node.args]
+        kw_args = {}
+        for kw in node.keywords:
+            if kw.arg is None:
+                raise NotImplementedError("**kwargs not supported yet")
+            kw_args[kw.arg] = self.visit(kw.value)["code"]
+        return self.call_builtin(func_name, func_info, pos_args, kw_args)
+
+    def inline_call(self, func_name, node):
+        """
+        Expands a call to an inlinable function into a GNU statement expression that
+        binds each argument to a temporary, in Python's evaluation order, and then
+        evaluates the function's return expression on them. Calls whose arguments and
+        result are native compile to unboxed C.
+
+        Returns:
+            dict | None: The visited call, or None if the arguments do not bind cleanly.
+        """
+        info = self.inline_functions[func_name]
+        bound = PYTOCInliner.bind_arguments(info, node)
+        if bound is None:
+            return None
+        self.debug_log("Call", f"Inlining call: {func_name}")
+        boxed = self.boxed_native(node)
+        if boxed is not None:
+            return boxed
+
+        lines = []
+        temps = {}
+        for param, arg in bound:
+            temps[param] = self.new_temp(f"_{param}")
+            # Temporaries of an argument stay inside the expression, after the arguments before it.
+            code, declarations = self.isolated(lambda: self.visit(arg)["code"])
+            lines.extend(declarations)
+            lines.append(f"Value {temps[param]} = {code};")
+        code, declarations = self.isolated(lambda: self.visit(PYTOCInliner.rename(info["expr"], temps))["code"])
+        lines.extend(declarations)
+        return {"code": f"({{ {' '.join(lines)} {code}; }})", "stmt": False}
+
+    def inline_native(self, node):
+        # The unboxed counterpart of inline_call(), for calls `expr_type` could type.
+        func_name = node.func.id
+        if func_name not in self.functions:
+            raise NameError(f"Function '{func_name}' not defined")
+        info = self.inline_functions[func_name]
+        lines = []
+        temps = {}
+        natives = {}
+        for param, arg in PYTOCInliner.bind_arguments(info, node):
+            temps[param] = self.new_temp(f"_{param}")
+            natives[temps[param]] = PYTOCTypes.expr_type(arg, self.native_vars, self.inline_functions)
+            lines.append(f"{PYTOCTypes.C_TYPES[natives[temps[param]]]} {temps[param]} = {self._native_code(arg)};")
+        self.native_vars.update(natives)
+        try:
+            code = self._native_code(PYTOCInliner.rename(info["expr"], temps))
+        finally:
+            for temp in natives:
+                del self.native_vars[temp]
+        return f"({{ {' '.join(lines)} {code}; }})"
+
+    def visit_map(self, node):
+        if len(node.args) < 2 or node.keywords or any(isinstance(arg, ast.Starred) for arg in node.args):
+            raise NotImplementedError("map() needs a function and at least one iterable")
+        self.include("runtime.h")
+        function = self.map_function(node.args[0], len(node.args) - 1)
+        iterables = [self.visit(arg)["code"] for arg in node.args[1:]]
+        array = self.new_temp_inplace(
+            prefix="_map_args",
+            code=f"Value {{{{ temp_name }}}}[{len(iterables)}] = {{ {', '.join(iterables)} }}"
+        )
+        return {"code": f"map_val((void (*)(void)){function}, make_list({len(iterables)}, {array}))", "stmt": False}
+
+    def visit_method_call(self, node):
+        method = node.func.attr
+        self.debug_log("Call", f"Visiting method call: {method}")
+
+        if method not in self.method_map:
+            raise NotImplementedError(f"Method '{method}' not supported")
+
+        # The receiver is bound to the method's first parameter, like `self`.
+        receiver = self.visit(node.func.value)["code"]
+        pos_args = [receiver] + [self.visit(arg)["code"] for arg in node.args]
+        kw_args = {}
+        for kw in node.keywords:
+            if kw.arg is None:
+                raise NotImplementedError("**kwargs not supported yet")
+            kw_args[kw.arg] = self.visit(kw.value)["code"]
+        return self.call_builtin(method, self.method_map[method], pos_args, kw_args)
+
+    def call_builtin(self, func_name, func_info, pos_args, kw_args):
+        """
+        Binds already visited arguments to a runtime function from `function_map`
+        or `method_map` and formats the C call.
+
+        Args:
+            func_name (str): Name used in error messages.
+            func_info (dict): The function's entry.
+            pos_args (list): C code of the positional arguments.
+            kw_args (dict): C code of the keyword arguments.
+        """
         expected_args = func_info["args"]
 
-        include_lib = f"#include {func_info['lib']}"
-        if include_lib not in self.imports:
-            self.imports.append(include_lib)
+        self.include(func_info['lib'])
 
         # Detect *args
         star_arg_index = -1
@@ -927,16 +2069,6 @@ class PYTOCTranspiler:
                 star_arg_index = i
             arg_names.append(name.lstrip("*"))
 
-        # Visit all arguments
-        pos_args = []
-        kw_args = {}
-        for arg in node.args:
-            pos_args.append(self.visit(arg)["code"])
-        for kw in node.keywords:
-            if kw.arg is None:
-                raise NotImplementedError("**kwargs not supported yet")
-            kw_args[kw.arg] = self.visit(kw.value)["code"]
-
         final_args = []
         named_args = {}
 
@@ -973,6 +2105,8 @@ class PYTOCTranspiler:
                     val = kw_args[bare_name]
                 elif "code" in arg_def:
                     val = eval(arg_def["code"], {}, named_args)
+                elif "literal" in arg_def:
+                    val = self.string_literal(arg_def["literal"])
                 elif "default" in arg_def:
                     val = arg_def["default"]
                 else:
@@ -990,6 +2124,8 @@ class PYTOCTranspiler:
                     val = kw_args[bare_name]
                 elif "code" in arg_def:
                     val = eval(arg_def["code"], {}, named_args)
+                elif "literal" in arg_def:
+                    val = self.string_literal(arg_def["literal"])
                 elif "default" in arg_def:
                     val = arg_def["default"]
                 else:
@@ -1005,3 +2141,38 @@ class PYTOCTranspiler:
         return {"code": call_expr, "stmt": func_info["type"] == "void"}
 
 
+
+    # Visitor of each supported node type, built once for the class instead of per node.
+    DISPATCH = {
+        ast.Module: visit_module,
+        ast.Assign: visit_assign,
+        ast.AugAssign: visit_aug_assign,
+        ast.Call: visit_call,
+        ast.Name: visit_name,
+        ast.Constant: visit_constant,
+        ast.Expr: visit_expr,
+        ast.List: visit_list,
+        ast.Dict: visit_dict,
+        ast.Set: visit_set,
+        ast.Tuple: visit_tuple,
+        ast.FunctionDef: visit_function_def,
+        ast.Return: visit_return,
+        ast.BinOp: visit_binop,
+        ast.JoinedStr: visit_joined_str,
+        ast.FormattedValue: visit_formatted_value,
+        ast.For: visit_for,
+        ast.While: visit_while,
+        ast.Compare: visit_compare,
+        ast.Subscript: visit_subscript,
+        ast.Assert: visit_assert,
+        ast.UnaryOp: visit_unary_op,
+        ast.Try: visit_try,
+        ast.Pass: lambda self, node: {"code": "", "stmt": False},
+        ast.Raise: visit_raise,
+        ast.Import: visit_import,
+        ast.Attribute: visit_attribute,
+        ast.ListComp: visit_comprehension,
+        ast.SetComp: visit_comprehension,
+        ast.DictComp: visit_comprehension,
+        ast.GeneratorExp: visit_comprehension,
+    }
@@ -0,0 +1,353 @@
+import ast
+import copy
+import math
+
+import PYTOCInliner
+
+INT = "int"
+FLOAT = "float"
+BOOL = "bool"
+
+# Unboxed C representation of each native type and how to box it into a Value.
+C_TYPES = {INT: "long long", FLOAT: "double", BOOL: "int"}
+BOXERS = {INT: "create_int({0})", FLOAT: "create_float({0})", BOOL: "create_bool({0})"}
+
+INT_MIN = -2 ** 63
+INT_MAX = 2 ** 63 - 1
+
+NUMERIC = (INT, FLOAT)
+
+
+def constant_type(value):
+    if isinstance(value, bool):
+        return BOOL
+    if isinstance(value, int):
+        return INT if INT_MIN <= value <= INT_MAX else None
+    if isinstance(value, float):
+        return FLOAT if math.isfinite(value) else None
+    return None
+
+
+def expr_type(node, env, inline=None):
+    """
+    Returns the native type of an expression, or None if it has to stay a boxed Value.
+
+    Args:
+        node (ast.expr): The expression.
+        env (dict): Native type of each variable known to be monomorphic.
+        inline (dict, optional): Inlinable functions (see `PYTOCInliner.find_inlinable`);
+            a call to one has the type of its body given the types of its arguments.
+    """
+    if isinstance(node, ast.Constant):
+        return constant_type(node.value)
+    if isinstance(node, ast.Name):
+        return env.get(node.id)
+    if isinstance(node, ast.BinOp):
+        left = expr_type(node.left, env, inline)
+        right = expr_type(node.right, env, inline)
+        if left not in NUMERIC or right not in NUMERIC:
+            return None
+        op = type(node.op)
+        if op in (ast.Add, ast.Sub, ast.Mult, ast.FloorDiv, ast.Mod):
+            return INT if left == right == INT else FLOAT
+        if op is ast.Div:
+            return FLOAT
+        if op is ast.Pow:
+            if left == right == INT:
+                # int ** int is only an int for non-negative exponents.
+                exponent = node.right
+                if isinstance(exponent, ast.Constant) and constant_type(exponent.value) == INT and exponent.value >= 0:
+                    return INT
+                return None
+            return FLOAT
+        return None
+    if isinstance(node, ast.UnaryOp):
+        operand = expr_type(node.operand, env, inline)
+        if isinstance(node.op, ast.Not):
+            return BOOL if operand is not None else None
+        if isinstance(node.op, (ast.USub, ast.UAdd)) and operand in NUMERIC:
+            return operand
+        return None
+    if isinstance(node, ast.Compare):
+        operands = [node.left, *node.comparators]
+        types = [expr_type(operand, env, inline) for operand in operands]
+        supported = (ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE)
+        if not all(isinstance(op, supported) for op in node.ops):
+            return None
+        if all(t in NUMERIC for t in types) or all(t == BOOL for t in types):
+            return BOOL
+        return None
+    if isinstance(node, ast.Call) and inline and isinstance(node.func, ast.Name) and node.func.id in inline:
+        info = inline[node.func.id]
+        bound = PYTOCInliner.bind_arguments(info, node)
+        if bound is None:
+            return None
+        params = {}
+        for param, arg in bound:
+            params[param] = expr_type(arg, env, inline)
+            if params[param] is None:
+                return None
+        return expr_type(info["expr"], params, inline)
+    return None
+
+
+def range_args(node):
+    """
+    Returns the arguments of a `range(...)` call the transpiler can lower to a C
+    counting loop, or None if `node` is not such a call.
+    """
+    if (
+        isinstance(node, ast.Call)
+        and isinstance(node.func, ast.Name)
+        and node.func.id == "range"
+        and 1 <= len(node.args) <= 3
+        and not node.keywords
+        and not any(isinstance(arg, ast.Starred) for arg in node.args)
+    ):
+        return node.args
+    return None
+
+
+def join(a, b):
+    """Combines two observed types of a variable; "object" means it must stay boxed."""
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return a if a == b else "object"
+
+
+class TypeInferencer(ast.NodeVisitor):
+    """
+    Finds the variables of one scope (module or function body) that only ever hold
+    a single native type, so they can be declared as plain C locals.
+
+    Every binding of a name is inspected; names bound in ways the transpiler cannot
+    unbox (parameters, loop targets over Values, unpacking, `global`, ...) stay boxed.
+    Types are propagated to a fixed point so `x = y + 1` sees the type of `y`.
+
+    The analysis is flow-insensitive: all bindings of a name are joined, so one
+    non-numeric binding keeps the name boxed everywhere in the scope. Function
+    bodies are passed through `split_rebindings` first, which gives each top-level
+    rebinding its own name; rebindings inside loops, branches and `try` blocks, and
+    every rebinding at module level, still share one type.
+    """
+
+    def __init__(self, params=(), shadowed=(), inline=None):
+        self.bindings = {}
+        self.boxed = set(params)
+        self.shadowed = set(shadowed)
+        self.inline = inline
+        self.range_loops = []
+
+    def bind(self, name, value):
+        self.bindings.setdefault(name, []).append(value)
+
+    def box(self, target):
+        # Only names bind; `d[k] = v` and `obj.attr = v` leave `d`, `k` and `obj` alone.
+        if isinstance(target, ast.Name):
+            self.boxed.add(target.id)
+        elif isinstance(target, (ast.Tuple, ast.List)):
+            for element in target.elts:
+                self.box(element)
+        elif isinstance(target, ast.Starred):
+            self.box(target.value)
+
+    def visit_Assign(self, node):
+        if len(node.targets) == 1 and isinstance(node.targets[0], ast.Name):
+            self.bind(node.targets[0].id, node.value)
+        else:
+            for target in node.targets:
+                self.box(target)
+        self.generic_visit(node)
+
+    def visit_AugAssign(self, node):
+        if isinstance(node.target, ast.Name):
+            self.bind(node.target.id, ast.BinOp(left=ast.Name(id=node.target.id, ctx=ast.Load()),
+                                                op=node.op, right=node.value))
+        else:
+            self.box(node.target)
+        self.generic_visit(node)
+
+    def visit_AnnAssign(self, node):
+        self.box(node.target)
+        self.generic_visit(node)
+
+    def visit_For(self, node):
+        if isinstance(node.target, ast.Name) and range_args(node.iter) is not None:
+            # Lowered to a C counter; the target only ever holds ints.
+            self.range_loops.append(node.target.id)
+        else:
+            self.box(node.target)
+        self.generic_visit(node)
+
+    def visit_With(self, node):
+        for item in node.items:
+            if item.optional_vars is not None:
+                self.box(item.optional_vars)
+        self.generic_visit(node)
+
+    def visit_ExceptHandler(self, node):
+        if node.name:
+            self.boxed.add(node.name)
+        self.generic_visit(node)
+
+    def visit_Global(self, node):
+        self.boxed.update(node.names)
+
+    visit_Nonlocal = visit_Global
+
+    def visit_NamedExpr(self, node):
+        self.box(node.target)
+        self.generic_visit(node)
+
+    def visit_Import(self, node):
+        for alias in node.names:
+            self.boxed.add((alias.asname or alias.name).split(".")[0])
+
+    visit_ImportFrom = visit_Import
+
+    def visit_Delete(self, node):
+        for target in node.targets:
+            self.box(target)
+
+    def visit_FunctionDef(self, node):
+        # Nested scopes are inferred separately; only the name is bound here.
+        self.boxed.add(node.name)
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+    visit_ClassDef = visit_FunctionDef
+
+    def visit_Lambda(self, node):
+        pass
+
+    def infer(self, body):
+        """
+        Args:
+            body (list): Statements of the scope.
+
+        Returns:
+            dict: Native type (`INT`, `FLOAT` or `BOOL`) of each unboxable variable.
+        """
+        for stmt in body:
+            self.visit(stmt)
+
+        if "range" in self.shadowed or "range" in self.boxed or "range" in self.bindings:
+            self.boxed.update(self.range_loops)
+        else:
+            for name in self.range_loops:
+                self.bind(name, ast.Constant(value=0))
+
+        candidates = {name for name in self.bindings if name not in self.boxed}
+        types = {}
+        changed = True
+        while changed:
+            changed = False
+            settled = dict(types)
+            env = {name: t for name, t in settled.items() if t in C_TYPES}
+            for name in candidates:
+                observed = types.get(name)
+                for value in self.bindings[name]:
+                    value_type = expr_type(value, env, self.inline)
+                    if value_type is None and not self._waits_on(value, candidates, settled):
+                        value_type = "object"
+                    observed = join(observed, value_type)
+                if observed != types.get(name):
+                    types[name] = observed
+                    changed = True
+        return {name: t for name, t in types.items() if t in C_TYPES}
+
+    @staticmethod
+    def _waits_on(value, candidates, types):
+        # True if the value may only have failed to type because a variable it
+        # reads has no type yet; it is retried once that variable settles.
+        return any(isinstance(n, ast.Name) and n.id in candidates and types.get(n.id) is None
+                   for n in ast.walk(value))
+
+
+class _Renamer(ast.NodeTransformer):
+    def __init__(self, names):
+        self.names = names
+
+    def visit_Name(self, node):
+        if node.id in self.names:
+            return ast.copy_location(ast.Name(id=self.names[node.id], ctx=node.ctx), node)
+        return node
+
+
+def split_rebindings(body, params=()):
+    """
+    Renames the variables of a function body SSA-style so each definition can be
+    typed on its own.
+
+    Every unconditional top-level `x = value` after the first definition of `x` (a
+    parameter, or an earlier top-level assignment) starts a new variable `x__N`,
+    which replaces `x` in the rest of the body; `value` itself still reads the
+    previous one. Such an assignment runs before every later statement, so the
+    renamed body behaves the same. Names that are `global`, `nonlocal`, deleted,
+    caught with `except ... as`, called, or used by a nested scope are left alone.
+
+    Args:
+        body (list): Statements of the function.
+        params (list): Names of the parameters.
+
+    Returns:
+        list: The body, or a renamed copy if anything was split.
+    """
+    used = set(params)
+    excluded = set()
+    for stmt in body:
+        for node in ast.walk(stmt):
+            if isinstance(node, ast.Name):
+                used.add(node.id)
+            elif isinstance(node, (ast.Global, ast.Nonlocal)):
+                excluded.update(node.names)
+            elif isinstance(node, ast.Delete):
+                excluded.update(n.id for n in ast.walk(node) if isinstance(n, ast.Name))
+            elif isinstance(node, ast.ExceptHandler) and node.name:
+                excluded.add(node.name)
+            elif isinstance(node, ast.Call) and isinstance(node.func, ast.Name):
+                excluded.add(node.func.id)
+            elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef, ast.Lambda)):
+                excluded.update(n.id for n in ast.walk(node) if isinstance(n, ast.Name))
+                excluded.update(n.arg for n in ast.walk(node) if isinstance(n, ast.arg))
+                if not isinstance(node, ast.Lambda):
+                    excluded.add(node.name)
+
+    def assigned(stmt):
+        if isinstance(stmt, ast.Assign) and len(stmt.targets) == 1 and isinstance(stmt.targets[0], ast.Name):
+            name = stmt.targets[0].id
+            return name if name not in excluded else None
+        return None
+
+    definitions = {name: 1 for name in params if name not in excluded}
+    for stmt in body:
+        name = assigned(stmt)
+        if name is not None:
+            definitions[name] = definitions.get(name, 0) + 1
+    if all(count < 2 for count in definitions.values()):
+        return body
+
+    current = {}
+    seen = set(params)
+    renamed = []
+    for stmt in body:
+        name = assigned(stmt)
+        if name is None or definitions[name] < 2 or name not in seen:
+            if name is not None:
+                seen.add(name)
+            renamed.append(_Renamer(current).visit(copy.deepcopy(stmt)) if current else stmt)
+            continue
+        value = _Renamer(current).visit(copy.deepcopy(stmt.value))
+        n = 1
+        while f"{name}__{n}" in used:
+            n += 1
+        current[name] = f"{name}__{n}"
+        used.add(current[name])
+        target = ast.copy_location(ast.Name(id=current[name], ctx=ast.Store()), stmt.targets[0])
+        renamed.append(ast.copy_location(ast.Assign(targets=[target], value=value, type_comment=None), stmt))
+    return renamed
+
+
+def infer_native_types(body, params=(), shadowed=(), inline=None):
+    return TypeInferencer(params, shadowed, inline).infer(body)
@@ -0,0 +1,380 @@
+"""
+Benchmarks the pytoc build pipeline stage by stage.
+
+Every program of the corpus (`test.py` plus synthetic modules of growing size)
+is run through the same stages as `main.py`, each timed on its own:
+
+- parse: `analyze_python_code` (tokenize and parse)
+- optimize: `PYTOCOptimizer.optimize` (skipped with --no-fold)
+- transpile: `PYTOCTranspiler.visit`
+- emit: writing the generated C to disk
+- compile: the `compile_c` backend invocation (the runtime library is built beforehand)
+
+Times are the best of --repeat runs; peak memory is measured in one more run
+under tracemalloc so tracing does not skew the times. The report is written as
+JSON and can be compared against a stored baseline, which fails the run when a
+stage got slower or hungrier than the threshold allows.
+
+The synthetic modules also check that pytoc's own stages (optimize and
+transpile) scale linearly: their time and peak memory per statement on the
+largest module may not exceed those on the next smaller one by more than
+--scaling-limit. A quadratic pass shows up as a ratio near the size ratio;
+larger heaps alone cost a little per operation, hence the slack.
+
+Usage:
+    python benchmarks/bench_pipeline.py [--output=FILE] [--baseline=FILE] [--save-baseline]
+        [--threshold=0.15] [--repeat=3] [--sizes=1000,10000,100000] [--compile-limit=10000] [--scaling-limit=2.0]
+        [--backend=NAME] [--opt=LEVEL] [--arch=32|64] [--no-compile] [--no-fold]
+"""
+import ast
+import json
+import os
+import platform
+import struct
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import main  # noqa: E402
+import PYTOCBackend  # noqa: E402
+import PYTOCOptimizer  # noqa: E402
+import PYTOCRuntime  # noqa: E402
+import PYTOCTranspiler  # noqa: E402
+
+DEFAULT_OUTPUT = os.path.join(ROOT, "benchmarks", "report.json")
+DEFAULT_BASELINE = os.path.join(ROOT, "benchmarks", "baseline.json")
+DEFAULT_SIZES = (1000, 10000, 100000)
+PHASES = ("parse", "optimize", "transpile", "emit", "compile")
+
+# Differences below these are noise, whatever the relative threshold says.
+MIN_SECONDS_DELTA = 0.02
+MIN_BYTES_DELTA = 1024 * 1024
+
+
+def synthetic_module(statements):
+    """
+    Returns a Python module of about `statements` statements built from the
+    constructs the transpiler supports: assignments, containers, calls, loops,
+    comprehensions, f-strings, functions and try/except.
+    """
+    lines = []
+    count = 0
+    i = 0
+    while count < statements:
+        if i % 20 == 0:
+            lines += [
+                f"def f{i}(x, y=2):",
+                f"    total = x * y + {i}",
+                "    for item in range(y):",
+                "        total += item",
+                "    return [total, x]",
+            ]
+            count += 5
+        lines += [
+            f"a{i} = {i} * 3 + 1",
+            f"b{i} = [a{i}, {i}, 'item{i % 50}']",
+            f"c{i} = {{'key': b{i}, 'n': a{i}}}",
+            f"d{i} = [v * 2 for v in range(a{i} % 7)]",
+            f"for v in b{i}:",
+            "    print(v)",
+            f"b{i}.append(len(d{i}))",
+            f"print(f'{{a{i}}}: {{sum(x for x in d{i})}}')",
+            "try:",
+            f"    print(c{i}['key'][0])",
+            "except KeyError:",
+            "    pass",
+        ]
+        count += 12
+        if i % 20 == 0:
+            lines.append(f"print(f{i}(a{i}))")
+            count += 1
+        i += 1
+    return "\n".join(lines) + "\n"
+
+
+def corpus(sizes):
+    """Yields (name, source) for every benchmarked program."""
+    with open(os.path.join(ROOT, "test.py"), encoding="utf-8") as f:
+        yield "test.py", f.read()
+    for size in sizes:
+        yield f"synthetic_{size}", synthetic_module(size)
+
+
+def count_statements(source):
+    return sum(isinstance(node, ast.stmt) for node in ast.walk(ast.parse(source)))
+
+
+def run_pipeline(source, c_path, backend, opt, fold, compile_program, traced):
+    """
+    Runs one build of `source` and measures each stage.
+
+    Returns:
+        tuple: ({stage: seconds or peak bytes}, generated C code)
+    """
+    results = {}
+
+    def measure(phase, stage):
+        if traced:
+            tracemalloc.reset_peak()
+            stage()
+            results[phase] = tracemalloc.get_traced_memory()[1]
+        else:
+            start = time.perf_counter()
+            stage()
+            results[phase] = time.perf_counter() - start
+
+    state = {}
+
+    def parse():
+        state["tree"] = main.analyze_python_code(source)[1]
+
+    def optimize():
+        state["tree"] = PYTOCOptimizer.optimize(state["tree"], copy_tree=False)
+
+    def transpile():
+        state["code"] = PYTOCTranspiler.PYTOCTranspiler().visit(state["tree"])["code"]
+
+    def emit():
+        with open(c_path, "w", encoding="utf-8") as f:
+            f.write(state["code"])
+
+    def compile_c():
+        success, message = main.compile_c(state["code"], os.path.splitext(c_path)[0] + backend.exe_suffix,
+                                          arch=backend.arch, backend=backend, opt=opt)
+        if not success:
+            raise RuntimeError(message)
+
+    measure("parse", parse)
+    if fold:
+        measure("optimize", optimize)
+    measure("transpile", transpile)
+    measure("emit", emit)
+    if compile_program and not traced:
+        measure("compile", compile_c)
+    return results, state["code"]
+
+
+def benchmark_program(name, source, work_dir, backend, opt, fold, repeat, compile_program):
+    c_path = os.path.join(work_dir, f"{name.replace('.', '_')}.c")
+    seconds = {}
+    code = ""
+    for _ in range(repeat):
+        times, code = run_pipeline(source, c_path, backend, opt, fold, compile_program, traced=False)
+        for phase, value in times.items():
+            seconds[phase] = min(seconds.get(phase, value), value)
+
+    tracemalloc.start()
+    try:
+        peaks, _ = run_pipeline(source, c_path, backend, opt, fold, False, traced=True)
+    finally:
+        tracemalloc.stop()
+
+    phases = {
+        phase: {"seconds": seconds[phase], "peak_bytes": peaks.get(phase)}
+        for phase in PHASES if phase in seconds
+    }
+    return {
+        "statements": count_statements(source),
+        "c_bytes": len(code.encode("utf-8")),
+        "total_seconds": sum(seconds.values()),
+        "phases": phases,
+    }
+
+
+def front_end(program):
+    """Seconds and peak bytes of pytoc's own stages turning the syntax tree into C."""
+    phases = [program["phases"][p] for p in ("optimize", "transpile") if p in program["phases"]]
+    return sum(p["seconds"] for p in phases), max(p["peak_bytes"] for p in phases)
+
+
+def scaling_report(programs, sizes, limit):
+    """
+    Compares time and memory per statement of the two largest synthetic modules;
+    the smaller ones finish too quickly to time reliably.
+    """
+    synthetic = [programs[f"synthetic_{size}"] for size in sorted(set(sizes))]
+    if len(synthetic) < 2:
+        return None
+    small, large = synthetic[-2], synthetic[-1]
+    (small_time, small_memory), (large_time, large_memory) = front_end(small), front_end(large)
+
+    def per_statement(value, program):
+        return value / program["statements"]
+
+    time_ratio = per_statement(large_time, large) / per_statement(small_time, small)
+    memory_ratio = per_statement(large_memory, large) / per_statement(small_memory, small)
+    return {
+        "statements": [small["statements"], large["statements"]],
+        "time_ratio": time_ratio,
+        "memory_ratio": memory_ratio,
+        "limit": limit,
+        "linear": time_ratio <= limit and memory_ratio <= limit,
+    }
+
+
+def compare(report, baseline, threshold):
+    """
+    Lists the stages of `report` that regressed against `baseline`.
+
+    Returns:
+        list: Human-readable regression descriptions.
+    """
+    regressions = []
+    for name, program in report["programs"].items():
+        base_program = baseline.get("programs", {}).get(name)
+        if base_program is None:
+            continue
+        for phase, stats in program["phases"].items():
+            base = base_program["phases"].get(phase)
+            if base is None:
+                continue
+            for key, floor, unit in (("seconds", MIN_SECONDS_DELTA, "s"), ("peak_bytes", MIN_BYTES_DELTA, "B")):
+                new, old = stats.get(key), base.get(key)
+                if new is None or old is None:
+                    continue
+                if new > old * (1 + threshold) and new - old > floor:
+                    change = (new / old - 1) if old else float("inf")
+                    regressions.append(f"{name} {phase} {key}: {old:.4g}{unit} -> {new:.4g}{unit} (+{change:.0%})")
+    return regressions
+
+
+def print_report(report):
+    width = max(len(name) for name in report["programs"])
+    header = "".join(f"{phase:>11}" for phase in PHASES)
+    print(f"{'Program'.ljust(width)}  {'Stmts':>7}{header}    Peak MB")
+    for name, program in report["programs"].items():
+        cells = "".join(
+            f"{program['phases'][phase]['seconds']:10.3f}s" if phase in program["phases"] else f"{'-':>11}"
+            for phase in PHASES
+        )
+        peak = max((p["peak_bytes"] or 0) for p in program["phases"].values()) / (1024 * 1024)
+        print(f"{name.ljust(width)}  {program['statements']:>7}{cells}  {peak:9.1f}")
+    scaling = report.get("scaling")
+    if scaling:
+        status = "linear" if scaling["linear"] else "NOT LINEAR"
+        print(f"\nScaling {scaling['statements'][0]} -> {scaling['statements'][1]} statements: "
+              f"time/statement x{scaling['time_ratio']:.2f}, memory/statement x{scaling['memory_ratio']:.2f} "
+              f"(limit x{scaling['limit']:.2f}): {status}")
+
+
+def main_cli():
+    args = sys.argv[1:]
+    if "-h" in args or "--help" in args:
+        print(__doc__.strip())
+        sys.exit(0)
+
+    output = DEFAULT_OUTPUT
+    baseline_path = None
+    save_baseline = False
+    threshold = 0.15
+    repeat = 3
+    sizes = DEFAULT_SIZES
+    compile_limit = 10000
+    scaling_limit = 2.0
+    backend_name = None
+    opt = None
+    architecture = str(struct.calcsize("P") * 8)
+    compile_programs = True
+    fold = True
+    for arg in args:
+        if arg.startswith("--output="):
+            output = arg.split("=", 1)[1]
+        elif arg == "--baseline":
+            baseline_path = DEFAULT_BASELINE
+        elif arg.startswith("--baseline="):
+            baseline_path = arg.split("=", 1)[1]
+        elif arg == "--save-baseline":
+            save_baseline = True
+        elif arg.startswith("--threshold="):
+            threshold = float(arg.split("=")[1])
+        elif arg.startswith("--repeat="):
+            repeat = max(1, int(arg.split("=")[1]))
+        elif arg.startswith("--sizes="):
+            sizes = tuple(int(size) for size in arg.split("=")[1].split(",") if size)
+        elif arg.startswith("--compile-limit="):
+            compile_limit = int(arg.split("=")[1])
+        elif arg.startswith("--scaling-limit="):
+            scaling_limit = float(arg.split("=")[1])
+        elif arg.startswith("--backend="):
+            backend_name = arg.split("=")[1]
+        elif arg.startswith("--opt="):
+            opt = arg.split("=")[1]
+        elif arg.startswith("--arch="):
+            architecture = arg.split("=")[1]
+        elif arg == "--no-compile":
+            compile_programs = False
+        elif arg == "--no-fold":
+            fold = False
+        else:
+            print(f"Error: Unknown argument '{arg}'.")
+            sys.exit(1)
+
+    backend = None
+    if compile_programs:
+        try:
+            backend = PYTOCBackend.find_backend(backend_name, architecture)
+        except ValueError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        if backend is None:
+            print(f"No C compiler found for {architecture}-bit; skipping the compile stage.")
+        else:
+            # Build the runtime up front so the compile stage only times the program itself.
+            success, message = PYTOCRuntime.build_runtime(backend, opt=opt)
+            if not success:
+                print(f"Error: {message}")
+                sys.exit(1)
+
+    report = {
+        "version": main.VERSION,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "backend": f"{backend.name} {backend.version()}" if backend else None,
+        "opt": opt,
+        "fold": fold,
+        "repeat": repeat,
+        "programs": {},
+    }
+    with tempfile.TemporaryDirectory(prefix="pytoc-bench-") as work_dir:
+        for name, source in corpus(sizes):
+            compile_program = backend is not None and count_statements(source) <= compile_limit
+            report["programs"][name] = benchmark_program(name, source, work_dir, backend, opt, fold, repeat,
+                                                         compile_program)
+    report["scaling"] = scaling_report(report["programs"], sizes, scaling_limit)
+
+    print_report(report)
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReport written to {output}")
+
+    failed = report["scaling"] is not None and not report["scaling"]["linear"]
+    if save_baseline and baseline_path is None:
+        baseline_path = DEFAULT_BASELINE
+    if baseline_path is not None and not os.path.isfile(baseline_path):
+        if not save_baseline:
+            print(f"Error: Baseline '{baseline_path}' not found (create it with --save-baseline).")
+            sys.exit(1)
+    elif baseline_path is not None:
+        with open(baseline_path, encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) against {baseline_path} (threshold {threshold:.0%}):")
+            for regression in regressions:
+                print(f"  {regression}")
+            failed = True
+        else:
+            print(f"\nNo regressions against {baseline_path} (threshold {threshold:.0%}).")
+    if save_baseline:
+        with open(baseline_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {baseline_path}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main_cli()
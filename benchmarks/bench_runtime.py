@@ -0,0 +1,238 @@
+"""
+Benchmarks compiled binaries against CPython.
+
+Every program in `benchmarks/programs/` is compiled with the host backend and
+then run both under CPython and as the native binary. Each run records wall
+time, user and system CPU time and peak RSS (best of --repeat runs), and the
+two outputs are compared byte for byte. The results are printed as a speedup
+table and written as JSON; a program whose binary is slower than the
+interpreter is marked SLOWER, which points at a runtime path in `include/`
+worth a look.
+
+Runs headless on POSIX. CPU time and peak RSS come from wait4() in a tiny C
+launcher built with the same backend: a child forked straight from this
+Python process would report Python's own RSS as its peak.
+
+Usage:
+    python benchmarks/bench_runtime.py [program ...] [--opt=LEVEL] [--backend=NAME]
+        [--python=PATH] [--repeat=3] [--output=FILE]
+"""
+import glob
+import json
+import os
+import platform
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import main  # noqa: E402
+import PYTOCBackend  # noqa: E402
+
+PROGRAMS_DIR = os.path.join(ROOT, "benchmarks", "programs")
+DEFAULT_OUTPUT = os.path.join(ROOT, "benchmarks", "runtime_report.json")
+
+# Runs argv[1:] with stderr discarded and prints "exit wall user sys maxrss" to stderr.
+LAUNCHER_SOURCE = r"""
+#include <fcntl.h>
+#include <stdio.h>
+#include <sys/resource.h>
+#include <sys/time.h>
+#include <sys/wait.h>
+#include <time.h>
+#include <unistd.h>
+
+static double seconds(struct timeval tv) { return tv.tv_sec + tv.tv_usec / 1e6; }
+
+int main(int argc, char** argv) {
+    struct timespec start, end;
+    struct rusage usage;
+    int status;
+    if (argc < 2) return 2;
+    clock_gettime(CLOCK_MONOTONIC, &start);
+    pid_t pid = fork();
+    if (pid == 0) {
+        int null = open("/dev/null", O_WRONLY);
+        dup2(null, 2);
+        execvp(argv[1], argv + 1);
+        _exit(127);
+    }
+    wait4(pid, &status, 0, &usage);
+    clock_gettime(CLOCK_MONOTONIC, &end);
+    fprintf(stderr, "%d %.6f %.6f %.6f %ld\n",
+            WIFEXITED(status) ? WEXITSTATUS(status) : 128 + WTERMSIG(status),
+            (end.tv_sec - start.tv_sec) + (end.tv_nsec - start.tv_nsec) / 1e9,
+            seconds(usage.ru_utime), seconds(usage.ru_stime), usage.ru_maxrss);
+    return 0;
+}
+"""
+
+
+def build_launcher(backend, work_dir):
+    source = os.path.join(work_dir, "launcher.c")
+    with open(source, "w", encoding="utf-8") as f:
+        f.write(LAUNCHER_SOURCE)
+    launcher = os.path.join(work_dir, "launcher")
+    result = subprocess.run([backend.path, source, "-o", launcher], capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"Could not build the launcher:\n{result.stdout}{result.stderr}")
+    return launcher
+
+
+def run(launcher, cmd, output_path):
+    """
+    Runs `cmd` through the launcher with stdout redirected to `output_path`.
+
+    Returns:
+        dict: Exit code, wall/user/sys seconds and peak RSS in KiB.
+    """
+    with open(output_path, "wb") as out:
+        result = subprocess.run([launcher, *cmd], stdout=out, stderr=subprocess.PIPE, stdin=subprocess.DEVNULL,
+                                text=True)
+    exit_code, wall, user, system, max_rss = result.stderr.split()
+    return {
+        "exit_code": int(exit_code),
+        "wall": float(wall),
+        "user": float(user),
+        "sys": float(system),
+        # ru_maxrss is in KiB on Linux and in bytes on macOS.
+        "max_rss_kb": int(max_rss) // 1024 if sys.platform == "darwin" else int(max_rss),
+    }
+
+
+def best_of(launcher, cmd, output_path, repeat):
+    """Runs `cmd` `repeat` times and keeps the fastest run."""
+    runs = [run(launcher, cmd, output_path) for _ in range(repeat)]
+    return min(runs, key=lambda r: r["wall"])
+
+
+def read_bytes(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def benchmark_program(path, work_dir, launcher, backend, opt, python, repeat):
+    name = os.path.splitext(os.path.basename(path))[0]
+    with open(path, encoding="utf-8") as f:
+        source = f.read()
+    binary = os.path.join(work_dir, name + backend.exe_suffix)
+    start = time.perf_counter()
+    success, message = main.compile_c(main.python_to_c(source), binary, arch=backend.arch, backend=backend, opt=opt)
+    build_time = time.perf_counter() - start
+    if not success:
+        return {"name": name, "error": message}
+
+    cpython_out = os.path.join(work_dir, name + ".cpython.out")
+    native_out = os.path.join(work_dir, name + ".native.out")
+    cpython = best_of(launcher, [python, path], cpython_out, repeat)
+    native = best_of(launcher, [binary], native_out, repeat)
+    return {
+        "name": name,
+        "build_seconds": build_time,
+        "cpython": cpython,
+        "native": native,
+        "speedup": cpython["wall"] / native["wall"] if native["wall"] else None,
+        "output_equal": cpython["exit_code"] == native["exit_code"]
+        and read_bytes(cpython_out) == read_bytes(native_out),
+    }
+
+
+def print_table(results):
+    width = max(len(r["name"]) for r in results)
+    print(f"{'Program'.ljust(width)}  {'CPython':>9}  {'pytoc':>9}  {'Speedup':>8}  "
+          f"{'CPy user/sys':>13}  {'pytoc user/sys':>14}  {'CPy RSS':>8}  {'pytoc RSS':>9}  Output")
+    for r in results:
+        if "error" in r:
+            print(f"{r['name'].ljust(width)}  build failed: {r['error'].splitlines()[0]}")
+            continue
+        c, n = r["cpython"], r["native"]
+        speedup = f"{r['speedup']:7.2f}x" if r["speedup"] else f"{'-':>8}"
+        output = "same" if r["output_equal"] else "DIFFERENT"
+        if r["speedup"] is not None and r["speedup"] < 1:
+            output += "  SLOWER"
+        print(f"{r['name'].ljust(width)}  {c['wall']:8.3f}s  {n['wall']:8.3f}s  {speedup}  "
+              f"{c['user']:6.2f}/{c['sys']:5.2f}s  {n['user']:7.2f}/{n['sys']:5.2f}s  "
+              f"{c['max_rss_kb'] / 1024:6.1f}MB  {n['max_rss_kb'] / 1024:7.1f}MB  {output}")
+
+
+def main_cli():
+    args = sys.argv[1:]
+    if "-h" in args or "--help" in args:
+        print(__doc__.strip())
+        sys.exit(0)
+    if os.name != "posix":
+        print("Error: bench_runtime.py runs on POSIX systems only.")
+        sys.exit(1)
+
+    opt = "2"
+    backend_name = None
+    python = sys.executable
+    repeat = 3
+    output = DEFAULT_OUTPUT
+    selected = []
+    for arg in args:
+        if arg.startswith("--opt="):
+            opt = arg.split("=")[1] or None
+        elif arg.startswith("--backend="):
+            backend_name = arg.split("=")[1]
+        elif arg.startswith("--python="):
+            python = arg.split("=", 1)[1]
+        elif arg.startswith("--repeat="):
+            repeat = max(1, int(arg.split("=")[1]))
+        elif arg.startswith("--output="):
+            output = arg.split("=", 1)[1]
+        elif arg.startswith("-"):
+            print(f"Error: Unknown argument '{arg}'.")
+            sys.exit(1)
+        else:
+            selected.append(arg)
+
+    architecture = str(struct.calcsize("P") * 8)
+    try:
+        backend = PYTOCBackend.find_backend(backend_name, architecture)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    if backend is None:
+        print(f"Error: No C compiler found for {architecture}-bit.")
+        sys.exit(1)
+
+    programs = sorted(glob.glob(os.path.join(PROGRAMS_DIR, "*.py")))
+    if selected:
+        programs = [p for p in programs if os.path.splitext(os.path.basename(p))[0] in selected]
+    if not programs:
+        print("Error: No benchmark programs selected.")
+        sys.exit(1)
+
+    with tempfile.TemporaryDirectory(prefix="pytoc-runtime-bench-") as work_dir:
+        try:
+            launcher = build_launcher(backend, work_dir)
+        except RuntimeError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        results = [benchmark_program(p, work_dir, launcher, backend, opt, python, repeat) for p in programs]
+
+    print_table(results)
+    report = {
+        "version": main.VERSION,
+        "python": subprocess.run([python, "-c", "import platform; print(platform.python_version())"],
+                                 capture_output=True, text=True).stdout.strip(),
+        "platform": platform.platform(),
+        "backend": f"{backend.name} {backend.version()}",
+        "opt": opt,
+        "repeat": repeat,
+        "programs": results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReport written to {output}")
+    sys.exit(0 if all(r.get("output_equal") for r in results) else 1)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,20 @@
+# Calls to small user functions in a tight loop.
+
+
+def add(a, b):
+    return a + b
+
+
+def scale(x, factor=3):
+    return x * factor
+
+
+total = 0
+for i in range(2000000):
+    total = add(total, i)
+print(total)
+
+scaled = 0
+for i in range(1000000):
+    scaled = add(scaled, scale(i))
+print(scaled)
@@ -0,0 +1,31 @@
+# List and dict building, lookup and iteration.
+
+counts = {}
+for i in range(300000):
+    key = i % 1000
+    counts[key] = counts.get(key, 0) + 1
+print(len(counts), counts[7])
+
+squares = [i * i for i in range(300000)]
+print(sum(squares))
+evens = [x for x in squares if x % 2 == 0]
+print(len(evens))
+ordered = sorted(evens)
+print(ordered[len(ordered) - 1])
+
+lookup = {i: i * 2 for i in range(200000)}
+total = 0
+for k, v in lookup.items():
+    total += k + v
+print(total)
+
+grid = [[j for j in range(10)] for i in range(20000)]
+print(sum(len(row) for row in grid))
+
+stack = []
+for i in range(200000):
+    stack.append(i)
+popped = 0
+for i in range(100000):
+    popped += stack.pop()
+print(popped, len(stack))
@@ -0,0 +1,28 @@
+# Integer arithmetic in counted and while loops, plus a small function.
+
+
+def collatz_steps(n):
+    steps = 0
+    while n != 1:
+        # n // 2 when n is even, 3 * n + 1 when it is odd.
+        n = (n % 2) * (3 * n + 1) + (1 - n % 2) * (n // 2)
+        steps += 1
+    return steps
+
+
+total = 0
+for i in range(1, 3000000):
+    total += i * i % 7
+print(total)
+
+x = 0
+i = 0
+while i < 5000000:
+    x = (x * 31 + i) % 1000003
+    i += 1
+print(x)
+
+steps = 0
+for n in range(1, 30000):
+    steps += collatz_steps(n)
+print(steps)
@@ -0,0 +1,7 @@
+# Many small writes to stdout.
+
+for i in range(300000):
+    print(i, i * 2, "line")
+
+for i in range(100000):
+    print(f"row {i} of {100000}")
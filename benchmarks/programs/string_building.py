@@ -0,0 +1,29 @@
+# Concatenation, conversion and formatting of strings.
+
+
+def concat_all(parts):
+    text = ""
+    for part in parts:
+        text += part
+    return text
+
+
+def digit_string(count):
+    digits = ""
+    for i in range(count):
+        digits += str(i % 10)
+    return digits
+
+
+print(len(digit_string(100000)))
+
+parts = [str(i) for i in range(50000)]
+print(len(concat_all(parts)))
+
+shouted = 0
+for part in parts:
+    shouted += len((part + "abc").upper())
+print(shouted)
+
+lines = [f"{i}: {i * 2}" for i in range(100000)]
+print(len(lines), lines[99999])
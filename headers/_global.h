@@ -5,6 +5,8 @@
 #include <stdio.h>
 #include <string.h>
 
+#include "alloc.h"
+
 typedef enum {
     TYPE_NONE,
     TYPE_INT,
@@ -15,36 +17,58 @@ typedef enum {
     TYPE_DICT,
     TYPE_SET,
     TYPE_FROZENSET,
-    TYPE_BOOL
+    TYPE_BOOL,
+    TYPE_EXCEPTION,
+    TYPE_FILE,
+    TYPE_ITERATOR
 } ValueType;
 
 typedef struct Value Value;
 
+// Defined with the exception machinery in exc.h.
+typedef struct Exception Exception;
+
+// Defined with the file readers in io.h.
+typedef struct File File;
+
+// Defined with the iterator protocol in runtime.h.
+typedef struct Iterator Iterator;
+
+// Heap payloads are shared between Values and freed when `refcount` drops to zero.
+
 typedef struct {
+    int refcount;
     int count;
     Value* items;
 } Tuple;
 
+// `items` has room for `capacity` Values; appends grow it geometrically.
 typedef struct {
+    int refcount;
     int count;
+    int capacity;
     Value* items;
 } List;
 
+typedef struct DictEntry DictEntry;
+
+// Insertion-ordered hash table laid out like CPython's compact dict: `entries`
+// holds the items in insertion order and `indices` is an open-addressing table
+// (`mask + 1` slots, a power of two) of positions in `entries`, -1 when empty.
+// Sets use the same table with every value left as None.
 typedef struct {
+    int refcount;
     int count;
-    Value* keys;
-    Value* values;
+    int capacity;
+    size_t mask;
+    DictEntry* entries;
+    int* indices;
+    size_t hash;  // Cached hash of a frozenset, 0 until first computed.
 } Dict;
 
-typedef struct {
-    int count;
-    Value* items;
-} Set;
+typedef Dict Set;
 
-typedef struct {
-    int count;
-    Value* items;
-} FrozenSet;
+typedef Set FrozenSet;
 
 typedef struct {
     int bool_val;
@@ -54,37 +78,103 @@ typedef struct {
 	double float_val;
 } Float;
 
+// Every string_val points just past a StringHeader. Heap strings own the block
+// that starts at the header; immortal strings live in static storage (see
+// PYTOC_STRING) and are never freed or duplicated. The chars are still NUL
+// terminated, but `len` is authoritative and `hash` is computed on first use.
+typedef struct {
+    unsigned int flags;
+    int refcount;
+    size_t len;
+    size_t hash;
+    size_t capacity;  // chars the block has room for; heap strings only
+} StringHeader;
+
+#define STRING_IMMORTAL 1u
+#define STRING_HEADER(s) ((StringHeader*)((s) - sizeof(StringHeader)))
+#define STRING_IS_IMMORTAL(s) (STRING_HEADER(s)->flags & STRING_IMMORTAL)
+#define STRING_LEN(s) (STRING_HEADER(s)->len)
+
+// Declares a static, immortal string Value; the transpiler emits one per literal.
+#define PYTOC_STRING(name, text) \
+    static struct { StringHeader header; char chars[sizeof(text)]; } name##_data = { { STRING_IMMORTAL, 0, sizeof(text) - 1, 0 }, text }; \
+    static Value name = { .type = TYPE_STRING, .string_val = name##_data.chars }
+
 struct Value {
     ValueType type;
     union {
-        int int_val;
+        long long int_val;
         double float_val;
         char* string_val;
         int bool_val;
-        Tuple tuple_val;
-        List list_val;
-        Dict dict_val;
-        Set set_val;
+        Tuple* tuple_val;
+        List* list_val;
+        Dict* dict_val;
+        Set* set_val;
+        Exception* exc_val;
+        File* file_val;
+        Iterator* iter_val;
     };
 };
 
-Value None = { .type = TYPE_NONE };
-Value create_int(int val);
+struct DictEntry {
+    size_t hash;
+    Value key;
+    Value value;
+};
+
+Value create_int(long long val);
 Value create_float(double val);
 Value create_bool(int b);
 Value create_tuple(int size);
 Value create_list(int size);
 Value create_dict(int size);
 Value dict_set(Value* dict, Value key, Value value);
+Value* dict_lookup(Value dict, Value key);
+size_t hash_value(Value v);
+int values_equal(Value a, Value b);
 Value create_set(int size);
 Value create_frozenset(int size);
+Value set_insert(Value* set, Value item);
+int set_contains(Value set, Value item);
 Value create_none();
 Value create_string(const char* str);
+Value create_string_len(const char* str, size_t len);
+Value char_string(unsigned char c);
+Value adopt_string(char* s);
+char* string_alloc(size_t len);
+#ifdef PYTOC_TRACE_ALLOC
+// Charges each string to the runtime function that asked for it, not to string_alloc().
+char* string_alloc_traced(size_t len, const char* where, const char* func);
+#define string_alloc(len) string_alloc_traced((len), PYTOC_ALLOC_SITE)
+#endif
+void string_free(char* s);
 extern Value None;
 void print_value(Value v);
 void free_value(Value v);
+
+// Reference counting. Every new heap object starts with one reference owned by
+// the autorelease pool; variables and containers retain what they hold, and the
+// transpiler drains the pool back to a mark after each statement, freeing
+// temporaries nothing retained.
+Value retain_value(Value v);
+void release_value(Value v);
+void assign_value(Value* slot, Value v);
+Value autorelease_value(Value v);
+void autorelease_drain(size_t mark);
+
+extern size_t autorelease_top;
+
+static inline size_t pool_mark(void) {
+    return autorelease_top;
+}
+
+static inline void pool_drain(size_t mark) {
+    if (autorelease_top > mark) autorelease_drain(mark);
+}
+
 char* str_concat(const char* a, const char* b);
-Value print(Value v, Value sep_val, Value end_val);
+Value print(Value v, Value sep_val, Value end_val, Value flush_val);
 Value copy_value(Value v);
 
 #endif // GLOBAL_H
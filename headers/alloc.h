@@ -0,0 +1,42 @@
+#ifndef ALLOC_H
+#define ALLOC_H
+
+#include <stdlib.h>
+
+// Every heap block of the runtime is obtained through these macros. Building the
+// runtime with -DPYTOC_TRACE_ALLOC (`--trace-alloc`) routes them through a counting
+// allocator (alloc.c) that records each block's ValueType and call site, and
+// prints per-type and per-site totals, frees, live bytes and the high-water mark
+// at exit. Otherwise they are plain malloc/calloc/realloc/free.
+//
+// `type` is a ValueType; TYPE_NONE marks the runtime's own buffers.
+
+#define PYTOC_STRINGIFY_(x) #x
+#define PYTOC_STRINGIFY(x) PYTOC_STRINGIFY_(x)
+
+#ifdef PYTOC_TRACE_ALLOC
+
+// Expands to the `where, func` arguments identifying the calling line.
+#define PYTOC_ALLOC_SITE __FILE__ ":" PYTOC_STRINGIFY(__LINE__), __func__
+
+void* trace_malloc(size_t size, int type, const char* where, const char* func);
+void* trace_calloc(size_t count, size_t size, int type, const char* where, const char* func);
+void* trace_realloc(void* block, size_t size, int type, const char* where, const char* func);
+void trace_free(void* block);
+void trace_report(void);
+
+#define pytoc_malloc(size, type) trace_malloc((size), (type), PYTOC_ALLOC_SITE)
+#define pytoc_calloc(count, size, type) trace_calloc((count), (size), (type), PYTOC_ALLOC_SITE)
+#define pytoc_realloc(block, size, type) trace_realloc((block), (size), (type), PYTOC_ALLOC_SITE)
+#define pytoc_free(block) trace_free(block)
+
+#else
+
+#define pytoc_malloc(size, type) ((void)(type), malloc(size))
+#define pytoc_calloc(count, size, type) ((void)(type), calloc((count), (size)))
+#define pytoc_realloc(block, size, type) ((void)(type), realloc((block), (size)))
+#define pytoc_free(block) free(block)
+
+#endif
+
+#endif // ALLOC_H
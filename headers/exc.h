@@ -1,24 +1,57 @@
 #ifndef EXC_H
 #define EXC_H
 
-#include "runtime.h"
-#include "ops.h"
 #include "_global.h"
 #include "try-catch.h"
 
-Value ValueError;
-Value TypeError;
-Value ZeroDivisionError;
+#if defined(__GNUC__) || defined(__TINYC__)
+#define PYTOC_NORETURN __attribute__((noreturn))
+#else
+#define PYTOC_NORETURN
+#endif
 
+// A builtin exception class; `base` links it to its parent up to BaseException.
+typedef struct ExceptionType {
+    const char* name;
+    const struct ExceptionType* base;
+} ExceptionType;
 
-void raise_exception(TryCatchContext* ctx, const char* name, const char* message);
-void clear_exception(TryCatchContext* ctx);
-void print_exception(TryCatchContext* ctx);
-Value make_value_from_exc(TryCatchContext* ctx);
+struct Exception {
+    int refcount;
+    const ExceptionType* type;
+    Value message;
+};
 
-// Optional extended raise helpers
-void raise_exception_with_value(TryCatchContext* ctx, const char* name, const char* message, Value value);
-void raise_exception_with_context(TryCatchContext* ctx, const char* name, const char* message, TryCatchContext* other);
-void raise_exception_full(TryCatchContext* ctx, const char* name, const char* message, Value value, TryCatchContext* other, const char* extra);
+extern const ExceptionType Exc_BaseException;
+extern const ExceptionType Exc_Exception;
+extern const ExceptionType Exc_ArithmeticError;
+extern const ExceptionType Exc_ZeroDivisionError;
+extern const ExceptionType Exc_OverflowError;
+extern const ExceptionType Exc_AssertionError;
+extern const ExceptionType Exc_AttributeError;
+extern const ExceptionType Exc_LookupError;
+extern const ExceptionType Exc_IndexError;
+extern const ExceptionType Exc_KeyError;
+extern const ExceptionType Exc_NameError;
+extern const ExceptionType Exc_RuntimeError;
+extern const ExceptionType Exc_NotImplementedError;
+extern const ExceptionType Exc_TypeError;
+extern const ExceptionType Exc_ValueError;
+extern const ExceptionType Exc_OSError;
+extern const ExceptionType Exc_FileNotFoundError;
+extern const ExceptionType Exc_IsADirectoryError;
+extern const ExceptionType Exc_EOFError;
+extern const ExceptionType Exc_MemoryError;
+extern const ExceptionType Exc_StopIteration;
+
+Value create_exception(const ExceptionType* type, Value message);
+int exception_matches(Value exc, const ExceptionType* type);
+
+// Unwinds to the innermost handler, or prints "Type: message" and exits with
+// status 1 if there is none.
+PYTOC_NORETURN void raise_exception(Value exc);
+
+// Raises a new exception whose message is formatted like printf.
+PYTOC_NORETURN void raise_error(const ExceptionType* type, const char* format, ...);
 
 #endif // EXC_H
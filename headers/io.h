@@ -7,9 +7,44 @@
 #include <stdio.h>
 #include <string.h>
 
-ssize_t getline(char **lineptr, size_t *n, FILE *stream);
+#define OUTPUT_BUFFER_SIZE (1 << 16)
+#define INPUT_BLOCK_SIZE (1 << 16)
 
-Value print(Value v, Value sep_val, Value end_val);
+// A file opened for reading. Regular files are mapped whole where the platform
+// supports it; everything else (pipes, terminals, stdin) is read in blocks into
+// `data`. Either way lines are found with memchr over `data[pos..size)`.
+struct File {
+    int refcount;
+    FILE* stream;       // NULL when mapped or closed
+    char* data;
+    size_t size;        // bytes of `data` holding file contents
+    size_t pos;         // read position in `data`
+    size_t capacity;    // allocated size of `data`; 0 when mapped
+    int mapped;
+    int closed;
+    int eof;
+    Value name;
+};
+
+// Buffered stdout writer used by print() and print_value().
+void out_write(const char* s, size_t n);
+void out_int(long long v);
+void out_float(double v);
+void out_flush(void);
+void set_output_buffering(int enabled);
+
+Value print(Value v, Value sep_val, Value end_val, Value flush_val);
 Value input(Value prompt_val);
 
-#endif // IO_H
\ No newline at end of file
+Value open_file(Value path, Value mode);
+Value stdin_file(void);
+Value file_read(Value file, Value size);
+Value file_readline(Value file);
+Value file_readlines(Value file);
+Value file_close(Value file);
+void file_free(File* file);
+
+// Next line of a file for a for-loop, or 0 at end of file.
+int file_next(Value file, Value* line);
+
+#endif // IO_H
@@ -0,0 +1,56 @@
+#ifndef NATIVE_H
+#define NATIVE_H
+
+// Helpers for arithmetic on unboxed locals (long long / double) that the
+// transpiler emits when it can prove a variable's type. They follow Python
+// semantics where C differs (floor division, modulo sign, zero divisors).
+
+#include <math.h>
+
+#include "exc.h"
+
+PYTOC_NORETURN void native_zero_division(const char* message);
+
+static inline double py_div(double a, double b) {
+    if (b == 0.0) native_zero_division("division by zero");
+    return a / b;
+}
+
+static inline long long py_floordiv_ll(long long a, long long b) {
+    if (b == 0) native_zero_division("integer division or modulo by zero");
+    long long q = a / b;
+    if ((a % b != 0) && ((a < 0) != (b < 0))) q--;
+    return q;
+}
+
+static inline long long py_mod_ll(long long a, long long b) {
+    if (b == 0) native_zero_division("integer division or modulo by zero");
+    long long r = a % b;
+    if (r != 0 && ((r < 0) != (b < 0))) r += b;
+    return r;
+}
+
+static inline double py_floordiv_d(double a, double b) {
+    if (b == 0.0) native_zero_division("float floor division by zero");
+    return floor(a / b);
+}
+
+static inline double py_mod_d(double a, double b) {
+    if (b == 0.0) native_zero_division("float modulo");
+    double r = fmod(a, b);
+    if (r != 0.0 && ((r < 0.0) != (b < 0.0))) r += b;
+    return r;
+}
+
+// Only emitted for constant, non-negative exponents.
+static inline long long py_pow_ll(long long base, long long exp) {
+    long long result = 1;
+    while (exp > 0) {
+        if (exp & 1) result *= base;
+        base *= base;
+        exp >>= 1;
+    }
+    return result;
+}
+
+#endif // NATIVE_H
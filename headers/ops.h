@@ -14,6 +14,8 @@
 
 Value add_values(Value a, Value b);
 
+Value iadd_values(Value a, Value b);
+
 Value sub_values(Value a, Value b);
 
 Value mul_values(Value a, Value b);
@@ -26,6 +28,10 @@ Value floordiv_values(Value a, Value b);
 
 Value mod_values(Value a, Value b);
 
+Value or_values(Value a, Value b);
+
+Value and_values(Value a, Value b);
+
 Value join_strings(int count, ...);
 
 // Comparisons
@@ -34,6 +40,10 @@ Value eq_values(Value a, Value b);
 
 Value ne_values(Value a, Value b);
 
+Value in_values(Value a, Value b);
+
+Value not_in_values(Value a, Value b);
+
 Value lt_values(Value a, Value b);
 
 Value le_values(Value a, Value b);
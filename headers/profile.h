@@ -0,0 +1,34 @@
+#ifndef PROFILE_H
+#define PROFILE_H
+
+#include <stddef.h>
+
+// Per-function counters for `--profile` builds. The transpiler emits one static
+// entry per user function and wraps the function in profile_enter()/profile_exit();
+// the entry registers itself on its first call.
+typedef struct ProfileEntry {
+    const char* name;
+    int line;
+    long long calls;
+    long long inclusive;    // ns, counted once per outermost activation
+    long long exclusive;    // ns spent in the function itself
+    int active;             // activations currently on the profile stack
+    int registered;
+    struct ProfileEntry* next;
+} ProfileEntry;
+
+// Number of active profiled calls. TRY saves it and CATCH unwinds back to it,
+// because a longjmp skips the profile_exit() of every function it leaves.
+extern size_t profile_depth;
+
+void profile_enter(ProfileEntry* entry);
+void profile_exit(void);
+
+// Exits every frame above `depth` as if it returned now.
+void profile_unwind(size_t depth);
+
+// Writes the report: a table on stderr, or pstats-like JSON to the file named by
+// the PYTOC_PROFILE environment variable. Registered with atexit() on first use.
+void profile_report(void);
+
+#endif // PROFILE_H
@@ -7,21 +7,28 @@
 #include <ctype.h>
 #include <stdbool.h>
 #include "_global.h"
+#include "io.h"
 
 const char* type_name(ValueType t);
 
 
 Value to_int(Value v);
 Value to_string(Value v);
+Value to_float(Value v);
+Value to_list(Value v);
 Value len(Value v);
 Value abs_val(Value v);
 Value max_val(Value list);
 Value min_val(Value list);
 Value sum_val(Value list);
+Value any_val(Value iterable);
+Value all_val(Value iterable);
 Value bool_val(Value v);
 Value ord_val(Value v);
 Value chr_val(Value v);
 Value range_val(Value start, Value stop, Value step);
+long long range_len(long long start, long long stop, long long step);
+long long range_arg(Value v);
 Value range_stop(Value stop);
 Value range_start_stop(Value start, Value stop);
 Value reversed_val(Value v);
@@ -31,10 +38,137 @@ Value isinstance_val(Value v, ValueType type);
 int cmp_int(const void* a, const void* b);
 Value sorted_val(Value list);
 Value set_val(Value v);
+Value frozenset_val(Value v);
+Value set_add(Value set, Value item);
+Value make_set(int lenght, Value* items);
 Value isinstance(Value* v, Value* type_or_str);
 Value make_dict(int lenght, Value* keys, Value* values);
 Value make_list(int lenght, Value* items);
+void list_reserve(List* list, int count);
+Value list_append(Value list, Value item);
+Value list_extend(Value list, Value iterable);
+Value list_pop(Value list, Value index);
+Value list_insert(Value list, Value index, Value item);
+Value getitem_value(Value container, Value key);
+Value setitem_value(Value container, Value key, Value value);
+int contains_value(Value container, Value item);
+Value dict_get(Value dict, Value key, Value default_value);
+Value dict_keys(Value dict);
+Value dict_values(Value dict);
+Value dict_items(Value dict);
+Value as_dict(Value v, const char* method);
+Value iter_list(Value v);
+
+// Iterator protocol. iter_value() returns an iterator over any iterable (files
+// and iterators are their own iterators); iter_next() returns the next item, or
+// the IterStop sentinel once the iterator is exhausted. Items are borrowed from
+// the source or autoreleased, like any other temporary.
+typedef enum {
+    ITER_FORWARD,       // list, tuple, str, dict or set walked by index
+    ITER_REVERSED,
+    ITER_ENUMERATE,
+    ITER_ZIP,
+    ITER_MAP
+} IteratorKind;
+
+struct Iterator {
+    int refcount;
+    IteratorKind kind;
+    Value source;           // container, inner iterator, or tuple of iterators for zip/map
+    size_t index;
+    long long count;        // next enumerate() index
+    void (*function)(void); // map() function, called with one argument per iterator
+    int exhausted;
+};
+
+extern Value IterStop;
+
+static inline int iter_done(Value v) {
+    return v.type == TYPE_ITERATOR && v.iter_val == NULL;
+}
+
+Value iter_value(Value v);
+Value iter_next(Value it);
+Value next_val(Value it, Value default_value);
+Value enumerate_val(Value iterable, Value start);
+Value zip_val(Value iterables);
+Value map_val(void (*function)(void), Value iterables);
+void iterator_free(Iterator* it);
+
+// For-loops walk `loop_source(x)` with loop_next(): containers are read by index
+// in place, without an iterator object; files and iterators go through iter_next().
+Value loop_source(Value v);
+
+static inline int loop_next(Value source, size_t* index, Value* item) {
+    switch (source.type) {
+        case TYPE_LIST:
+            if (*index >= (size_t)source.list_val->count) return 0;
+            *item = source.list_val->items[(*index)++];
+            return 1;
+        case TYPE_TUPLE:
+            if (*index >= (size_t)source.tuple_val->count) return 0;
+            *item = source.tuple_val->items[(*index)++];
+            return 1;
+        case TYPE_STRING:
+            if (*index >= STRING_LEN(source.string_val)) return 0;
+            *item = char_string((unsigned char)source.string_val[(*index)++]);
+            return 1;
+        case TYPE_DICT:
+        case TYPE_SET:
+        case TYPE_FROZENSET:
+            if (*index >= (size_t)source.dict_val->count) return 0;
+            *item = source.dict_val->entries[(*index)++].key;
+            return 1;
+        default:
+            *item = iter_next(source);
+            return !iter_done(*item);
+    }
+}
+
+// Number of items loop_next() will produce from a container, or 0 if unknown;
+// comprehensions use it to preallocate their result.
+static inline size_t loop_length(Value source) {
+    switch (source.type) {
+        case TYPE_LIST: return (size_t)source.list_val->count;
+        case TYPE_TUPLE: return (size_t)source.tuple_val->count;
+        case TYPE_STRING: return STRING_LEN(source.string_val);
+        case TYPE_DICT:
+        case TYPE_SET:
+        case TYPE_FROZENSET: return (size_t)source.dict_val->count;
+        default: return 0;
+    }
+}
+
+// `for x in reversed(seq)`: lists and tuples are walked backwards by index,
+// starting from loop_end(); anything else through a reversed() iterator.
+Value loop_source_reversed(Value v);
+
+static inline size_t loop_end(Value source) {
+    if (source.type == TYPE_LIST) return (size_t)source.list_val->count;
+    if (source.type == TYPE_TUPLE) return (size_t)source.tuple_val->count;
+    return 0;
+}
+
+static inline int loop_prev(Value source, size_t* index, Value* item) {
+    switch (source.type) {
+        case TYPE_LIST:
+            // Like Python's list_reverseiterator, stop if the list shrank below the cursor.
+            if (*index == 0 || *index > (size_t)source.list_val->count) return 0;
+            *item = source.list_val->items[--(*index)];
+            return 1;
+        case TYPE_TUPLE:
+            if (*index == 0) return 0;
+            *item = source.tuple_val->items[--(*index)];
+            return 1;
+        default:
+            *item = iter_next(source);
+            return !iter_done(*item);
+    }
+}
 Value make_tuple(int lenght, Value* items);
 bool is_none(Value v);
+bool is_int(Value v);
+bool is_true(Value v);
+bool is_false(Value v);
 
 #endif // RUNTIME_H
@@ -2,6 +2,9 @@
 #define GLOBAL_C
 
 #include "../headers/_global.h"
+#include "../headers/runtime.h"
+#include "../headers/exc.h"
+#include "../headers/io.h"
 
 #include <stdlib.h>
 #include <stdio.h>
@@ -9,7 +12,7 @@
 #include <stdbool.h>
 
 // Create int value
-Value create_int(int val) {
+Value create_int(long long val) {
     Value v;
     v.type = TYPE_INT;
     v.int_val = val;
@@ -31,65 +34,347 @@ Value create_bool(int b) {
     return v;
 }
 
+// Autorelease pool: owns the initial reference of every new heap object.
+static Value* autorelease_pool = NULL;
+static size_t autorelease_capacity = 0;
+size_t autorelease_top = 0;
+
+Value autorelease_value(Value v) {
+    if (autorelease_top == autorelease_capacity) {
+        autorelease_capacity = autorelease_capacity ? autorelease_capacity * 2 : 256;
+        autorelease_pool = (Value*)pytoc_realloc(autorelease_pool, sizeof(Value) * autorelease_capacity, TYPE_NONE);
+        if (!autorelease_pool) {
+            fprintf(stderr, "autorelease_value: memory allocation failed\n");
+            exit(1);
+        }
+    }
+    autorelease_pool[autorelease_top++] = v;
+    return v;
+}
+
+// Releases every object autoreleased since `mark` was taken with pool_mark().
+void autorelease_drain(size_t mark) {
+    while (autorelease_top > mark) {
+        release_value(autorelease_pool[--autorelease_top]);
+    }
+}
+
+static void* check_alloc(void* block) {
+    if (!block) {
+        fprintf(stderr, "Error: memory allocation failed\n");
+        exit(1);
+    }
+    return block;
+}
+
+// Macros rather than functions so a traced allocation is charged to the caller.
+#define alloc_object(size, type) check_alloc(pytoc_malloc((size), (type)))
+
+// Items start out as None so a partially filled container can always be released.
+#define alloc_items(size, type) ((Value*)check_alloc(pytoc_calloc((size) > 0 ? (size) : 1, sizeof(Value), (type))))
+
 // Create tuple value with size
 Value create_tuple(int size) {
     Value v;
     v.type = TYPE_TUPLE;
-    v.tuple_val.count = size;
-    v.tuple_val.items = (Value*)malloc(sizeof(Value) * size);
-    return v;
+    v.tuple_val = (Tuple*)alloc_object(sizeof(Tuple), TYPE_TUPLE);
+    v.tuple_val->refcount = 1;
+    v.tuple_val->count = size;
+    v.tuple_val->items = alloc_items(size, TYPE_TUPLE);
+    return autorelease_value(v);
 }
 
 // Create list value with size
 Value create_list(int size) {
     Value v;
     v.type = TYPE_LIST;
-    v.list_val.count = size;
-    v.list_val.items = (Value*)malloc(sizeof(Value) * size);
-    return v;
+    v.list_val = (List*)alloc_object(sizeof(List), TYPE_LIST);
+    v.list_val->refcount = 1;
+    v.list_val->count = size;
+    v.list_val->capacity = size > 0 ? size : 1;
+    v.list_val->items = alloc_items(size, TYPE_LIST);
+    return autorelease_value(v);
+}
+
+// Mixes the bits of a key so small or evenly spaced integers spread over the table.
+static size_t mix_hash(unsigned long long x) {
+    x ^= x >> 30;
+    x *= 0xbf58476d1ce4e5b9ULL;
+    x ^= x >> 27;
+    x *= 0x94d049bb133111ebULL;
+    x ^= x >> 31;
+    return (size_t)x;
+}
+
+// Hashed once per string; the result is cached in its header.
+static size_t hash_string(char* s) {
+    StringHeader* header = STRING_HEADER(s);
+    if (!header->hash) {
+        unsigned long long h = 0xcbf29ce484222325ULL;
+        for (size_t i = 0; i < header->len; i++) {
+            h ^= (unsigned char)s[i];
+            h *= 0x100000001b3ULL;
+        }
+        header->hash = mix_hash(h) | 1;
+    }
+    return header->hash;
+}
+
+// Values that compare equal hash equally, so 1, 1.0 and True are the same key.
+size_t hash_value(Value v) {
+    switch (v.type) {
+        case TYPE_NONE:
+            return mix_hash(0x4e6f6e65ULL);
+        case TYPE_BOOL:
+            return mix_hash((unsigned long long)v.bool_val);
+        case TYPE_INT:
+            return mix_hash((unsigned long long)v.int_val);
+        case TYPE_FLOAT: {
+            double f = v.float_val;
+            if (f >= -9.2e18 && f <= 9.2e18 && (double)(long long)f == f) {
+                return mix_hash((unsigned long long)(long long)f);
+            }
+            unsigned long long bits;
+            memcpy(&bits, &f, sizeof(bits));
+            return mix_hash(bits);
+        }
+        case TYPE_STRING:
+            return hash_string(v.string_val);
+        case TYPE_EXCEPTION:
+            return mix_hash((unsigned long long)(size_t)v.exc_val);
+        case TYPE_FILE:
+            return mix_hash((unsigned long long)(size_t)v.file_val);
+        case TYPE_ITERATOR:
+            return mix_hash((unsigned long long)(size_t)v.iter_val);
+        case TYPE_TUPLE: {
+            unsigned long long h = 0x345678ULL;
+            for (int i = 0; i < v.tuple_val->count; i++) {
+                h = (h ^ hash_value(v.tuple_val->items[i])) * 1000003ULL;
+            }
+            return mix_hash(h + (unsigned long long)v.tuple_val->count);
+        }
+        case TYPE_FROZENSET: {
+            // Order-independent, and cached since frozensets never change.
+            Set* s = v.set_val;
+            if (!s->hash) {
+                unsigned long long h = 0x1f0e5e7ULL * (unsigned long long)(s->count + 1);
+                for (int i = 0; i < s->count; i++) {
+                    h += mix_hash(s->entries[i].hash ^ 0x5bd1e995ULL);
+                }
+                s->hash = mix_hash(h) | 1;
+            }
+            return s->hash;
+        }
+        default:
+            raise_error(&Exc_TypeError, "unhashable type: '%s'", type_name(v.type));
+    }
+}
+
+static int string_equal(char* a, char* b) {
+    if (a == b) return 1;
+    StringHeader* ha = STRING_HEADER(a);
+    StringHeader* hb = STRING_HEADER(b);
+    if (ha->len != hb->len) return 0;
+    if (ha->hash && hb->hash && ha->hash != hb->hash) return 0;
+    return memcmp(a, b, ha->len) == 0;
+}
+
+static int is_number(Value v) {
+    return v.type == TYPE_INT || v.type == TYPE_FLOAT || v.type == TYPE_BOOL;
+}
+
+static double number_as_double(Value v) {
+    return v.type == TYPE_FLOAT ? v.float_val : v.type == TYPE_INT ? (double)v.int_val : v.bool_val;
+}
+
+// Python `==` for keys and membership tests: exact, and recursive into containers.
+int values_equal(Value a, Value b) {
+    if (is_number(a) && is_number(b)) {
+        if (a.type == TYPE_FLOAT || b.type == TYPE_FLOAT) {
+            return number_as_double(a) == number_as_double(b);
+        }
+        long long left = a.type == TYPE_INT ? a.int_val : a.bool_val;
+        long long right = b.type == TYPE_INT ? b.int_val : b.bool_val;
+        return left == right;
+    }
+    if ((a.type == TYPE_SET || a.type == TYPE_FROZENSET) && (b.type == TYPE_SET || b.type == TYPE_FROZENSET)) {
+        if (a.set_val->count != b.set_val->count) return 0;
+        for (int i = 0; i < a.set_val->count; i++) {
+            if (!set_contains(b, a.set_val->entries[i].key)) return 0;
+        }
+        return 1;
+    }
+    if (a.type != b.type) return 0;
+    switch (a.type) {
+        case TYPE_NONE:
+            return 1;
+        case TYPE_STRING:
+            return string_equal(a.string_val, b.string_val);
+        case TYPE_TUPLE:
+            if (a.tuple_val->count != b.tuple_val->count) return 0;
+            for (int i = 0; i < a.tuple_val->count; i++) {
+                if (!values_equal(a.tuple_val->items[i], b.tuple_val->items[i])) return 0;
+            }
+            return 1;
+        case TYPE_LIST:
+            if (a.list_val->count != b.list_val->count) return 0;
+            for (int i = 0; i < a.list_val->count; i++) {
+                if (!values_equal(a.list_val->items[i], b.list_val->items[i])) return 0;
+            }
+            return 1;
+        case TYPE_DICT:
+            if (a.dict_val->count != b.dict_val->count) return 0;
+            for (int i = 0; i < a.dict_val->count; i++) {
+                Value* other = dict_lookup(b, a.dict_val->entries[i].key);
+                if (!other || !values_equal(a.dict_val->entries[i].value, *other)) return 0;
+            }
+            return 1;
+        case TYPE_EXCEPTION:
+            return a.exc_val == b.exc_val;
+        case TYPE_FILE:
+            return a.file_val == b.file_val;
+        case TYPE_ITERATOR:
+            return a.iter_val == b.iter_val;
+        default:
+            return 0;
+    }
+}
+
+#define DICT_MIN_SIZE 8
+
+// Smallest table that keeps `count` keys at a load factor of at most 2/3.
+static size_t dict_table_size(int count) {
+    size_t size = DICT_MIN_SIZE;
+    while (size * 2 < (size_t)count * 3) size <<= 1;
+    return size;
+}
+
+// Returns the slot of `indices` that holds `key`, or the empty slot it belongs in.
+static int* dict_probe(Dict* d, Value key, size_t hash) {
+    size_t perturb = hash;
+    size_t i = hash & d->mask;
+    for (;;) {
+        int* slot = &d->indices[i];
+        if (*slot < 0) return slot;
+        DictEntry* e = &d->entries[*slot];
+        if (e->hash == hash && values_equal(e->key, key)) return slot;
+        perturb >>= 5;
+        i = (i * 5 + perturb + 1) & d->mask;
+    }
+}
+
+// Rebuilds `indices` with `size` slots. Entries keep their order and hashes.
+// `type` (dict or set) only labels traced allocations.
+static void dict_resize(Dict* d, size_t size, ValueType type) {
+    int* indices = (int*)alloc_object(size * sizeof(int), type);
+    memset(indices, 0xff, size * sizeof(int));
+    pytoc_free(d->indices);
+    d->indices = indices;
+    d->mask = size - 1;
+    for (int n = 0; n < d->count; n++) {
+        size_t perturb = d->entries[n].hash;
+        size_t i = perturb & d->mask;
+        while (indices[i] >= 0) {
+            perturb >>= 5;
+            i = (i * 5 + perturb + 1) & d->mask;
+        }
+        indices[i] = n;
+    }
+}
+
+static Dict* create_table(int size, ValueType type) {
+    Dict* d = (Dict*)alloc_object(sizeof(Dict), type);
+    d->refcount = 1;
+    d->count = 0;
+    d->capacity = size > 0 ? size : 1;
+    d->entries = (DictEntry*)alloc_object(d->capacity * sizeof(DictEntry), type);
+    d->indices = NULL;
+    d->hash = 0;
+    dict_resize(d, dict_table_size(size), type);
+    return d;
+}
+
+// Appends an entry for `key`, whose slot dict_probe() found empty. Its value starts as None.
+static DictEntry* table_append(Dict* d, Value key, size_t hash, int* slot, ValueType type) {
+    if ((size_t)(d->count + 1) * 3 > (d->mask + 1) * 2) {
+        dict_resize(d, (d->mask + 1) * 2, type);
+        slot = dict_probe(d, key, hash);
+    }
+    if (d->count == d->capacity) {
+        int capacity = d->capacity < 4 ? 8 : d->capacity * 2;
+        DictEntry* entries = (DictEntry*)pytoc_realloc(d->entries, (size_t)capacity * sizeof(DictEntry), type);
+        if (!entries) {
+            fprintf(stderr, "Error: memory allocation failed\n");
+            exit(1);
+        }
+        d->entries = entries;
+        d->capacity = capacity;
+    }
+
+    DictEntry* e = &d->entries[d->count];
+    e->hash = hash;
+    e->key = retain_value(key);
+    e->value = None;
+    *slot = d->count++;
+    return e;
 }
 
-// Create dict value with size
+// Create an empty dict with room for `size` keys
 Value create_dict(int size) {
     Value v;
     v.type = TYPE_DICT;
-    v.dict_val.count = size;
-    v.dict_val.keys = (Value*)malloc(sizeof(Value) * size);
-    v.dict_val.values = (Value*)malloc(sizeof(Value) * size);
-    return v;
+    v.dict_val = create_table(size, TYPE_DICT);
+    return autorelease_value(v);
 }
 
 Value dict_set(Value* dict, Value key, Value value) {
-    for (int i = 0; i < dict->dict_val.count; i++) {
-        if (dict->dict_val.keys[i].type == TYPE_NONE) {
-            dict->dict_val.keys[i] = key;
-            dict->dict_val.values[i] = value;
-            return None;
-        }
+    Dict* d = dict->dict_val;
+    size_t hash = hash_value(key);
+    int* slot = dict_probe(d, key, hash);
+    if (*slot >= 0) {
+        assign_value(&d->entries[*slot].value, value);
+    } else {
+        table_append(d, key, hash, slot, dict->type)->value = retain_value(value);
     }
-    fprintf(stderr, "Error: Dictionary is full\n");
-    exit(1);
+    return None;
 }
 
+// Returns the value stored under `key`, or NULL if the dict has no such key.
+Value* dict_lookup(Value dict, Value key) {
+    int* slot = dict_probe(dict.dict_val, key, hash_value(key));
+    return *slot >= 0 ? &dict.dict_val->entries[*slot].value : NULL;
+}
 
-// Create set value with size
+// Create an empty set with room for `size` items
 Value create_set(int size) {
     Value v;
     v.type = TYPE_SET;
-    v.set_val.count = size;
-    v.set_val.items = (Value*)malloc(sizeof(Value) * size);
-    return v;
+    v.set_val = create_table(size, TYPE_SET);
+    return autorelease_value(v);
 }
 
-// Create frozen set value with size
+// Create an empty frozen set with room for `size` items
 Value create_frozenset(int size) {
-    Value v;
+    Value v = create_set(size);  // reuse set_val for frozenset
     v.type = TYPE_FROZENSET;
-    v.set_val.count = size;  // reuse set_val for frozenset
-    v.set_val.items = (Value*)malloc(sizeof(Value) * size);
     return v;
 }
 
+// Adds `item` unless an equal item is present. Also used to build frozensets.
+Value set_insert(Value* set, Value item) {
+    Set* s = set->set_val;
+    size_t hash = hash_value(item);
+    int* slot = dict_probe(s, item, hash);
+    if (*slot < 0) {
+        table_append(s, item, hash, slot, set->type);
+    }
+    return None;
+}
+
+int set_contains(Value set, Value item) {
+    return *dict_probe(set.set_val, item, hash_value(item)) >= 0;
+}
+
 // Create None value (singleton)
 Value create_none() {
     Value v;
@@ -97,112 +382,197 @@ Value create_none() {
     return v;
 }
 
-Value create_string(const char* str) {
+static char* init_string(StringHeader* header, size_t len) {
+    if (!header) {
+        fprintf(stderr, "create_string: memory allocation failed\n");
+        exit(1);
+    }
+    header->flags = 0;
+    header->refcount = 1;
+    header->len = len;
+    header->hash = 0;
+    header->capacity = len;
+    char* s = (char*)(header + 1);
+    s[len] = '\0';
+    return s;
+}
+
+// Allocates room for a heap string of `len` chars plus its header and terminator.
+// The parentheses keep the name from expanding to string_alloc_traced() in traced builds.
+char* (string_alloc)(size_t len) {
+    return init_string((StringHeader*)pytoc_malloc(sizeof(StringHeader) + len + 1, TYPE_STRING), len);
+}
+
+#ifdef PYTOC_TRACE_ALLOC
+char* string_alloc_traced(size_t len, const char* where, const char* func) {
+    return init_string((StringHeader*)trace_malloc(sizeof(StringHeader) + len + 1, TYPE_STRING, where, func), len);
+}
+#endif
+
+void string_free(char* s) {
+    if (s && !STRING_IS_IMMORTAL(s)) {
+        pytoc_free(STRING_HEADER(s));
+    }
+}
+
+// Wraps a buffer from string_alloc() in a Value without copying it.
+Value adopt_string(char* s) {
     Value v;
     v.type = TYPE_STRING;
+    v.string_val = s;
+    return autorelease_value(v);
+}
+
+Value create_string(const char* str) {
     if (!str) str = "";
-    v.string_val = strdup(str);
-    if (!v.string_val) {
-        fprintf(stderr, "create_string: memory allocation failed\n");
-        exit(1);
+    return create_string_len(str, strlen(str));
+}
+
+Value create_string_len(const char* str, size_t len) {
+    char* s = string_alloc(len);
+    memcpy(s, str, len);
+    return adopt_string(s);
+}
+
+// One immortal string per byte, so indexing and iterating strings never allocates.
+Value char_string(unsigned char c) {
+    static struct { StringHeader header; char chars[2]; } table[256];
+    if (!table[c].header.flags) {
+        table[c].header.flags = STRING_IMMORTAL;
+        table[c].header.len = 1;
+        table[c].chars[0] = (char)c;
     }
+    Value v;
+    v.type = TYPE_STRING;
+    v.string_val = table[c].chars;
     return v;
 }
 
-// Declare None singleton variable to be defined in C file
-extern Value None;
+// None singleton, shared by every translation unit
+Value None = { .type = TYPE_NONE };
 
 // Print value recursively
 void print_value(Value v) {
     switch (v.type) {
         case TYPE_NONE:
-            printf("None");
+            out_write("None", 4);
             break;
         case TYPE_INT:
-            printf("%d", v.int_val);
+            out_int(v.int_val);
+            break;
+        case TYPE_FLOAT:
+            out_float(v.float_val);
+            break;
+        case TYPE_BOOL:
+            if (v.bool_val) out_write("True", 4); else out_write("False", 5);
             break;
-		case TYPE_FLOAT:
-		    printf("%g", v.float_val);
-		    break;
-		case TYPE_BOOL:
-		    printf("%s", v.bool_val ? "True" : "False");
-		    break;
         case TYPE_TUPLE:
-            printf("(");
-            for (int i = 0; i < v.tuple_val.count; i++) {
-                print_value(v.tuple_val.items[i]);
-                if (i < v.tuple_val.count - 1) printf(", ");
+            out_write("(", 1);
+            for (int i = 0; i < v.tuple_val->count; i++) {
+                print_value(v.tuple_val->items[i]);
+                if (i < v.tuple_val->count - 1) out_write(", ", 2);
             }
-            printf(")");
+            out_write(")", 1);
             break;
         case TYPE_LIST:
-            printf("[");
-            for (int i = 0; i < v.list_val.count; i++) {
-                print_value(v.list_val.items[i]);
-                if (i < v.list_val.count - 1) printf(", ");
+            out_write("[", 1);
+            for (int i = 0; i < v.list_val->count; i++) {
+                print_value(v.list_val->items[i]);
+                if (i < v.list_val->count - 1) out_write(", ", 2);
             }
-            printf("]");
+            out_write("]", 1);
             break;
         case TYPE_DICT:
-            printf("{");
-            for (int i = 0; i < v.dict_val.count; i++) {
-                print_value(v.dict_val.keys[i]);
-                printf(": ");
-                print_value(v.dict_val.values[i]);
-                if (i < v.dict_val.count - 1) printf(", ");
+            out_write("{", 1);
+            for (int i = 0; i < v.dict_val->count; i++) {
+                print_value(v.dict_val->entries[i].key);
+                out_write(": ", 2);
+                print_value(v.dict_val->entries[i].value);
+                if (i < v.dict_val->count - 1) out_write(", ", 2);
             }
-            printf("}");
+            out_write("}", 1);
             break;
         case TYPE_SET:
         case TYPE_FROZENSET:
-            printf("{");
-            for (int i = 0; i < v.set_val.count; i++) {
-                print_value(v.set_val.items[i]);
-                if (i < v.set_val.count - 1) printf(", ");
+            if (v.set_val->count == 0) {
+                if (v.type == TYPE_SET) out_write("set()", 5); else out_write("frozenset()", 11);
+                break;
+            }
+            if (v.type == TYPE_FROZENSET) out_write("frozenset(", 10);
+            out_write("{", 1);
+            for (int i = 0; i < v.set_val->count; i++) {
+                print_value(v.set_val->entries[i].key);
+                if (i < v.set_val->count - 1) out_write(", ", 2);
             }
-            printf("}");
+            out_write("}", 1);
+            if (v.type == TYPE_FROZENSET) out_write(")", 1);
             break;
         case TYPE_STRING:
-            printf("%s", v.string_val);
+            out_write(v.string_val, STRING_LEN(v.string_val));
+            break;
+        case TYPE_EXCEPTION:
+            if (!is_none(v.exc_val->message)) print_value(v.exc_val->message);
+            break;
+        case TYPE_FILE:
+            out_write("<_io.TextIOWrapper name='", 25);
+            print_value(v.file_val->name);
+            out_write("'>", 2);
             break;
+        case TYPE_ITERATOR: {
+            static const char* const names[] = { "iterator", "reversed", "enumerate", "zip", "map" };
+            const char* name = v.iter_val ? names[v.iter_val->kind] : "iterator";
+            out_write("<", 1);
+            out_write(name, strlen(name));
+            out_write(" object>", 8);
+            break;
+        }
         default:
-            printf("<unknown>");
+            out_write("<unknown>", 9);
             break;
     }
 }
 
-// Free memory recursively (for allocated items)
+// Frees a payload whose reference count dropped to zero, releasing its items.
+// Use release_value() everywhere else.
 void free_value(Value v) {
     switch (v.type) {
         case TYPE_TUPLE:
-            for (int i = 0; i < v.tuple_val.count; i++) {
-                free_value(v.tuple_val.items[i]);
+            for (int i = 0; i < v.tuple_val->count; i++) {
+                release_value(v.tuple_val->items[i]);
             }
-            free(v.tuple_val.items);
+            pytoc_free(v.tuple_val->items);
+            pytoc_free(v.tuple_val);
             break;
         case TYPE_LIST:
-            for (int i = 0; i < v.list_val.count; i++) {
-                free_value(v.list_val.items[i]);
+            for (int i = 0; i < v.list_val->count; i++) {
+                release_value(v.list_val->items[i]);
             }
-            free(v.list_val.items);
+            pytoc_free(v.list_val->items);
+            pytoc_free(v.list_val);
             break;
         case TYPE_DICT:
-            for (int i = 0; i < v.dict_val.count; i++) {
-                free_value(v.dict_val.keys[i]);
-                free_value(v.dict_val.values[i]);
-            }
-            free(v.dict_val.keys);
-            free(v.dict_val.values);
-            break;
         case TYPE_SET:
         case TYPE_FROZENSET:
-            for (int i = 0; i < v.set_val.count; i++) {
-                free_value(v.set_val.items[i]);
+            for (int i = 0; i < v.dict_val->count; i++) {
+                release_value(v.dict_val->entries[i].key);
+                release_value(v.dict_val->entries[i].value);
             }
-            free(v.set_val.items);
+            pytoc_free(v.dict_val->entries);
+            pytoc_free(v.dict_val->indices);
+            pytoc_free(v.dict_val);
             break;
         case TYPE_STRING:
-            free(v.string_val);
+            string_free(v.string_val);
+            break;
+        case TYPE_EXCEPTION:
+            release_value(v.exc_val->message);
+            pytoc_free(v.exc_val);
+            break;
+        case TYPE_FILE:
+            file_free(v.file_val);
+            break;
+        case TYPE_ITERATOR:
+            if (v.iter_val) iterator_free(v.iter_val);
             break;
         default:
             // Nothing to free for INT, NONE etc.
@@ -210,99 +580,116 @@ void free_value(Value v) {
     }
 }
 
+// Points at the reference count of a heap payload, or NULL for immediates and immortals.
+static int* refcount_of(Value v) {
+    switch (v.type) {
+        case TYPE_STRING:
+            if (!v.string_val || STRING_IS_IMMORTAL(v.string_val)) return NULL;
+            return &STRING_HEADER(v.string_val)->refcount;
+        case TYPE_TUPLE:
+            return &v.tuple_val->refcount;
+        case TYPE_LIST:
+            return &v.list_val->refcount;
+        case TYPE_DICT:
+            return &v.dict_val->refcount;
+        case TYPE_SET:
+        case TYPE_FROZENSET:
+            return &v.set_val->refcount;
+        case TYPE_EXCEPTION:
+            return &v.exc_val->refcount;
+        case TYPE_FILE:
+            return &v.file_val->refcount;
+        case TYPE_ITERATOR:
+            return v.iter_val ? &v.iter_val->refcount : NULL;
+        default:
+            return NULL;
+    }
+}
+
+Value retain_value(Value v) {
+    int* refcount = refcount_of(v);
+    if (refcount) (*refcount)++;
+    return v;
+}
+
+void release_value(Value v) {
+    int* refcount = refcount_of(v);
+    if (refcount && --(*refcount) == 0) {
+        free_value(v);
+    }
+}
+
+// Stores `v` in a variable or container slot, releasing the previous value.
+void assign_value(Value* slot, Value v) {
+    retain_value(v);  // before the release, in case the slot already holds v
+    release_value(*slot);
+    *slot = v;
+}
+
 char* str_concat(const char* a, const char* b) {
     size_t len_a = strlen(a);
     size_t len_b = strlen(b);
-    char* result = malloc(len_a + len_b + 1);
+    char* result = (char*)pytoc_malloc(len_a + len_b + 1, TYPE_STRING);
     strcpy(result, a);
     strcat(result, b);
     return result;
 }
 
 
+// Deep copy; immutable immediates and immortal strings are shared.
 Value copy_value(Value v) {
     Value copy;
 
     switch (v.type) {
         case TYPE_NONE:
-            copy.type = TYPE_NONE;
-            break;
-
         case TYPE_INT:
-            copy.type = TYPE_INT;
-            copy.int_val = v.int_val;
-            break;
+        case TYPE_FLOAT:
+        case TYPE_BOOL:
+        case TYPE_EXCEPTION:
+        case TYPE_FILE:
+        case TYPE_ITERATOR:
+            return v;
 
         case TYPE_STRING:
-            copy.type = TYPE_STRING;
-            copy.string_val = strdup(v.string_val ? v.string_val : "");
-            if (!copy.string_val) {
-                fprintf(stderr, "copy_value: memory allocation failed\n");
-                exit(1);
+            // Immortal strings are shared instead of copied.
+            if (v.string_val && STRING_IS_IMMORTAL(v.string_val)) {
+                return v;
             }
-            break;
+            return create_string_len(v.string_val, STRING_LEN(v.string_val));
 
         case TYPE_TUPLE:
-            copy.type = TYPE_TUPLE;
-            copy.tuple_val.count = v.tuple_val.count;
-            copy.tuple_val.items = malloc(sizeof(Value) * copy.tuple_val.count);
-            if (!copy.tuple_val.items) {
-                fprintf(stderr, "copy_value: memory allocation failed\n");
-                exit(1);
+            copy = create_tuple(v.tuple_val->count);
+            for (int i = 0; i < v.tuple_val->count; i++) {
+                copy.tuple_val->items[i] = retain_value(copy_value(v.tuple_val->items[i]));
             }
-            for (int i = 0; i < copy.tuple_val.count; i++) {
-                copy.tuple_val.items[i] = copy_value(v.tuple_val.items[i]);
-            }
-            break;
+            return copy;
 
         case TYPE_LIST:
-            copy.type = TYPE_LIST;
-            copy.list_val.count = v.list_val.count;
-            copy.list_val.items = malloc(sizeof(Value) * copy.list_val.count);
-            if (!copy.list_val.items) {
-                fprintf(stderr, "copy_value: memory allocation failed\n");
-                exit(1);
-            }
-            for (int i = 0; i < copy.list_val.count; i++) {
-                copy.list_val.items[i] = copy_value(v.list_val.items[i]);
+            copy = create_list(v.list_val->count);
+            for (int i = 0; i < v.list_val->count; i++) {
+                copy.list_val->items[i] = retain_value(copy_value(v.list_val->items[i]));
             }
-            break;
+            return copy;
 
         case TYPE_DICT:
-            copy.type = TYPE_DICT;
-            copy.dict_val.count = v.dict_val.count;
-            copy.dict_val.keys = malloc(sizeof(Value) * copy.dict_val.count);
-            copy.dict_val.values = malloc(sizeof(Value) * copy.dict_val.count);
-            if (!copy.dict_val.keys || !copy.dict_val.values) {
-                fprintf(stderr, "copy_value: memory allocation failed\n");
-                exit(1);
-            }
-            for (int i = 0; i < copy.dict_val.count; i++) {
-                copy.dict_val.keys[i] = copy_value(v.dict_val.keys[i]);
-                copy.dict_val.values[i] = copy_value(v.dict_val.values[i]);
+            copy = create_dict(v.dict_val->count);
+            for (int i = 0; i < v.dict_val->count; i++) {
+                dict_set(&copy, copy_value(v.dict_val->entries[i].key), copy_value(v.dict_val->entries[i].value));
             }
-            break;
+            return copy;
 
         case TYPE_SET:
         case TYPE_FROZENSET:
-            copy.type = v.type; // same type (set or frozenset)
-            copy.set_val.count = v.set_val.count;
-            copy.set_val.items = malloc(sizeof(Value) * copy.set_val.count);
-            if (!copy.set_val.items) {
-                fprintf(stderr, "copy_value: memory allocation failed\n");
-                exit(1);
-            }
-            for (int i = 0; i < copy.set_val.count; i++) {
-                copy.set_val.items[i] = copy_value(v.set_val.items[i]);
+            copy = v.type == TYPE_SET ? create_set(v.set_val->count) : create_frozenset(v.set_val->count);
+            for (int i = 0; i < v.set_val->count; i++) {
+                set_insert(&copy, copy_value(v.set_val->entries[i].key));
             }
-            break;
+            return copy;
 
         default:
             fprintf(stderr, "copy_value: unsupported type %d\n", v.type);
             exit(1);
     }
-
-    return copy;
 }
 
 
@@ -0,0 +1,198 @@
+#ifndef ALLOC_C
+#define ALLOC_C
+
+#include "../headers/alloc.h"
+
+#ifdef PYTOC_TRACE_ALLOC
+
+#include "../headers/_global.h"
+#include "../headers/runtime.h"
+#include "../headers/io.h"
+
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+
+typedef struct AllocCounts {
+    long long allocs;
+    long long frees;
+    long long bytes;    // total ever allocated
+    long long live;     // allocated and not yet freed
+    long long peak;     // high-water mark of `live`
+} AllocCounts;
+
+typedef struct AllocSite {
+    const char* where;  // "file:line"
+    const char* func;
+    AllocCounts counts;
+} AllocSite;
+
+// Prepended to every traced block so a free knows what it is releasing. The
+// union keeps the block that follows aligned like malloc's.
+typedef union AllocHeader {
+    struct {
+        size_t size;
+        AllocSite* site;
+        int type;
+    } info;
+    long double align;
+} AllocHeader;
+
+static AllocCounts alloc_total;
+static AllocCounts alloc_by_type[TYPE_ITERATOR + 1];
+
+// Open-addressing table of call sites keyed by their `where` literal.
+static AllocSite** alloc_sites = NULL;
+static size_t alloc_sites_mask = 0;
+static size_t alloc_sites_count = 0;
+
+static AllocSite** site_slot(AllocSite** table, size_t mask, const char* where) {
+    size_t i = ((size_t)where >> 3) & mask;
+    while (table[i] && table[i]->where != where) i = (i + 1) & mask;
+    return &table[i];
+}
+
+static AllocSite* find_site(const char* where, const char* func) {
+    if ((alloc_sites_count + 1) * 3 > (alloc_sites_mask + 1) * 2) {
+        size_t mask = alloc_sites_mask ? alloc_sites_mask * 2 + 1 : 63;
+        AllocSite** table = (AllocSite**)calloc(mask + 1, sizeof(AllocSite*));
+        if (!table) {
+            fprintf(stderr, "MemoryError: allocation trace\n");
+            exit(1);
+        }
+        for (size_t i = 0; alloc_sites && i <= alloc_sites_mask; i++) {
+            if (alloc_sites[i]) {
+                *site_slot(table, mask, alloc_sites[i]->where) = alloc_sites[i];
+            }
+        }
+        free(alloc_sites);
+        if (!alloc_sites) atexit(trace_report);
+        alloc_sites = table;
+        alloc_sites_mask = mask;
+    }
+    AllocSite** slot = site_slot(alloc_sites, alloc_sites_mask, where);
+    if (!*slot) {
+        AllocSite* site = (AllocSite*)calloc(1, sizeof(AllocSite));
+        if (!site) {
+            fprintf(stderr, "MemoryError: allocation trace\n");
+            exit(1);
+        }
+        site->where = where;
+        site->func = func;
+        *slot = site;
+        alloc_sites_count++;
+    }
+    return *slot;
+}
+
+static void count_alloc(AllocCounts* counts, size_t size) {
+    counts->allocs++;
+    counts->bytes += (long long)size;
+    counts->live += (long long)size;
+    if (counts->live > counts->peak) counts->peak = counts->live;
+}
+
+static void count_free(AllocCounts* counts, size_t size) {
+    counts->frees++;
+    counts->live -= (long long)size;
+}
+
+static void* track(AllocHeader* header, size_t size, int type, const char* where, const char* func) {
+    if (!header) return NULL;
+    if (type < 0 || type > TYPE_ITERATOR) type = TYPE_NONE;
+    header->info.size = size;
+    header->info.site = find_site(where, func);
+    header->info.type = type;
+    count_alloc(&alloc_total, size);
+    count_alloc(&alloc_by_type[type], size);
+    count_alloc(&header->info.site->counts, size);
+    return header + 1;
+}
+
+static void untrack(AllocHeader* header) {
+    size_t size = header->info.size;
+    count_free(&alloc_total, size);
+    count_free(&alloc_by_type[header->info.type], size);
+    count_free(&header->info.site->counts, size);
+}
+
+void* trace_malloc(size_t size, int type, const char* where, const char* func) {
+    return track((AllocHeader*)malloc(sizeof(AllocHeader) + size), size, type, where, func);
+}
+
+void* trace_calloc(size_t count, size_t size, int type, const char* where, const char* func) {
+    if (size && count > ((size_t)-1 - sizeof(AllocHeader)) / size) return NULL;
+    return track((AllocHeader*)calloc(1, sizeof(AllocHeader) + count * size), count * size, type, where, func);
+}
+
+// Counted as freeing the old block and allocating the new one, since that is
+// what it may cost.
+void* trace_realloc(void* block, size_t size, int type, const char* where, const char* func) {
+    if (!block) return trace_malloc(size, type, where, func);
+    AllocHeader old = *((AllocHeader*)block - 1);
+    AllocHeader* header = (AllocHeader*)realloc((AllocHeader*)block - 1, sizeof(AllocHeader) + size);
+    if (!header) return NULL;
+    untrack(&old);
+    return track(header, size, type, where, func);
+}
+
+void trace_free(void* block) {
+    if (!block) return;
+    AllocHeader* header = (AllocHeader*)block - 1;
+    untrack(header);
+    free(header);
+}
+
+static int compare_sites(const void* a, const void* b) {
+    const AllocSite* x = *(const AllocSite* const*)a;
+    const AllocSite* y = *(const AllocSite* const*)b;
+    if (x->counts.bytes != y->counts.bytes) return x->counts.bytes < y->counts.bytes ? 1 : -1;
+    return strcmp(x->where, y->where);
+}
+
+static const char* base_name(const char* path) {
+    const char* name = path;
+    for (const char* p = path; *p; p++) {
+        if (*p == '/' || *p == '\\') name = p + 1;
+    }
+    return name;
+}
+
+static void print_counts(const char* label, const AllocCounts* c) {
+    fprintf(stderr, "%-16s %10lld %10lld %14lld %12lld %12lld\n", label, c->allocs, c->frees, c->bytes, c->live, c->peak);
+}
+
+void trace_report(void) {
+    out_flush();
+    fprintf(stderr, "\npytoc allocations: %lld allocs (%lld bytes), %lld frees, %lld bytes live at exit, "
+                    "peak %lld bytes\n\n",
+            alloc_total.allocs, alloc_total.bytes, alloc_total.frees, alloc_total.live, alloc_total.peak);
+
+    fprintf(stderr, "%-16s %10s %10s %14s %12s %12s\n", "type", "allocs", "frees", "bytes", "live", "peak");
+    for (int t = 0; t <= TYPE_ITERATOR; t++) {
+        if (alloc_by_type[t].allocs) {
+            print_counts(t == TYPE_NONE ? "(runtime)" : type_name((ValueType)t), &alloc_by_type[t]);
+        }
+    }
+
+    AllocSite** sites = (AllocSite**)malloc((alloc_sites_count ? alloc_sites_count : 1) * sizeof(AllocSite*));
+    if (!sites) return;
+    size_t n = 0;
+    for (size_t i = 0; alloc_sites && i <= alloc_sites_mask; i++) {
+        if (alloc_sites[i]) sites[n++] = alloc_sites[i];
+    }
+    qsort(sites, n, sizeof(AllocSite*), compare_sites);
+
+    fprintf(stderr, "\n%10s %10s %14s %12s %12s  %s\n", "allocs", "frees", "bytes", "live", "peak", "site");
+    for (size_t i = 0; i < n; i++) {
+        const AllocCounts* c = &sites[i]->counts;
+        fprintf(stderr, "%10lld %10lld %14lld %12lld %12lld  %s (%s)\n", c->allocs, c->frees, c->bytes, c->live, c->peak,
+                sites[i]->func, base_name(sites[i]->where));
+    }
+    fflush(stderr);
+    free(sites);
+}
+
+#endif // PYTOC_TRACE_ALLOC
+
+#endif // ALLOC_C
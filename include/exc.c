@@ -2,65 +2,86 @@
 #define EXC_C
 
 #include "../headers/exc.h"
-#include "runtime.c"
-#include "_global.c"
-#include "try-catch.c"
+#include "../headers/io.h"
+#include "../headers/runtime.h"
 
-void init_exc() {
-    ValueError = create_string("ValueError");
-    TypeError = create_string("TypeError");
-    ZeroDivisionError = create_string("ZeroDivisionError");
-}
-
-// These macros ensure we don't overflow the buffer
-#define SAFE_SNPRINTF(buf, fmt, ...) \
-    snprintf((buf), sizeof((ctx)->stderr_buf), (fmt), __VA_ARGS__)
-
-// For subprocess-based try-catch: exit after writing to stderr_buf
-void raise_exception(TryCatchContext* ctx, const char* name, const char* message) {
-    ctx->triggered = 1;
-    SAFE_SNPRINTF(ctx->stderr_buf, "%s: %s", name, message);
-    fflush(stderr); // in case stderr is redirected
-    exit(1);        // Terminate child or subprocess cleanly
-}
+#include <stdarg.h>
+#include <stdio.h>
+#include <stdlib.h>
 
-void raise_exception_with_value(TryCatchContext* ctx, const char* name, const char* message, Value value) {
-    ctx->triggered = 1;
-    SAFE_SNPRINTF(ctx->stderr_buf, "%s: %s (value: %s)", name, message, to_string(value));
-    fflush(stderr);
-    exit(1);
-}
+const ExceptionType Exc_BaseException = { "BaseException", NULL };
+const ExceptionType Exc_Exception = { "Exception", &Exc_BaseException };
+const ExceptionType Exc_ArithmeticError = { "ArithmeticError", &Exc_Exception };
+const ExceptionType Exc_ZeroDivisionError = { "ZeroDivisionError", &Exc_ArithmeticError };
+const ExceptionType Exc_OverflowError = { "OverflowError", &Exc_ArithmeticError };
+const ExceptionType Exc_AssertionError = { "AssertionError", &Exc_Exception };
+const ExceptionType Exc_AttributeError = { "AttributeError", &Exc_Exception };
+const ExceptionType Exc_LookupError = { "LookupError", &Exc_Exception };
+const ExceptionType Exc_IndexError = { "IndexError", &Exc_LookupError };
+const ExceptionType Exc_KeyError = { "KeyError", &Exc_LookupError };
+const ExceptionType Exc_NameError = { "NameError", &Exc_Exception };
+const ExceptionType Exc_RuntimeError = { "RuntimeError", &Exc_Exception };
+const ExceptionType Exc_NotImplementedError = { "NotImplementedError", &Exc_RuntimeError };
+const ExceptionType Exc_TypeError = { "TypeError", &Exc_Exception };
+const ExceptionType Exc_ValueError = { "ValueError", &Exc_Exception };
+const ExceptionType Exc_OSError = { "OSError", &Exc_Exception };
+const ExceptionType Exc_FileNotFoundError = { "FileNotFoundError", &Exc_OSError };
+const ExceptionType Exc_IsADirectoryError = { "IsADirectoryError", &Exc_OSError };
+const ExceptionType Exc_EOFError = { "EOFError", &Exc_Exception };
+const ExceptionType Exc_MemoryError = { "MemoryError", &Exc_Exception };
+const ExceptionType Exc_StopIteration = { "StopIteration", &Exc_Exception };
 
-void raise_exception_with_context(TryCatchContext* ctx, const char* name, const char* message, TryCatchContext* context) {
-    ctx->triggered = 1;
-    SAFE_SNPRINTF(ctx->stderr_buf, "%s: %s", name, message);
-    fflush(stderr);
-    exit(1);
-}
-
-void raise_exception_full(TryCatchContext* ctx, const char* name, const char* message, Value value, TryCatchContext* context, const char* extra) {
-    ctx->triggered = 1;
-    SAFE_SNPRINTF(ctx->stderr_buf, "%s: %s | Extra: %s | Value: %s", name, message, extra, to_string(value));
-    fflush(stderr);
-    exit(1);
+Value create_exception(const ExceptionType* type, Value message) {
+    Exception* exc = (Exception*)pytoc_malloc(sizeof(Exception), TYPE_EXCEPTION);
+    if (!exc) {
+        fprintf(stderr, "MemoryError\n");
+        exit(1);
+    }
+    exc->refcount = 1;
+    exc->type = type;
+    exc->message = retain_value(message);
+    Value v;
+    v.type = TYPE_EXCEPTION;
+    v.exc_val = exc;
+    return autorelease_value(v);
 }
 
-void print_exception(TryCatchContext* ctx) {
-    if (ctx->triggered && ctx->stderr_buf[0] != '\0') {
-        fprintf(stderr, "%s\n", ctx->stderr_buf);
+// True if `exc` is an instance of `type` or of one of its subclasses.
+int exception_matches(Value exc, const ExceptionType* type) {
+    for (const ExceptionType* t = exc.exc_val->type; t; t = t->base) {
+        if (t == type) return 1;
     }
+    return 0;
 }
 
-void clear_exception(TryCatchContext* ctx) {
-    memset(ctx->stderr_buf, 0, sizeof(ctx->stderr_buf));
-    ctx->triggered = 0;
+void raise_exception(Value exc) {
+    if (exc.type != TYPE_EXCEPTION) {
+        raise_error(&Exc_TypeError, "exceptions must derive from BaseException");
+    }
+    TryFrame* frame = try_top;
+    if (!frame) {
+        out_flush();
+        Value message = exc.exc_val->message;
+        const char* text = is_none(message) ? "" : to_string(message).string_val;
+        if (text[0]) {
+            fprintf(stderr, "%s: %s\n", exc.exc_val->type->name, text);
+        } else {
+            fprintf(stderr, "%s\n", exc.exc_val->type->name);
+        }
+        exit(1);
+    }
+    try_top = frame->prev;
+    frame->exception = retain_value(exc);
+    longjmp(frame->env, 1);
 }
 
-Value make_value_from_exc(TryCatchContext* ctx) {
-    if (ctx->triggered && ctx->stderr_buf[0] != '\0') {
-        return create_string(ctx->stderr_buf);
-    }
-    return create_none();
+void raise_error(const ExceptionType* type, const char* format, ...) {
+    char buffer[512];
+    va_list args;
+    va_start(args, format);
+    vsnprintf(buffer, sizeof(buffer), format, args);
+    va_end(args);
+    raise_exception(create_exception(type, create_string(buffer)));
 }
 
 #endif // EXC_C
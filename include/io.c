@@ -2,91 +2,409 @@
 #define IO_C
 
 #include "../headers/io.h"
-#include "_global.c"
+#include "../headers/runtime.h"
+#include "../headers/exc.h"
 
+#include <errno.h>
+#include <math.h>
 #include <stdlib.h>
 #include <stdio.h>
 #include <string.h>
 
-ssize_t _getline(char **lineptr, size_t *n, FILE *stream) {
-    if (!lineptr || !n || !stream) return -1;
+#ifndef _WIN32
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <unistd.h>
+#endif
 
-    size_t pos = 0;
+// Everything printed goes through one buffer that is written out when full, before
+// input() reads, on print(..., flush=True) and at exit. Unbuffered mode flushes
+// after every print() call instead.
+static char out_buffer[OUTPUT_BUFFER_SIZE];
+static size_t out_len = 0;
+static int out_buffered = 1;
+static int out_registered = 0;
 
-    if (*lineptr == NULL || *n == 0) {
-        *n = 128;
-        *lineptr = malloc(*n);
-        if (!*lineptr) return -1;
+void out_flush(void) {
+    if (out_len) {
+        fwrite(out_buffer, 1, out_len, stdout);
+        out_len = 0;
     }
+    fflush(stdout);
+}
 
-    int c = fgetc(stream);
-    if (c == EOF) return -1;
+void set_output_buffering(int enabled) {
+    out_buffered = enabled;
+}
 
-    do {
-        if (pos + 1 >= *n) {
-            size_t new_size = *n * 2;
-            char *new_ptr = realloc(*lineptr, new_size);
-            if (!new_ptr) return -1;
-            *lineptr = new_ptr;
-            *n = new_size;
+void out_write(const char* s, size_t n) {
+    if (!out_registered) {
+        atexit(out_flush);
+        out_registered = 1;
+    }
+    if (n > OUTPUT_BUFFER_SIZE - out_len) {
+        out_flush();
+        if (n >= OUTPUT_BUFFER_SIZE) {
+            fwrite(s, 1, n, stdout);
+            return;
         }
+    }
+    memcpy(out_buffer + out_len, s, n);
+    out_len += n;
+}
 
-        (*lineptr)[pos++] = c;
-        if (c == '\n') break;
-    } while ((c = fgetc(stream)) != EOF);
+void out_int(long long v) {
+    char digits[24];
+    char* p = digits + sizeof(digits);
+    // Negate in unsigned arithmetic so LLONG_MIN does not overflow.
+    unsigned long long u = v < 0 ? 0ULL - (unsigned long long)v : (unsigned long long)v;
+    do {
+        *--p = (char)('0' + u % 10);
+        u /= 10;
+    } while (u);
+    if (v < 0) *--p = '-';
+    out_write(p, (size_t)(digits + sizeof(digits) - p));
+}
 
-    (*lineptr)[pos] = '\0';
-    return pos;
+// Formats exactly like printf("%g"). Values in %g's fixed-point range are rounded
+// to six significant digits by hand; exponents, non-finite values and
+// rounding ties too close to call in double arithmetic go through snprintf.
+void out_float(double v) {
+    static const double powers[] = { 1e-4, 1e-3, 1e-2, 1e-1, 1e0, 1e1, 1e2, 1e3, 1e4, 1e5 };
+    static const double scales[] = { 1e0, 1e1, 1e2, 1e3, 1e4, 1e5, 1e6, 1e7, 1e8, 1e9 };
+    double a = fabs(v);
+    if (isfinite(v) && a >= 1e-4 && a < 1e6) {
+        int exponent = 5;
+        while (exponent > -4 && a < powers[exponent + 4]) exponent--;
+        double scaled = a * scales[5 - exponent];
+        double whole = floor(scaled);
+        double frac = scaled - whole;
+        long long n = (long long)whole + (frac > 0.5);
+        if (n == 1000000 && exponent < 5) {
+            n = 100000;
+            exponent++;
+        }
+        if (fabs(frac - 0.5) > 1e-7 && n >= 100000 && n < 1000000) {
+            char text[16];
+            char digits[6];
+            size_t len = 0;
+            for (int i = 5; i >= 0; i--) {
+                digits[i] = (char)('0' + n % 10);
+                n /= 10;
+            }
+            int last = 5;
+            while (last > 0 && last > exponent && digits[last] == '0') last--;
+            if (v < 0) text[len++] = '-';
+            if (exponent >= 0) {
+                for (int i = 0; i <= exponent; i++) text[len++] = digits[i];
+                if (last > exponent) {
+                    text[len++] = '.';
+                    for (int i = exponent + 1; i <= last; i++) text[len++] = digits[i];
+                }
+            } else {
+                text[len++] = '0';
+                text[len++] = '.';
+                for (int i = -1; i > exponent; i--) text[len++] = '0';
+                for (int i = 0; i <= last; i++) text[len++] = digits[i];
+            }
+            out_write(text, len);
+            return;
+        }
+    }
+    char text[32];
+    int len = snprintf(text, sizeof(text), "%g", v);
+    out_write(text, (size_t)len);
 }
 
-Value print(Value v, Value sep_val, Value end_val) {
+Value print(Value v, Value sep_val, Value end_val, Value flush_val) {
     const char* sep = " ";
     const char* end = "\n";
+    size_t sep_len = 1;
+    size_t end_len = 1;
 
     if (sep_val.type == TYPE_STRING && sep_val.string_val != NULL) {
         sep = sep_val.string_val;
+        sep_len = STRING_LEN(sep);
     }
 
     if (end_val.type == TYPE_STRING && end_val.string_val != NULL) {
         end = end_val.string_val;
+        end_len = STRING_LEN(end);
     }
 
     // Assume v is always a LIST
-    for (int i = 0; i < v.list_val.count; ++i) {
-        print_value(v.list_val.items[i]);
-        if (i < v.list_val.count - 1) {
-            printf("%s", sep);
+    for (int i = 0; i < v.list_val->count; ++i) {
+        print_value(v.list_val->items[i]);
+        if (i < v.list_val->count - 1) {
+            out_write(sep, sep_len);
         }
     }
 
-    printf("%s", end);
-    fflush(stdout);
+    out_write(end, end_len);
+    if (!out_buffered || is_true(flush_val)) {
+        out_flush();
+    }
     return None;
 }
 
-Value input(Value prompt_val) {
-    if (prompt_val.type == TYPE_STRING && prompt_val.string_val != NULL) {
-        print_value(prompt_val);
-        fflush(stdout);
+static File* file_val_of(Value v, const char* method) {
+    if (v.type != TYPE_FILE) {
+        raise_error(&Exc_AttributeError, "'%s' object has no attribute '%s'", type_name(v.type), method);
     }
+    if (v.file_val->closed) {
+        raise_error(&Exc_ValueError, "I/O operation on closed file.");
+    }
+    return v.file_val;
+}
+
+static Value create_file(FILE* stream, Value name) {
+    File* file = (File*)pytoc_malloc(sizeof(File), TYPE_FILE);
+    if (!file) {
+        fprintf(stderr, "MemoryError\n");
+        exit(1);
+    }
+    file->refcount = 1;
+    file->stream = stream;
+    file->data = NULL;
+    file->size = 0;
+    file->pos = 0;
+    file->capacity = 0;
+    file->mapped = 0;
+    file->closed = 0;
+    file->eof = 0;
+    file->name = retain_value(name);
+    Value v;
+    v.type = TYPE_FILE;
+    v.file_val = file;
+    return v;
+}
 
-    char* buffer = NULL;
-    size_t size = 0;
+#ifndef _WIN32
+// Maps a regular, non-empty file so lines can be sliced out of it without copying
+// it through a buffer. Pipes, devices and /proc files keep using block reads.
+static void map_file(File* file) {
+    struct stat st;
+    int fd = fileno(file->stream);
+    if (fstat(fd, &st) != 0 || !S_ISREG(st.st_mode) || st.st_size <= 0) return;
+    void* data = mmap(NULL, (size_t)st.st_size, PROT_READ, MAP_PRIVATE, fd, 0);
+    if (data == MAP_FAILED) return;
+#ifdef MADV_SEQUENTIAL
+    madvise(data, (size_t)st.st_size, MADV_SEQUENTIAL);
+#endif
+    fclose(file->stream);
+    file->stream = NULL;
+    file->data = (char*)data;
+    file->size = (size_t)st.st_size;
+    file->mapped = 1;
+    file->eof = 1;
+}
+#endif
 
-    ssize_t len = _getline(&buffer, &size, stdin);
+// The OSError subclass CPython raises for `error`.
+static const ExceptionType* os_error_type(int error) {
+    if (error == ENOENT) return &Exc_FileNotFoundError;
+#ifdef EISDIR
+    if (error == EISDIR) return &Exc_IsADirectoryError;
+#endif
+    return &Exc_OSError;
+}
 
-    if (len == -1 || buffer == NULL) {
-        if (buffer) free(buffer);
-        return create_string("");
+// Reads the next block, keeping the unread tail of the buffer. Returns 0 at end of
+// file and raises OSError if the read fails.
+static size_t file_fill(File* file) {
+    if (file->eof) return 0;
+    if (file->pos > 0) {
+        memmove(file->data, file->data + file->pos, file->size - file->pos);
+        file->size -= file->pos;
+        file->pos = 0;
+    }
+    if (file->capacity - file->size < INPUT_BLOCK_SIZE / 2) {
+        size_t capacity = file->capacity ? file->capacity * 2 : INPUT_BLOCK_SIZE;
+        char* data = (char*)pytoc_realloc(file->data, capacity, TYPE_FILE);
+        if (!data) {
+            fprintf(stderr, "MemoryError\n");
+            exit(1);
+        }
+        file->data = data;
+        file->capacity = capacity;
+    }
+    size_t n;
+#ifdef _WIN32
+    if (file->stream == stdin) {
+        // fread would wait for a whole block; a console delivers one line at a time.
+        n = fgets(file->data + file->size, (int)(file->capacity - file->size), stdin)
+            ? strlen(file->data + file->size) : 0;
+    } else {
+        n = fread(file->data + file->size, 1, file->capacity - file->size, file->stream);
+    }
+    if (n == 0 && ferror(file->stream)) {
+        int error = errno;
+        clearerr(file->stream);
+        raise_error(os_error_type(error), "[Errno %d] %s", error, strerror(error));
+    }
+#else
+    // read() returns whatever is available, so a terminal hands over each line as it is typed.
+    ssize_t r;
+    do {
+        r = read(fileno(file->stream), file->data + file->size, file->capacity - file->size);
+    } while (r < 0 && errno == EINTR);
+    if (r < 0) {
+        int error = errno;
+        raise_error(os_error_type(error), "[Errno %d] %s", error, strerror(error));
     }
+    n = (size_t)r;
+#endif
+    if (n == 0) file->eof = 1;
+    file->size += n;
+    return n;
+}
 
-    if (len > 0 && buffer[len - 1] == '\n') {
-        buffer[len - 1] = '\0';
+// Finds the next line, including its newline. Returns NULL at end of file.
+static const char* next_line(File* file, size_t* len) {
+    size_t scanned = 0;
+    for (;;) {
+        // `data` is still NULL before the first block of an empty file.
+        if (file->size - file->pos > scanned) {
+            const char* start = file->data + file->pos;
+            const char* newline = (const char*)memchr(start + scanned, '\n', file->size - file->pos - scanned);
+            if (newline) {
+                *len = (size_t)(newline - start) + 1;
+                file->pos += *len;
+                return start;
+            }
+        }
+        scanned = file->size - file->pos;
+        if (file_fill(file) == 0) break;
     }
+    *len = file->size - file->pos;
+    if (*len == 0) return NULL;
+    const char* start = file->data + file->pos;
+    file->pos = file->size;
+    return start;
+}
 
-    Value result = create_string(buffer);
-    free(buffer);
-    return result;
+Value open_file(Value path, Value mode) {
+    if (path.type != TYPE_STRING) {
+        raise_error(&Exc_TypeError, "expected str, bytes or os.PathLike object, not %s", type_name(path.type));
+    }
+    if (mode.type != TYPE_STRING || (strcmp(mode.string_val, "r") != 0 && strcmp(mode.string_val, "rt") != 0)) {
+        raise_error(&Exc_NotImplementedError, "only reading files with mode 'r' is supported");
+    }
+    FILE* stream = fopen(path.string_val, "rb");
+    if (!stream) {
+        int error = errno;
+        raise_error(os_error_type(error), "[Errno %d] %s: '%s'", error, strerror(error), path.string_val);
+    }
+#ifndef _WIN32
+    // fopen() accepts a directory on POSIX; reading it would only fail later.
+    struct stat st;
+    if (fstat(fileno(stream), &st) == 0 && S_ISDIR(st.st_mode)) {
+        fclose(stream);
+        raise_error(&Exc_IsADirectoryError, "[Errno %d] %s: '%s'", EISDIR, strerror(EISDIR), path.string_val);
+    }
+#endif
+    Value file = create_file(stream, path);
+#ifndef _WIN32
+    map_file(file.file_val);
+#endif
+    return autorelease_value(file);
+}
+
+Value stdin_file(void) {
+    // One shared reader, so input() and sys.stdin never split a block between them.
+    static Value file;
+    if (file.type != TYPE_FILE) {
+        file = create_file(stdin, create_string("<stdin>"));
+    }
+    return file;
+}
+
+Value file_read(Value v, Value size) {
+    File* file = file_val_of(v, "read");
+    if (!is_none(size) && size.type != TYPE_INT) {
+        raise_error(&Exc_TypeError, "argument should be integer or None, not '%s'", type_name(size.type));
+    }
+    long long wanted = is_none(size) ? -1 : size.int_val;
+    while ((wanted < 0 || (size_t)wanted > file->size - file->pos) && file_fill(file) > 0) {
+    }
+    size_t len = file->size - file->pos;
+    if (wanted >= 0 && (size_t)wanted < len) len = (size_t)wanted;
+    Value text = len ? create_string_len(file->data + file->pos, len) : create_string_len("", 0);
+    file->pos += len;
+    return text;
+}
+
+Value file_readline(Value v) {
+    File* file = file_val_of(v, "readline");
+    size_t len;
+    const char* line = next_line(file, &len);
+    return line ? create_string_len(line, len) : create_string_len("", 0);
+}
+
+Value file_readlines(Value v) {
+    File* file = file_val_of(v, "readlines");
+    Value lines = create_list(0);
+    // The list holds each line; drop the pool's reference right away instead of
+    // queueing one pool entry per line of a possibly huge file.
+    size_t mark = pool_mark();
+    size_t len;
+    const char* line;
+    while ((line = next_line(file, &len)) != NULL) {
+        list_append(lines, create_string_len(line, len));
+        pool_drain(mark);
+    }
+    return lines;
+}
+
+int file_next(Value v, Value* line) {
+    File* file = file_val_of(v, "__next__");
+    size_t len;
+    const char* text = next_line(file, &len);
+    if (!text) return 0;
+    *line = create_string_len(text, len);
+    return 1;
+}
+
+Value file_close(Value v) {
+    if (v.type != TYPE_FILE) {
+        raise_error(&Exc_AttributeError, "'%s' object has no attribute 'close'", type_name(v.type));
+    }
+    File* file = v.file_val;
+    if (file->closed) return None;
+#ifndef _WIN32
+    if (file->mapped) munmap(file->data, file->size);
+#endif
+    if (!file->mapped) pytoc_free(file->data);
+    if (file->stream && file->stream != stdin) fclose(file->stream);
+    file->stream = NULL;
+    file->data = NULL;
+    file->size = file->pos = file->capacity = 0;
+    file->closed = 1;
+    return None;
+}
+
+void file_free(File* file) {
+    Value v;
+    v.type = TYPE_FILE;
+    v.file_val = file;
+    file_close(v);
+    release_value(file->name);
+    pytoc_free(file);
+}
+
+Value input(Value prompt_val) {
+    if (prompt_val.type == TYPE_STRING && prompt_val.string_val != NULL) {
+        print_value(prompt_val);
+    }
+    out_flush();
+
+    size_t len;
+    const char* line = next_line(stdin_file().file_val, &len);
+    if (!line) {
+        raise_error(&Exc_EOFError, "EOF when reading a line");
+    }
+    if (line[len - 1] == '\n') len--;
+    return create_string_len(line, len);
 }
 
 
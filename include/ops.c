@@ -2,9 +2,8 @@
 #define OPS_C
 
 #include "../headers/ops.h"
-#include "runtime.c"
-#include "_global.c"
-#include "exc.c"
+#include "../headers/exc.h"
+#include "../headers/native.h"
 
 #include <stdarg.h>
 #include <string.h>
@@ -13,6 +12,37 @@
 #include <math.h>  // For pow, floor, fmod, fabs
 #include <ctype.h> // For isdigit
 
+// Orders strings bytewise like strcmp, but in one memcmp over the cached lengths.
+static int string_compare(const char* a, const char* b) {
+    size_t len_a = STRING_LEN(a);
+    size_t len_b = STRING_LEN(b);
+    int result = memcmp(a, b, len_a < len_b ? len_a : len_b);
+    if (result != 0) return result;
+    return len_a < len_b ? -1 : len_a > len_b;
+}
+
+static int is_set(Value v) {
+    return v.type == TYPE_SET || v.type == TYPE_FROZENSET;
+}
+
+// New set of `a`'s type holding the items of `a` whose membership in `b` equals
+// `in_b`, plus every item of `b` when `add_b` is set: a - b, a & b and a | b.
+static Value set_combine(Value a, Value b, int in_b, int add_b) {
+    Value result = a.type == TYPE_SET ? create_set(a.set_val->count) : create_frozenset(a.set_val->count);
+    for (int i = 0; i < a.set_val->count; i++) {
+        Value item = a.set_val->entries[i].key;
+        if (add_b || set_contains(b, item) == in_b) {
+            set_insert(&result, item);
+        }
+    }
+    if (add_b) {
+        for (int i = 0; i < b.set_val->count; i++) {
+            set_insert(&result, b.set_val->entries[i].key);
+        }
+    }
+    return result;
+}
+
 Value add_values(Value a, Value b) {
     if (a.type == TYPE_INT && b.type == TYPE_INT) {
         return create_int(a.int_val + b.int_val);
@@ -22,32 +52,74 @@ Value add_values(Value a, Value b) {
         double right = (b.type == TYPE_FLOAT) ? b.float_val : b.int_val;
         return create_float(left + right);
     } else if (a.type == TYPE_STRING && b.type == TYPE_STRING) {
-        return create_string(str_concat(a.string_val, b.string_val));
+        size_t len_a = STRING_LEN(a.string_val);
+        size_t len_b = STRING_LEN(b.string_val);
+        char* result = string_alloc(len_a + len_b);
+        memcpy(result, a.string_val, len_a);
+        memcpy(result + len_a, b.string_val, len_b);
+        return adopt_string(result);
     } else if (a.type == TYPE_LIST && b.type == TYPE_LIST) {
-        Value result = create_list(a.list_val.count + b.list_val.count);
-        for (int i = 0; i < a.list_val.count; i++) {
-            result.list_val.items[i] = copy_value(a.list_val.items[i]);
+        Value result = create_list(a.list_val->count + b.list_val->count);
+        for (int i = 0; i < a.list_val->count; i++) {
+            result.list_val->items[i] = retain_value(a.list_val->items[i]);
         }
-        for (int i = 0; i < b.list_val.count; i++) {
-            result.list_val.items[a.list_val.count + i] = copy_value(b.list_val.items[i]);
+        for (int i = 0; i < b.list_val->count; i++) {
+            result.list_val->items[a.list_val->count + i] = retain_value(b.list_val->items[i]);
         }
         return result;
     } else if (a.type == TYPE_TUPLE && b.type == TYPE_TUPLE) {
-        Value result = create_tuple(a.tuple_val.count + b.tuple_val.count);
-        for (int i = 0; i < a.tuple_val.count; i++) {
-            result.tuple_val.items[i] = copy_value(a.tuple_val.items[i]);
+        Value result = create_tuple(a.tuple_val->count + b.tuple_val->count);
+        for (int i = 0; i < a.tuple_val->count; i++) {
+            result.tuple_val->items[i] = retain_value(a.tuple_val->items[i]);
         }
-        for (int i = 0; i < b.tuple_val.count; i++) {
-            result.tuple_val.items[a.tuple_val.count + i] = copy_value(b.tuple_val.items[i]);
+        for (int i = 0; i < b.tuple_val->count; i++) {
+            result.tuple_val->items[a.tuple_val->count + i] = retain_value(b.tuple_val->items[i]);
         }
         return result;
     } else {
-        fprintf(stderr, "TypeError: unsupported operand type(s) for +: '%s' and '%s'\n",
-                type_name(a.type), type_name(b.type));
-        exit(1);
+        raise_error(&Exc_TypeError, "unsupported operand type(s) for +: '%s' and '%s'", type_name(a.type), type_name(b.type));
     }
 }
 
+// `s += t` on a string nothing else references: append into spare capacity, or
+// move to a buffer twice the needed size, so building a string in a loop is
+// amortized O(1) per append like CPython's in-place concatenation. The old block
+// is released by the assign_value() the result is stored with.
+static Value iadd_string(Value a, Value b) {
+    StringHeader* header = STRING_HEADER(a.string_val);
+    size_t len_a = header->len;
+    size_t len_b = STRING_LEN(b.string_val);
+    size_t len = len_a + len_b;
+    if (len <= header->capacity) {
+        memcpy(a.string_val + len_a, b.string_val, len_b);
+        a.string_val[len] = '\0';
+        header->len = len;
+        header->hash = 0;
+        return a;
+    }
+    char* result = string_alloc(len < 8 ? 16 : len * 2);
+    memcpy(result, a.string_val, len_a);
+    memcpy(result + len_a, b.string_val, len_b);
+    result[len] = '\0';
+    STRING_HEADER(result)->len = len;
+    return adopt_string(result);
+}
+
+// `a += b`: lists are extended in place like Python's list.__iadd__, which also
+// keeps appends in a loop amortized O(1); strings with a single owner grow in
+// place (see iadd_string); everything else falls back to `a + b`.
+Value iadd_values(Value a, Value b) {
+    if (a.type == TYPE_LIST) {
+        list_extend(a, b);
+        return a;
+    }
+    if (a.type == TYPE_STRING && b.type == TYPE_STRING && !STRING_IS_IMMORTAL(a.string_val)
+            && STRING_HEADER(a.string_val)->refcount == 1) {
+        return iadd_string(a, b);
+    }
+    return add_values(a, b);
+}
+
 Value sub_values(Value a, Value b) {
     if (a.type == TYPE_INT && b.type == TYPE_INT) {
         return create_int(a.int_val - b.int_val);
@@ -56,10 +128,10 @@ Value sub_values(Value a, Value b) {
         double left = (a.type == TYPE_FLOAT) ? a.float_val : a.int_val;
         double right = (b.type == TYPE_FLOAT) ? b.float_val : b.int_val;
         return create_float(left - right);
+    } else if (is_set(a) && is_set(b)) {
+        return set_combine(a, b, 0, 0);
     } else {
-        fprintf(stderr, "TypeError: unsupported operand type(s) for -: '%s' and '%s'\n",
-                type_name(a.type), type_name(b.type));
-        exit(1);
+        raise_error(&Exc_TypeError, "unsupported operand type(s) for -: '%s' and '%s'", type_name(a.type), type_name(b.type));
     }
 }
 
@@ -74,30 +146,31 @@ Value mul_values(Value a, Value b) {
     } else if ((a.type == TYPE_STRING && b.type == TYPE_INT) || (a.type == TYPE_INT && b.type == TYPE_STRING)) {
         Value str_val = (a.type == TYPE_STRING) ? a : b;
         Value int_val = (a.type == TYPE_INT) ? a : b;
-        int times = int_val.int_val;
+        long long times = int_val.int_val;
         if (times < 0) times = 0;
-        size_t len = strlen(str_val.string_val);
-        char* buffer = malloc(times * len + 1);
-        if (!buffer) exit(1);
-        buffer[0] = '\0';
-        for (int i = 0; i < times; i++) strcat(buffer, str_val.string_val);
-        Value result = create_string(buffer);
-        free(buffer);
-        return result;
+        size_t len = STRING_LEN(str_val.string_val);
+        size_t total = (size_t)times * len;
+        char* buffer = string_alloc(total);
+        if (total == 0) return adopt_string(buffer);
+        // Copy once, then keep doubling what is already there.
+        memcpy(buffer, str_val.string_val, len);
+        for (size_t filled = len; filled < total; filled *= 2) {
+            memcpy(buffer + filled, buffer, filled < total - filled ? filled : total - filled);
+        }
+        return adopt_string(buffer);
     } else if ((a.type == TYPE_LIST && b.type == TYPE_INT) || (a.type == TYPE_INT && b.type == TYPE_LIST)) {
         Value list_val = (a.type == TYPE_LIST) ? a : b;
-        int times = (a.type == TYPE_INT) ? a.int_val : b.int_val;
+        long long times = (a.type == TYPE_INT) ? a.int_val : b.int_val;
         if (times < 0) times = 0;
-        Value result = create_list(times * list_val.list_val.count);
-        for (int i = 0; i < times; i++) {
-            for (int j = 0; j < list_val.list_val.count; j++) {
-                result.list_val.items[i * list_val.list_val.count + j] = copy_value(list_val.list_val.items[j]);
+        Value result = create_list(times * list_val.list_val->count);
+        for (long long i = 0; i < times; i++) {
+            for (int j = 0; j < list_val.list_val->count; j++) {
+                result.list_val->items[i * list_val.list_val->count + j] = retain_value(list_val.list_val->items[j]);
             }
         }
         return result;
     } else {
-        fprintf(stderr, "TypeError: unsupported operand type(s) for *: '%s' and '%s'\n", type_name(a.type), type_name(b.type));
-        exit(1);
+        raise_error(&Exc_TypeError, "unsupported operand type(s) for *: '%s' and '%s'", type_name(a.type), type_name(b.type));
     }
 }
 
@@ -107,13 +180,11 @@ Value div_values(Value a, Value b) {
         double left = (a.type == TYPE_FLOAT) ? a.float_val : a.int_val;
         double right = (b.type == TYPE_FLOAT) ? b.float_val : b.int_val;
         if (fabs(right) < FLOAT_EPSILON) {
-            fprintf(stderr, "ZeroDivisionError: division by zero\n");
-            exit(1);
+            raise_error(&Exc_ZeroDivisionError, "division by zero");
         }
         return create_float(left / right);
     } else {
-        fprintf(stderr, "TypeError: unsupported operand type(s) for /: '%s' and '%s'\n", type_name(a.type), type_name(b.type));
-        exit(1);
+        raise_error(&Exc_TypeError, "unsupported operand type(s) for /: '%s' and '%s'", type_name(a.type), type_name(b.type));
     }
 }
 
@@ -124,8 +195,7 @@ Value pow_values(Value a, Value b) {
         double exp  = (b.type == TYPE_FLOAT) ? b.float_val : b.int_val;
         return create_float(pow(base, exp));
     } else {
-        fprintf(stderr, "TypeError: unsupported operand type(s) for **: '%s' and '%s'\n", type_name(a.type), type_name(b.type));
-        exit(1);
+        raise_error(&Exc_TypeError, "unsupported operand type(s) for **: '%s' and '%s'", type_name(a.type), type_name(b.type));
     }
 }
 
@@ -135,13 +205,11 @@ Value floordiv_values(Value a, Value b) {
         double left = (a.type == TYPE_FLOAT) ? a.float_val : a.int_val;
         double right = (b.type == TYPE_FLOAT) ? b.float_val : b.int_val;
         if (fabs(right) < FLOAT_EPSILON) {
-            fprintf(stderr, "ZeroDivisionError: floor division by zero\n");
-            exit(1);
+            raise_error(&Exc_ZeroDivisionError, "floor division by zero");
         }
         return create_float(floor(left / right));
     } else {
-        fprintf(stderr, "TypeError: unsupported operand type(s) for //: '%s' and '%s'\n", type_name(a.type), type_name(b.type));
-        exit(1);
+        raise_error(&Exc_TypeError, "unsupported operand type(s) for //: '%s' and '%s'", type_name(a.type), type_name(b.type));
     }
 }
 
@@ -151,13 +219,11 @@ Value mod_values(Value a, Value b) {
         double left = (a.type == TYPE_FLOAT) ? a.float_val : a.int_val;
         double right = (b.type == TYPE_FLOAT) ? b.float_val : b.int_val;
         if (fabs(right) < FLOAT_EPSILON) {
-            fprintf(stderr, "ZeroDivisionError: modulo by zero\n");
-            exit(1);
+            raise_error(&Exc_ZeroDivisionError, "modulo by zero");
         }
         return create_float(fmod(left, right));
     } else {
-        fprintf(stderr, "TypeError: unsupported operand type(s) for %%: '%s' and '%s'\n", type_name(a.type), type_name(b.type));
-        exit(1);
+        raise_error(&Exc_TypeError, "unsupported operand type(s) for %%: '%s' and '%s'", type_name(a.type), type_name(b.type));
     }
 }
 
@@ -165,51 +231,62 @@ Value join_strings(int count, ...) {
     va_list args;
     va_start(args, count);
 
-    if (count == 0) {
-        va_end(args);
-        return create_string("");
-    }
-
-    Value* vals = malloc(sizeof(Value) * count);
-    if (!vals) {
-        fprintf(stderr, "join_strings: memory allocation failed\n");
-        exit(1);
-    }
-
     size_t total_len = 0;
+    va_list sizes;
+    va_copy(sizes, args);
     for (int i = 0; i < count; i++) {
-        vals[i] = va_arg(args, Value);
-        if (vals[i].type != TYPE_STRING || vals[i].string_val == NULL) {
+        Value v = va_arg(sizes, Value);
+        if (v.type != TYPE_STRING || v.string_val == NULL) {
             fprintf(stderr, "join_strings: argument %d is not a valid string\n", i);
-            free(vals);
-            va_end(args);
             exit(1);
         }
-        total_len += strlen(vals[i].string_val);
-    }
-    va_end(args);
-
-    char* buffer = malloc(total_len + 1);
-    if (!buffer) {
-        fprintf(stderr, "join_strings: memory allocation failed\n");
-        free(vals);
-        exit(1);
+        total_len += STRING_LEN(v.string_val);
     }
-    buffer[0] = '\0';
+    va_end(sizes);
 
+    char* buffer = string_alloc(total_len);
+    size_t offset = 0;
     for (int i = 0; i < count; i++) {
-        strcat(buffer, vals[i].string_val);
+        Value v = va_arg(args, Value);
+        size_t len = STRING_LEN(v.string_val);
+        memcpy(buffer + offset, v.string_val, len);
+        offset += len;
     }
+    va_end(args);
 
-    free(vals);
+    return adopt_string(buffer);
+}
 
-    Value result = create_string(buffer);
-    free(buffer);
-    return result;
+void native_zero_division(const char* message) {
+    raise_error(&Exc_ZeroDivisionError, "%s", message);
 }
 
 // Comparisons
 
+Value or_values(Value a, Value b) {
+    if ((a.type == TYPE_INT || a.type == TYPE_BOOL) && (b.type == TYPE_INT || b.type == TYPE_BOOL)) {
+        long long left = a.type == TYPE_INT ? a.int_val : a.bool_val;
+        long long right = b.type == TYPE_INT ? b.int_val : b.bool_val;
+        return a.type == TYPE_BOOL && b.type == TYPE_BOOL ? create_bool(left | right) : create_int(left | right);
+    } else if (is_set(a) && is_set(b)) {
+        return set_combine(a, b, 0, 1);
+    } else {
+        raise_error(&Exc_TypeError, "unsupported operand type(s) for |: '%s' and '%s'", type_name(a.type), type_name(b.type));
+    }
+}
+
+Value and_values(Value a, Value b) {
+    if ((a.type == TYPE_INT || a.type == TYPE_BOOL) && (b.type == TYPE_INT || b.type == TYPE_BOOL)) {
+        long long left = a.type == TYPE_INT ? a.int_val : a.bool_val;
+        long long right = b.type == TYPE_INT ? b.int_val : b.bool_val;
+        return a.type == TYPE_BOOL && b.type == TYPE_BOOL ? create_bool(left & right) : create_int(left & right);
+    } else if (is_set(a) && is_set(b)) {
+        return set_combine(a, b, 1, 0);
+    } else {
+        raise_error(&Exc_TypeError, "unsupported operand type(s) for &: '%s' and '%s'", type_name(a.type), type_name(b.type));
+    }
+}
+
 Value eq_values(Value a, Value b) {
     if (a.type == b.type) {
         switch (a.type) {
@@ -218,14 +295,14 @@ Value eq_values(Value a, Value b) {
             case TYPE_FLOAT:
                 return create_bool(fabs(a.float_val - b.float_val) < FLOAT_EPSILON);
             case TYPE_STRING:
-                return create_bool(strcmp(a.string_val, b.string_val) == 0);
+                return create_bool(values_equal(a, b));
             case TYPE_BOOL:
                 return create_bool(a.bool_val == b.bool_val);
             default:
                 break;
         }
     }
-    return create_bool(0);
+    return create_bool(values_equal(a, b));
 }
 
 Value ne_values(Value a, Value b) {
@@ -236,14 +313,22 @@ Value ne_values(Value a, Value b) {
             case TYPE_FLOAT:
                 return create_bool(fabs(a.float_val - b.float_val) >= FLOAT_EPSILON);
             case TYPE_STRING:
-                return create_bool(strcmp(a.string_val, b.string_val) != 0);
+                return create_bool(!values_equal(a, b));
             case TYPE_BOOL:
                 return create_bool(a.bool_val != b.bool_val);
             default:
                 break;
         }
     }
-    return create_bool(1);
+    return create_bool(!values_equal(a, b));
+}
+
+Value in_values(Value a, Value b) {
+    return create_bool(contains_value(b, a));
+}
+
+Value not_in_values(Value a, Value b) {
+    return create_bool(!contains_value(b, a));
 }
 
 Value lt_values(Value a, Value b) {
@@ -254,7 +339,7 @@ Value lt_values(Value a, Value b) {
             case TYPE_FLOAT:
                 return create_bool(a.float_val < b.float_val - FLOAT_EPSILON);
             case TYPE_STRING:
-                return create_bool(strcmp(a.string_val, b.string_val) < 0);
+                return create_bool(string_compare(a.string_val, b.string_val) < 0);
             case TYPE_BOOL:
                 return create_bool(a.bool_val < b.bool_val);
             default:
@@ -272,7 +357,7 @@ Value le_values(Value a, Value b) {
             case TYPE_FLOAT:
                 return create_bool(a.float_val < b.float_val + FLOAT_EPSILON);
             case TYPE_STRING:
-                return create_bool(strcmp(a.string_val, b.string_val) <= 0);
+                return create_bool(string_compare(a.string_val, b.string_val) <= 0);
             case TYPE_BOOL:
                 return create_bool(a.bool_val <= b.bool_val);
             default:
@@ -290,7 +375,7 @@ Value gt_values(Value a, Value b) {
             case TYPE_FLOAT:
                 return create_bool(a.float_val > b.float_val + FLOAT_EPSILON);
             case TYPE_STRING:
-                return create_bool(strcmp(a.string_val, b.string_val) > 0);
+                return create_bool(string_compare(a.string_val, b.string_val) > 0);
             case TYPE_BOOL:
                 return create_bool(a.bool_val > b.bool_val);
             default:
@@ -308,7 +393,7 @@ Value ge_values(Value a, Value b) {
             case TYPE_FLOAT:
                 return create_bool(a.float_val > b.float_val - FLOAT_EPSILON);
             case TYPE_STRING:
-                return create_bool(strcmp(a.string_val, b.string_val) >= 0);
+                return create_bool(string_compare(a.string_val, b.string_val) >= 0);
             case TYPE_BOOL:
                 return create_bool(a.bool_val >= b.bool_val);
             default:
@@ -325,8 +410,7 @@ Value neg_values(Value a) {
 	} else if (a.type == TYPE_FLOAT) {
 		return create_float(-a.float_val);
 	} else {
-		fprintf(stderr, "TypeError: unsupported operand type(s) for -: '%s'\n", type_name(a.type));
-		exit(1);
+		raise_error(&Exc_TypeError, "unsupported operand type(s) for -: '%s'", type_name(a.type));
 	}
 }
 
@@ -336,8 +420,7 @@ Value pos_values(Value a) {
 	} else if (a.type == TYPE_FLOAT) {
 		return create_float(a.float_val);
 	} else {
-		fprintf(stderr, "TypeError: unsupported operand type(s) for +: '%s'\n", type_name(a.type));
-		exit(1);
+		raise_error(&Exc_TypeError, "unsupported operand type(s) for +: '%s'", type_name(a.type));
 	}
 }
 
@@ -349,18 +432,16 @@ Value not_values(Value a) {
 	} else if (a.type == TYPE_FLOAT) {
 		return create_bool(fabs(a.float_val) < FLOAT_EPSILON);
 	} else if (a.type == TYPE_STRING) {
-		return create_bool(strlen(a.string_val) == 0);
+		return create_bool(STRING_LEN(a.string_val) == 0);
 	} else {
-		fprintf(stderr, "TypeError: unsupported operand type(s) for not: '%s'\n", type_name(a.type));
-		exit(1);
+		raise_error(&Exc_TypeError, "unsupported operand type(s) for not: '%s'", type_name(a.type));
 	}
 }
 
 // Assert
 Value assert(Value condition, Value message) {
-	if (!condition.bool_val) {
-		fprintf(stderr, "AssertionError: %s\n", message.string_val);
-		exit(1);
+	if (!is_true(condition)) {
+		raise_exception(create_exception(&Exc_AssertionError, message));
 	}
 	return None;
 }
@@ -0,0 +1,150 @@
+#ifndef PROFILE_C
+#define PROFILE_C
+
+#include "../headers/profile.h"
+#include "../headers/io.h"
+
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+
+#ifdef _WIN32
+#include <windows.h>
+#else
+#include <time.h>
+#endif
+
+// One frame per active profiled call. The frames live in a growable array rather
+// than on the C stack so that CATCH can still account for the calls a longjmp
+// skipped over.
+typedef struct ProfileFrame {
+    ProfileEntry* entry;
+    long long start;
+    long long children;     // ns spent in profiled callees
+} ProfileFrame;
+
+size_t profile_depth = 0;
+static ProfileFrame* profile_frames = NULL;
+static size_t profile_capacity = 0;
+static ProfileEntry* profile_entries = NULL;
+
+// Monotonic clock in nanoseconds.
+static long long profile_now(void) {
+#ifdef _WIN32
+    static LARGE_INTEGER frequency;
+    LARGE_INTEGER counter;
+    if (!frequency.QuadPart) QueryPerformanceFrequency(&frequency);
+    QueryPerformanceCounter(&counter);
+    return (long long)((double)counter.QuadPart * 1e9 / (double)frequency.QuadPart);
+#else
+    struct timespec ts;
+    clock_gettime(CLOCK_MONOTONIC, &ts);
+    return (long long)ts.tv_sec * 1000000000LL + ts.tv_nsec;
+#endif
+}
+
+void profile_enter(ProfileEntry* entry) {
+    if (!entry->registered) {
+        if (!profile_entries) atexit(profile_report);
+        entry->registered = 1;
+        entry->next = profile_entries;
+        profile_entries = entry;
+    }
+    if (profile_depth == profile_capacity) {
+        size_t capacity = profile_capacity ? profile_capacity * 2 : 64;
+        ProfileFrame* frames = realloc(profile_frames, capacity * sizeof(ProfileFrame));
+        if (!frames) {
+            fprintf(stderr, "MemoryError: profile stack\n");
+            exit(1);
+        }
+        profile_frames = frames;
+        profile_capacity = capacity;
+    }
+    entry->calls++;
+    entry->active++;
+    ProfileFrame* frame = &profile_frames[profile_depth++];
+    frame->entry = entry;
+    frame->children = 0;
+    frame->start = profile_now();
+}
+
+static void profile_pop(long long now) {
+    ProfileFrame* frame = &profile_frames[--profile_depth];
+    long long elapsed = now - frame->start;
+    ProfileEntry* entry = frame->entry;
+    entry->exclusive += elapsed - frame->children;
+    // A recursive call is already inside the outermost activation's time.
+    if (--entry->active == 0) entry->inclusive += elapsed;
+    if (profile_depth) profile_frames[profile_depth - 1].children += elapsed;
+}
+
+void profile_exit(void) {
+    profile_pop(profile_now());
+}
+
+void profile_unwind(size_t depth) {
+    if (profile_depth <= depth) return;
+    long long now = profile_now();
+    while (profile_depth > depth) profile_pop(now);
+}
+
+static int compare_entries(const void* a, const void* b) {
+    const ProfileEntry* x = *(const ProfileEntry* const*)a;
+    const ProfileEntry* y = *(const ProfileEntry* const*)b;
+    if (x->exclusive != y->exclusive) return x->exclusive < y->exclusive ? 1 : -1;
+    return strcmp(x->name, y->name);
+}
+
+void profile_report(void) {
+    // Calls still active at exit (an uncaught exception) end here.
+    profile_unwind(0);
+    out_flush();
+
+    size_t count = 0;
+    long long calls = 0, total = 0;
+    for (ProfileEntry* e = profile_entries; e; e = e->next) {
+        count++;
+        calls += e->calls;
+        total += e->exclusive;
+    }
+    ProfileEntry** sorted = malloc((count ? count : 1) * sizeof(ProfileEntry*));
+    if (!sorted) return;
+    size_t i = 0;
+    for (ProfileEntry* e = profile_entries; e; e = e->next) sorted[i++] = e;
+    qsort(sorted, count, sizeof(ProfileEntry*), compare_entries);
+
+    const char* path = getenv("PYTOC_PROFILE");
+    if (path && path[0]) {
+        FILE* f = fopen(path, "w");
+        if (!f) {
+            fprintf(stderr, "pytoc profile: cannot write '%s'\n", path);
+            free(sorted);
+            return;
+        }
+        fprintf(f, "{\n  \"clock\": \"monotonic\",\n  \"unit\": \"seconds\",\n");
+        fprintf(f, "  \"total_calls\": %lld,\n  \"total_time\": %.9f,\n  \"functions\": [", calls, total / 1e9);
+        for (i = 0; i < count; i++) {
+            ProfileEntry* e = sorted[i];
+            fprintf(f, "%s\n    {\"function\": \"%s\", \"line\": %d, \"ncalls\": %lld, "
+                       "\"tottime\": %.9f, \"cumtime\": %.9f}",
+                    i ? "," : "", e->name, e->line, e->calls, e->exclusive / 1e9, e->inclusive / 1e9);
+        }
+        fprintf(f, "\n  ]\n}\n");
+        fclose(f);
+    } else {
+        fprintf(stderr, "\npytoc profile: %lld calls in %.6f seconds\n\n", calls, total / 1e9);
+        fprintf(stderr, "%10s %11s %11s %11s %11s  %s\n", "ncalls", "tottime", "percall", "cumtime", "percall",
+                "function (line)");
+        for (i = 0; i < count; i++) {
+            ProfileEntry* e = sorted[i];
+            double tottime = e->exclusive / 1e9, cumtime = e->inclusive / 1e9;
+            fprintf(stderr, "%10lld %11.6f %11.6f %11.6f %11.6f  %s (%d)\n", e->calls, tottime,
+                    e->calls ? tottime / e->calls : 0.0, cumtime, e->calls ? cumtime / e->calls : 0.0,
+                    e->name, e->line);
+        }
+    }
+    fflush(stderr);
+    free(sorted);
+}
+
+#endif // PROFILE_C
@@ -2,13 +2,13 @@
 #define RUNTIME_C
 
 #include "../headers/runtime.h"
+#include "../headers/exc.h"
 
 #include <stdlib.h>
 #include <stdio.h>
 #include <string.h>
 #include <ctype.h>
 #include <stdbool.h>
-#include "_global.c"
 
 const char* type_name(ValueType t) {
     switch (t) {
@@ -22,6 +22,9 @@ const char* type_name(ValueType t) {
         case TYPE_DICT: return "dict";
         case TYPE_SET: return "set";
         case TYPE_FROZENSET: return "frozenset";
+        case TYPE_EXCEPTION: return "exception";
+        case TYPE_FILE: return "TextIOWrapper";
+        case TYPE_ITERATOR: return "iterator";
         default: return "unknown";
     }
 }
@@ -33,23 +36,26 @@ Value to_int(Value v) {
         case TYPE_INT:
             return v;
         case TYPE_STRING:
-            return create_int(atoi(v.string_val));  // basic string to int
+            return create_int(atoll(v.string_val));  // basic string to int
         default:
-            fprintf(stderr, "TypeError: cannot convert to int\n");
-            exit(1);
+            raise_error(&Exc_TypeError, "cannot convert to int");
     }
 }
 
 Value to_string(Value v) {
     char buffer[64];
     switch (v.type) {
+        case TYPE_EXCEPTION:
+            return is_none(v.exc_val->message) ? create_string("") : to_string(v.exc_val->message);
         case TYPE_INT:
-            snprintf(buffer, sizeof(buffer), "%d", v.int_val);
+            snprintf(buffer, sizeof(buffer), "%lld", v.int_val);
             return create_string(buffer);
         case TYPE_STRING:
             return v;
         case TYPE_NONE:
             return create_string("None");
+        case TYPE_BOOL:
+            return create_string(v.bool_val ? "True" : "False");
         case TYPE_LIST:
         case TYPE_TUPLE:
             snprintf(buffer, sizeof(buffer), "<%s object>", type_name(v.type));
@@ -62,8 +68,7 @@ Value to_string(Value v) {
             snprintf(buffer, sizeof(buffer), "<%s object>", type_name(v.type));
             return create_string(buffer);
         default:
-            fprintf(stderr, "TypeError: cannot convert to str\n");
-            exit(1);
+            raise_error(&Exc_TypeError, "cannot convert to str");
     }
 }
 
@@ -76,45 +81,59 @@ Value to_float(Value v) {
 		case TYPE_STRING:
 			return create_float(atof(v.string_val));  // basic string to float
 		default:
-			fprintf(stderr, "TypeError: cannot convert to float\n");
-			exit(1);
+			raise_error(&Exc_TypeError, "cannot convert to float");
 	}
 }
 
+static Value table_keys(Dict* d) {
+    Value keys = create_list(d->count);
+    for (int i = 0; i < d->count; i++) {
+        keys.list_val->items[i] = retain_value(d->entries[i].key);
+    }
+    return keys;
+}
+
 Value to_list(Value v) {
 	switch (v.type) {
 		case TYPE_LIST:
-			return v;
+			return make_list(v.list_val->count, v.list_val->items);
 		case TYPE_TUPLE:
-			return create_list(v.tuple_val.count);
+			return make_list(v.tuple_val->count, v.tuple_val->items);
 		case TYPE_SET:
 		case TYPE_FROZENSET:
-			return create_list(v.set_val.count);
+			return table_keys(v.set_val);
 		case TYPE_DICT:
-			return create_list(v.dict_val.count);
+			return dict_keys(v);
+		case TYPE_FILE:
+			return file_readlines(v);
+		case TYPE_STRING:
+		case TYPE_ITERATOR: {
+			Value list = create_list(0);
+			list_extend(list, v);
+			return list;
+		}
 		default:
-			fprintf(stderr, "TypeError: cannot convert to list\n");
-			exit(1);
+			raise_error(&Exc_TypeError, "cannot convert to list");
 	}
 }
 
 Value len(Value v) {
     switch (v.type) {
         case TYPE_STRING:
-            return create_int(strlen(v.string_val));
+            return create_int(STRING_LEN(v.string_val));
         case TYPE_LIST:
-            return create_int(v.list_val.count);
+            return create_int(v.list_val->count);
         case TYPE_TUPLE:
-            return create_int(v.tuple_val.count);
+            return create_int(v.tuple_val->count);
         case TYPE_DICT:
-            return create_int(v.dict_val.count);
+            return create_int(v.dict_val->count);
         case TYPE_SET:
         case TYPE_FROZENSET:
-            return create_int(v.set_val.count);
+            return create_int(v.set_val->count);
         case TYPE_NONE:
             return create_int(0);
         case TYPE_INT: {
-            int n = abs(v.int_val);
+            long long n = llabs(v.int_val);
             int count = (n == 0) ? 1 : 0;
             while (n > 0) {
                 count++;
@@ -123,73 +142,88 @@ Value len(Value v) {
             return create_int(count);
         }
         default:
-            fprintf(stderr, "TypeError: object of type '%s' has no len()\n", type_name(v.type));
-            exit(1);
+            raise_error(&Exc_TypeError, "object of type '%s' has no len()", type_name(v.type));
     }
 }
 
 Value abs_val(Value v) {
     if (v.type != TYPE_INT) {
-        fprintf(stderr, "TypeError: bad operand type for abs()\n");
-        exit(1);
+        raise_error(&Exc_TypeError, "bad operand type for abs()");
     }
-    return create_int(abs(v.int_val));
+    return create_int(llabs(v.int_val));
 }
 
-Value max_val(Value list) {
-    if (list.type != TYPE_LIST || list.list_val.count == 0) {
-        fprintf(stderr, "TypeError: max() arg is empty or not a list\n");
-        exit(1);
-    }
-    Value max = list.list_val.items[0];
-    for (int i = 1; i < list.list_val.count; i++) {
-        if (list.list_val.items[i].type == TYPE_INT && max.type == TYPE_INT) {
-            if (list.list_val.items[i].int_val > max.int_val) {
-                max = list.list_val.items[i];
-            }
-        } else {
-            fprintf(stderr, "TypeError: max() supports only ints in list\n");
-            exit(1);
+// max(), min() and sum() stream over their argument, so they never build a
+// list out of an iterator; each item's temporaries are drained as they go.
+static Value int_extreme(Value iterable, int sign, const char* name) {
+    Value source = loop_source(iterable);
+    size_t index = 0;
+    size_t mark = pool_mark();
+    Value item;
+    int found = 0;
+    long long best = 0;
+    while (loop_next(source, &index, &item)) {
+        if (item.type != TYPE_INT) {
+            raise_error(&Exc_TypeError, "%s() supports only ints", name);
         }
+        if (!found || (sign > 0 ? item.int_val > best : item.int_val < best)) {
+            best = item.int_val;
+        }
+        found = 1;
+        pool_drain(mark);
+    }
+    if (!found) {
+        raise_error(&Exc_ValueError, "%s() arg is an empty sequence", name);
     }
-    return max;
+    return create_int(best);
 }
 
-Value min_val(Value list) {
-    if (list.type != TYPE_LIST || list.list_val.count == 0) {
-        fprintf(stderr, "TypeError: min() arg is empty or not a list\n");
-        exit(1);
-    }
-    Value min = list.list_val.items[0];
-    for (int i = 1; i < list.list_val.count; i++) {
-        if (list.list_val.items[i].type == TYPE_INT && min.type == TYPE_INT) {
-            if (list.list_val.items[i].int_val < min.int_val) {
-                min = list.list_val.items[i];
-            }
-        } else {
-            fprintf(stderr, "TypeError: min() supports only ints in list\n");
-            exit(1);
-        }
-    }
-    return min;
+Value max_val(Value iterable) {
+    return int_extreme(iterable, 1, "max");
 }
 
-Value sum_val(Value list) {
-    if (list.type != TYPE_LIST) {
-        fprintf(stderr, "TypeError: sum() expects a list\n");
-        exit(1);
-    }
-    int total = 0;
-    for (int i = 0; i < list.list_val.count; i++) {
-        if (list.list_val.items[i].type != TYPE_INT) {
-            fprintf(stderr, "TypeError: sum() supports only ints\n");
-            exit(1);
+Value min_val(Value iterable) {
+    return int_extreme(iterable, -1, "min");
+}
+
+Value sum_val(Value iterable) {
+    Value source = loop_source(iterable);
+    size_t index = 0;
+    size_t mark = pool_mark();
+    Value item;
+    long long total = 0;
+    while (loop_next(source, &index, &item)) {
+        if (item.type != TYPE_INT) {
+            raise_error(&Exc_TypeError, "sum() supports only ints");
         }
-        total += list.list_val.items[i].int_val;
+        total += item.int_val;
+        pool_drain(mark);
     }
     return create_int(total);
 }
 
+// any() and all() stop at the first item that decides the result.
+static Value truth_scan(Value iterable, bool wanted) {
+    Value source = loop_source(iterable);
+    size_t index = 0;
+    size_t mark = pool_mark();
+    Value item;
+    bool found = false;
+    while (!found && loop_next(source, &index, &item)) {
+        found = is_true(item) == wanted;
+        pool_drain(mark);
+    }
+    return create_bool(found == wanted);
+}
+
+Value any_val(Value iterable) {
+    return truth_scan(iterable, true);
+}
+
+Value all_val(Value iterable) {
+    return truth_scan(iterable, false);
+}
+
 Value bool_val(Value v) {
     int truth = 0;
     switch (v.type) {
@@ -199,144 +233,171 @@ Value bool_val(Value v) {
         case TYPE_INT:
             truth = (v.int_val != 0);
             break;
+        case TYPE_BOOL:
+            truth = v.bool_val;
+            break;
+        case TYPE_FLOAT:
+            truth = (v.float_val != 0.0);
+            break;
         case TYPE_STRING:
-            truth = (strlen(v.string_val) != 0);
+            truth = (STRING_LEN(v.string_val) != 0);
             break;
         case TYPE_LIST:
-            truth = (v.list_val.count != 0);
+            truth = (v.list_val->count != 0);
             break;
         case TYPE_TUPLE:
-            truth = (v.tuple_val.count != 0);
+            truth = (v.tuple_val->count != 0);
             break;
         case TYPE_DICT:
-            truth = (v.dict_val.count != 0);
+            truth = (v.dict_val->count != 0);
             break;
         case TYPE_SET:
         case TYPE_FROZENSET:
-            truth = (v.set_val.count != 0);
+            truth = (v.set_val->count != 0);
             break;
         default:
             truth = 1;
     }
-    return create_int(truth);
+    return create_bool(truth);
 }
 
 // ord() - get int ordinal of single char string
 Value ord_val(Value v) {
-    if (v.type != TYPE_STRING || strlen(v.string_val) != 1) {
-        fprintf(stderr, "TypeError: ord() expected a single character string\n");
-        exit(1);
+    if (v.type != TYPE_STRING || STRING_LEN(v.string_val) != 1) {
+        raise_error(&Exc_TypeError, "ord() expected a single character string");
     }
-    return create_int((int)v.string_val[0]);
+    return create_int((unsigned char)v.string_val[0]);
 }
 
 // chr() - get char string from int ordinal
 Value chr_val(Value v) {
     if (v.type != TYPE_INT || v.int_val < 0 || v.int_val > 255) {
-        fprintf(stderr, "ValueError: chr() arg out of range\n");
-        exit(1);
+        raise_error(&Exc_ValueError, "chr() arg out of range");
+    }
+    return char_string((unsigned char)v.int_val);
+}
+
+// Number of items in range(start, stop, step), computed without iterating.
+long long range_len(long long start, long long stop, long long step) {
+    if (step == 0) {
+        raise_error(&Exc_ValueError, "range() arg 3 must not be zero");
+    }
+    if (step > 0 && start < stop) {
+        return (long long)(((unsigned long long)stop - (unsigned long long)start - 1) / (unsigned long long)step + 1);
+    }
+    if (step < 0 && start > stop) {
+        return (long long)(((unsigned long long)start - (unsigned long long)stop - 1) / (0ULL - (unsigned long long)step) + 1);
     }
-    char buffer[2] = { (char)v.int_val, '\0' };
-    return create_string(buffer);
+    return 0;
+}
+
+// Unboxes a range() argument for loops the transpiler lowers to C counters.
+long long range_arg(Value v) {
+    if (v.type == TYPE_INT) return v.int_val;
+    if (v.type == TYPE_BOOL) return v.bool_val;
+    raise_error(&Exc_TypeError, "range() arguments must be integers");
 }
 
 // range() - handles (stop), (start, stop), and (start, stop, step)
 Value range_val(Value v1, Value v2, Value v3) {
-    int start, stop, step;
-
-    if (v1.type != TYPE_INT) {
-        fprintf(stderr, "TypeError: range() arguments must be integers\n");
-        exit(1);
-    }
+    long long start, stop, step;
 
     if (v2.type == TYPE_NONE && v3.type == TYPE_NONE) {
         // range(stop)
         start = 0;
-        stop = v1.int_val;
+        stop = range_arg(v1);
         step = 1;
-    } else if (v2.type == TYPE_INT && v3.type == TYPE_NONE) {
+    } else if (v3.type == TYPE_NONE) {
         // range(start, stop)
-        start = v1.int_val;
-        stop = v2.int_val;
+        start = range_arg(v1);
+        stop = range_arg(v2);
         step = 1;
-    } else if (v2.type == TYPE_INT && v3.type == TYPE_INT) {
-        // range(start, stop, step)
-        start = v1.int_val;
-        stop = v2.int_val;
-        step = v3.int_val;
-
-        if (step == 0) {
-            fprintf(stderr, "ValueError: range() step argument must not be zero\n");
-            exit(1);
-        }
     } else {
-        fprintf(stderr, "TypeError: invalid combination of arguments for range()\n");
-        exit(1);
+        // range(start, stop, step)
+        start = range_arg(v1);
+        stop = range_arg(v2);
+        step = range_arg(v3);
     }
 
-    int count = 0;
-    if ((step > 0 && start >= stop) || (step < 0 && start <= stop)) {
-        return create_list(0); // empty list
+    long long count = range_len(start, stop, step);
+    Value list = create_list((int)count);
+    for (long long i = 0; i < count; i++) {
+        list.list_val->items[i] = create_int(start + i * step);
     }
 
-    for (int i = start; (step > 0) ? (i < stop) : (i > stop); i += step) {
-        count++;
-    }
+    return list;
+}
 
-    Value list = create_list(count);
-    int index = 0;
-    for (int i = start; (step > 0) ? (i < stop) : (i > stop); i += step) {
-        list.list_val.items[index++] = create_int(i);
+// Allocates an iterator of `kind` over `source`, which it keeps alive.
+static Value create_iterator(IteratorKind kind, Value source) {
+    Iterator* it = (Iterator*)pytoc_malloc(sizeof(Iterator), TYPE_ITERATOR);
+    if (!it) {
+        fprintf(stderr, "MemoryError\n");
+        exit(1);
     }
+    it->refcount = 1;
+    it->kind = kind;
+    it->source = retain_value(source);
+    it->index = 0;
+    it->count = 0;
+    it->function = NULL;
+    it->exhausted = 0;
+    Value v;
+    v.type = TYPE_ITERATOR;
+    v.iter_val = it;
+    return autorelease_value(v);
+}
 
-    return list;
+void iterator_free(Iterator* it) {
+    release_value(it->source);
+    pytoc_free(it);
 }
 
-// reversed() - returns a reversed list copy
+// Walks the sequence backwards lazily instead of copying it.
 Value reversed_val(Value v) {
-    if (v.type != TYPE_LIST) {
-        fprintf(stderr, "TypeError: reversed() expects a list\n");
-        exit(1);
-    }
-    Value rev = create_list(v.list_val.count);
-    for (int i = 0; i < v.list_val.count; i++) {
-        rev.list_val.items[i] = v.list_val.items[v.list_val.count - 1 - i];
+    Value it;
+    switch (v.type) {
+        case TYPE_LIST:
+        case TYPE_TUPLE:
+        case TYPE_DICT:
+            it = create_iterator(ITER_REVERSED, v);
+            it.iter_val->index = v.type == TYPE_LIST ? (size_t)v.list_val->count
+                               : v.type == TYPE_TUPLE ? (size_t)v.tuple_val->count
+                               : (size_t)v.dict_val->count;
+            return it;
+        case TYPE_STRING:
+            it = create_iterator(ITER_REVERSED, v);
+            it.iter_val->index = STRING_LEN(v.string_val);
+            return it;
+        default:
+            raise_error(&Exc_TypeError, "'%s' object is not reversible", type_name(v.type));
     }
-    return rev;
 }
 
 // upper() for strings
 Value upper_val(Value v) {
     if (v.type != TYPE_STRING) {
-        fprintf(stderr, "TypeError: upper() expects a string\n");
-        exit(1);
+        raise_error(&Exc_TypeError, "upper() expects a string");
     }
-    int len = strlen(v.string_val);
-    char* buffer = (char*)malloc(len + 1);
-    for (int i = 0; i < len; i++) {
-        buffer[i] = toupper(v.string_val[i]);
+    size_t len = STRING_LEN(v.string_val);
+    char* buffer = string_alloc(len);
+    for (size_t i = 0; i < len; i++) {
+        buffer[i] = (char)toupper((unsigned char)v.string_val[i]);
     }
-    buffer[len] = '\0';
-    Value result = create_string(buffer);
-    free(buffer);
-    return result;
+    return adopt_string(buffer);
 }
 
 // lower() for strings
 Value lower_val(Value v) {
     if (v.type != TYPE_STRING) {
-        fprintf(stderr, "TypeError: lower() expects a string\n");
-        exit(1);
+        raise_error(&Exc_TypeError, "lower() expects a string");
     }
-    int len = strlen(v.string_val);
-    char* buffer = (char*)malloc(len + 1);
-    for (int i = 0; i < len; i++) {
-        buffer[i] = tolower(v.string_val[i]);
+    size_t len = STRING_LEN(v.string_val);
+    char* buffer = string_alloc(len);
+    for (size_t i = 0; i < len; i++) {
+        buffer[i] = (char)tolower((unsigned char)v.string_val[i]);
     }
-    buffer[len] = '\0';
-    Value result = create_string(buffer);
-    free(buffer);
-    return result;
+    return adopt_string(buffer);
 }
 
 // isinstance() simplified: check type equality
@@ -349,53 +410,57 @@ int cmp_int(const void* a, const void* b) {
     Value* va = (Value*)a;
     Value* vb = (Value*)b;
     if (va->type != TYPE_INT || vb->type != TYPE_INT) {
-        fprintf(stderr, "TypeError: sorted() supports only list of ints\n");
-        exit(1);
+        raise_error(&Exc_TypeError, "sorted() supports only list of ints");
     }
-    return va->int_val - vb->int_val;
+    return (va->int_val > vb->int_val) - (va->int_val < vb->int_val);
 }
 
 Value sorted_val(Value list) {
-    if (list.type != TYPE_LIST) {
-        fprintf(stderr, "TypeError: sorted() expects a list\n");
-        exit(1);
+    list = iter_list(list);
+    Value copy = create_list(list.list_val->count);
+    for (int i = 0; i < list.list_val->count; i++) {
+        copy.list_val->items[i] = retain_value(list.list_val->items[i]);
     }
-    Value copy = create_list(list.list_val.count);
-    for (int i = 0; i < list.list_val.count; i++) {
-        copy.list_val.items[i] = list.list_val.items[i];
-    }
-    qsort(copy.list_val.items, copy.list_val.count, sizeof(Value), cmp_int);
+    qsort(copy.list_val->items, copy.list_val->count, sizeof(Value), cmp_int);
     return copy;
 }
 
+static Value fill_set(Value set, Value v) {
+    if (is_none(v)) return set;
+    Value items = iter_list(v);
+    for (int i = 0; i < items.list_val->count; i++) {
+        set_insert(&set, items.list_val->items[i]);
+    }
+    return set;
+}
+
 Value set_val(Value v) {
-    if (v.type != TYPE_LIST) {
-        fprintf(stderr, "TypeError: set() expects a list\n");
-        exit(1);
+    return fill_set(create_set(0), v);
+}
+
+Value frozenset_val(Value v) {
+    return fill_set(create_frozenset(0), v);
+}
+
+Value set_add(Value set, Value item) {
+    if (set.type != TYPE_SET) {
+        raise_error(&Exc_AttributeError, "'%s' object has no attribute 'add'", type_name(set.type));
     }
-    Value set = create_set(v.list_val.count);
-    int count = 0;
-    for (int i = 0; i < v.list_val.count; i++) {
-        int found = 0;
-        for (int j = 0; j < count; j++) {
-            if (set.set_val.items[j].int_val == v.list_val.items[i].int_val) {
-                found = 1;
-                break;
-            }
-        }
-        if (!found) {
-            set.set_val.items[count++] = v.list_val.items[i];
-        }
+    return set_insert(&set, item);
+}
+
+Value make_set(int lenght, Value* items) {
+    Value set = create_set(lenght);
+    for (int i = 0; i < lenght; i++) {
+        set_insert(&set, items[i]);
     }
-    set.set_val.count = count;
     return set;
 }
 
 Value make_dict(int lenght, Value* keys, Value* values) {
     Value dict = create_dict(lenght);
     for (int i = 0; i < lenght; i++) {
-        dict.dict_val.keys[i] = keys[i];
-        dict.dict_val.values[i] = values[i];
+        dict_set(&dict, keys[i], values[i]);
     }
     return dict;
 }
@@ -403,16 +468,423 @@ Value make_dict(int lenght, Value* keys, Value* values) {
 Value make_list(int lenght, Value* items) {
     Value list = create_list(lenght);
     for (int i = 0; i < lenght; i++) {
-        list.list_val.items[i] = items[i];
+        list.list_val->items[i] = retain_value(items[i]);
     }
     return list;
 }
 
 
+// Grows `list` so it can hold at least `count` items. Capacity at least doubles,
+// so a sequence of appends copies each item O(1) times on average.
+void list_reserve(List* list, int count) {
+    if (count <= list->capacity) return;
+    int capacity = list->capacity * 2;
+    if (capacity < 8) capacity = 8;
+    if (capacity < count) capacity = count;
+    Value* items = (Value*)pytoc_realloc(list->items, (size_t)capacity * sizeof(Value), TYPE_LIST);
+    if (!items) {
+        fprintf(stderr, "Error: memory allocation failed\n");
+        exit(1);
+    }
+    list->items = items;
+    list->capacity = capacity;
+}
+
+static void expect_list(Value v, const char* method) {
+    if (v.type != TYPE_LIST) {
+        raise_error(&Exc_AttributeError, "'%s' object has no attribute '%s'", type_name(v.type), method);
+    }
+}
+
+// Normalizes a Python index against `count`, allowing negative indices.
+static long long list_index(Value index, long long count, const char* method) {
+    if (index.type != TYPE_INT && index.type != TYPE_BOOL) {
+        raise_error(&Exc_TypeError, "list.%s() index must be an integer, not '%s'", method, type_name(index.type));
+    }
+    long long i = index.type == TYPE_INT ? index.int_val : index.bool_val;
+    return i < 0 ? i + count : i;
+}
+
+Value list_append(Value list, Value item) {
+    expect_list(list, "append");
+    List* l = list.list_val;
+    list_reserve(l, l->count + 1);
+    l->items[l->count++] = retain_value(item);
+    return None;
+}
+
+Value list_extend(Value list, Value iterable) {
+    expect_list(list, "extend");
+    List* l = list.list_val;
+    if (iterable.type == TYPE_STRING) {
+        const char* s = iterable.string_val;
+        int n = (int)STRING_LEN(s);
+        list_reserve(l, l->count + n);
+        for (int i = 0; i < n; i++) {
+            l->items[l->count++] = char_string((unsigned char)s[i]);
+        }
+        return None;
+    }
+
+    if (iterable.type == TYPE_DICT || iterable.type == TYPE_SET || iterable.type == TYPE_FROZENSET) {
+        Dict* d = iterable.dict_val;
+        list_reserve(l, l->count + d->count);
+        for (int i = 0; i < d->count; i++) {
+            l->items[l->count++] = retain_value(d->entries[i].key);
+        }
+        return None;
+    }
+
+    if (iterable.type == TYPE_ITERATOR || iterable.type == TYPE_FILE) {
+        // Drop the pool's reference to each item once the list holds it.
+        size_t mark = pool_mark();
+        for (Value item = iter_next(iterable); !iter_done(item); item = iter_next(iterable)) {
+            list_append(list, item);
+            pool_drain(mark);
+        }
+        return None;
+    }
+
+    int n;
+    switch (iterable.type) {
+        case TYPE_LIST: n = iterable.list_val->count; break;
+        case TYPE_TUPLE: n = iterable.tuple_val->count; break;
+        default:
+            raise_error(&Exc_TypeError, "'%s' object is not iterable", type_name(iterable.type));
+    }
+    list_reserve(l, l->count + n);
+    // Look the items up only after growing: `xs.extend(xs)` reads from the block just reallocated.
+    Value* items;
+    switch (iterable.type) {
+        case TYPE_LIST: items = iterable.list_val->items; break;
+        default: items = iterable.tuple_val->items; break;
+    }
+    for (int i = 0; i < n; i++) {
+        l->items[l->count++] = retain_value(items[i]);
+    }
+    return None;
+}
+
+Value list_pop(Value list, Value index) {
+    expect_list(list, "pop");
+    List* l = list.list_val;
+    if (l->count == 0) {
+        raise_error(&Exc_IndexError, "pop from empty list");
+    }
+    long long i = is_none(index) ? l->count - 1 : list_index(index, l->count, "pop");
+    if (i < 0 || i >= l->count) {
+        raise_error(&Exc_IndexError, "pop index out of range");
+    }
+    Value item = l->items[i];
+    memmove(&l->items[i], &l->items[i + 1], (size_t)(l->count - i - 1) * sizeof(Value));
+    l->count--;
+    // The list's reference moves to the pool, so the caller gets an ordinary temporary.
+    return autorelease_value(item);
+}
+
+Value list_insert(Value list, Value index, Value item) {
+    expect_list(list, "insert");
+    List* l = list.list_val;
+    long long i = list_index(index, l->count, "insert");
+    if (i < 0) i = 0;
+    if (i > l->count) i = l->count;
+    list_reserve(l, l->count + 1);
+    memmove(&l->items[i + 1], &l->items[i], (size_t)(l->count - i) * sizeof(Value));
+    l->items[i] = retain_value(item);
+    l->count++;
+    return None;
+}
+
+
+// The message is the key's repr, as in CPython.
+static void key_error(Value key) {
+    switch (key.type) {
+        case TYPE_STRING:
+            raise_error(&Exc_KeyError, "'%s'", key.string_val);
+        case TYPE_INT:
+            raise_error(&Exc_KeyError, "%lld", key.int_val);
+        case TYPE_FLOAT:
+            raise_error(&Exc_KeyError, "%g", key.float_val);
+        case TYPE_BOOL:
+            raise_error(&Exc_KeyError, "%s", key.bool_val ? "True" : "False");
+        default:
+            raise_error(&Exc_KeyError, "<%s>", type_name(key.type));
+    }
+}
+
+// Resolves `index` into a sequence of `count` items, raising an IndexError if out of range.
+static long long sequence_index(Value container, Value index, long long count) {
+    if (index.type != TYPE_INT && index.type != TYPE_BOOL) {
+        fprintf(stderr, "TypeError: %s indices must be integers or slices, not %s", type_name(container.type), type_name(index.type));
+    }
+    long long i = index.type == TYPE_INT ? index.int_val : index.bool_val;
+    if (i < 0) i += count;
+    if (i < 0 || i >= count) {
+        raise_error(&Exc_IndexError, "%s index out of range", type_name(container.type));
+    }
+    return i;
+}
+
+// `container[key]`. The result is borrowed from the container.
+Value getitem_value(Value container, Value key) {
+    switch (container.type) {
+        case TYPE_DICT: {
+            Value* value = dict_lookup(container, key);
+            if (!value) key_error(key);
+            return *value;
+        }
+        case TYPE_LIST:
+            return container.list_val->items[sequence_index(container, key, container.list_val->count)];
+        case TYPE_TUPLE:
+            return container.tuple_val->items[sequence_index(container, key, container.tuple_val->count)];
+        case TYPE_STRING: {
+            long long i = sequence_index(container, key, (long long)STRING_LEN(container.string_val));
+            return char_string((unsigned char)container.string_val[i]);
+        }
+        default:
+            raise_error(&Exc_TypeError, "'%s' object is not subscriptable", type_name(container.type));
+    }
+}
+
+// `container[key] = value`
+Value setitem_value(Value container, Value key, Value value) {
+    switch (container.type) {
+        case TYPE_DICT:
+            return dict_set(&container, key, value);
+        case TYPE_LIST: {
+            Value* slot = &container.list_val->items[sequence_index(container, key, container.list_val->count)];
+            assign_value(slot, value);
+            return None;
+        }
+        default:
+            raise_error(&Exc_TypeError, "'%s' object does not support item assignment", type_name(container.type));
+    }
+}
+
+// `item in container`
+int contains_value(Value container, Value item) {
+    switch (container.type) {
+        case TYPE_DICT:
+            return dict_lookup(container, item) != NULL;
+        case TYPE_STRING:
+            if (item.type != TYPE_STRING) {
+                raise_error(&Exc_TypeError, "'in <string>' requires string as left operand, not %s", type_name(item.type));
+            }
+            if (STRING_LEN(item.string_val) == 1) {
+                return memchr(container.string_val, item.string_val[0], STRING_LEN(container.string_val)) != NULL;
+            }
+            return strstr(container.string_val, item.string_val) != NULL;
+        case TYPE_LIST:
+            for (int i = 0; i < container.list_val->count; i++) {
+                if (values_equal(container.list_val->items[i], item)) return 1;
+            }
+            return 0;
+        case TYPE_TUPLE:
+            for (int i = 0; i < container.tuple_val->count; i++) {
+                if (values_equal(container.tuple_val->items[i], item)) return 1;
+            }
+            return 0;
+        case TYPE_SET:
+        case TYPE_FROZENSET:
+            return set_contains(container, item);
+        default:
+            raise_error(&Exc_TypeError, "argument of type '%s' is not iterable", type_name(container.type));
+    }
+}
+
+static void expect_dict(Value v, const char* method) {
+    if (v.type != TYPE_DICT) {
+        raise_error(&Exc_AttributeError, "'%s' object has no attribute '%s'", type_name(v.type), method);
+    }
+}
+
+Value dict_get(Value dict, Value key, Value default_value) {
+    expect_dict(dict, "get");
+    Value* value = dict_lookup(dict, key);
+    return value ? *value : default_value;
+}
+
+Value dict_keys(Value dict) {
+    expect_dict(dict, "keys");
+    return table_keys(dict.dict_val);
+}
+
+Value dict_values(Value dict) {
+    expect_dict(dict, "values");
+    Value values = create_list(dict.dict_val->count);
+    for (int i = 0; i < dict.dict_val->count; i++) {
+        values.list_val->items[i] = retain_value(dict.dict_val->entries[i].value);
+    }
+    return values;
+}
+
+Value dict_items(Value dict) {
+    expect_dict(dict, "items");
+    Value items = create_list(dict.dict_val->count);
+    for (int i = 0; i < dict.dict_val->count; i++) {
+        Value pair = create_tuple(2);
+        pair.tuple_val->items[0] = retain_value(dict.dict_val->entries[i].key);
+        pair.tuple_val->items[1] = retain_value(dict.dict_val->entries[i].value);
+        items.list_val->items[i] = retain_value(pair);
+    }
+    return items;
+}
+
+// The list a for-loop walks: lists themselves, anything else as a list of its items.
+Value iter_list(Value v) {
+    if (v.type == TYPE_LIST) return v;
+    return to_list(v);
+}
+
+Value as_dict(Value v, const char* method) {
+    expect_dict(v, method);
+    return v;
+}
+
+Value IterStop = { .type = TYPE_ITERATOR, .iter_val = NULL };
+
+Value loop_source(Value v) {
+    switch (v.type) {
+        case TYPE_LIST:
+        case TYPE_TUPLE:
+        case TYPE_STRING:
+        case TYPE_DICT:
+        case TYPE_SET:
+        case TYPE_FROZENSET:
+        case TYPE_FILE:
+        case TYPE_ITERATOR:
+            return v;
+        default:
+            raise_error(&Exc_TypeError, "'%s' object is not iterable", type_name(v.type));
+    }
+}
+
+Value loop_source_reversed(Value v) {
+    return v.type == TYPE_LIST || v.type == TYPE_TUPLE ? v : reversed_val(v);
+}
+
+Value iter_value(Value v) {
+    if (v.type == TYPE_ITERATOR || v.type == TYPE_FILE) return v;
+    return create_iterator(ITER_FORWARD, loop_source(v));
+}
+
+static Value iterator_step(Iterator* it) {
+    Value item;
+    switch (it->kind) {
+        case ITER_FORWARD:
+            return loop_next(it->source, &it->index, &item) ? item : IterStop;
+        case ITER_REVERSED: {
+            Value source = it->source;
+            if (it->index == 0) return IterStop;
+            it->index--;
+            switch (source.type) {
+                case TYPE_LIST:
+                    if (it->index >= (size_t)source.list_val->count) return IterStop;
+                    return source.list_val->items[it->index];
+                case TYPE_TUPLE:
+                    return source.tuple_val->items[it->index];
+                case TYPE_STRING:
+                    return char_string((unsigned char)source.string_val[it->index]);
+                default:
+                    if (it->index >= (size_t)source.dict_val->count) {
+                        raise_error(&Exc_RuntimeError, "dictionary changed size during iteration");
+                    }
+                    return source.dict_val->entries[it->index].key;
+            }
+        }
+        case ITER_ENUMERATE: {
+            item = iter_next(it->source);
+            if (iter_done(item)) return IterStop;
+            Value pair = create_tuple(2);
+            pair.tuple_val->items[0] = create_int(it->count++);
+            pair.tuple_val->items[1] = retain_value(item);
+            return pair;
+        }
+        case ITER_ZIP:
+        case ITER_MAP: {
+            Tuple* iterators = it->source.tuple_val;
+            Value items[3];
+            Value tuple = it->kind == ITER_ZIP ? create_tuple(iterators->count) : None;
+            for (int i = 0; i < iterators->count; i++) {
+                item = iter_next(iterators->items[i]);
+                if (iter_done(item)) return IterStop;
+                if (it->kind == ITER_ZIP) {
+                    tuple.tuple_val->items[i] = retain_value(item);
+                } else {
+                    items[i] = item;
+                }
+            }
+            if (it->kind == ITER_ZIP) return tuple;
+            switch (iterators->count) {
+                case 1: return ((Value (*)(Value))it->function)(items[0]);
+                case 2: return ((Value (*)(Value, Value))it->function)(items[0], items[1]);
+                default: return ((Value (*)(Value, Value, Value))it->function)(items[0], items[1], items[2]);
+            }
+        }
+    }
+    return IterStop;
+}
+
+Value iter_next(Value v) {
+    if (v.type == TYPE_FILE) {
+        Value line;
+        return file_next(v, &line) ? line : IterStop;
+    }
+    if (v.type != TYPE_ITERATOR || !v.iter_val) {
+        raise_error(&Exc_TypeError, "'%s' object is not an iterator", type_name(v.type));
+    }
+    Iterator* it = v.iter_val;
+    if (it->exhausted) return IterStop;
+    Value item = iterator_step(it);
+    if (iter_done(item)) {
+        // An exhausted iterator stays exhausted even if its source grows again.
+        it->exhausted = 1;
+        release_value(it->source);
+        it->source = None;
+    }
+    return item;
+}
+
+Value next_val(Value it, Value default_value) {
+    Value item = iter_next(it);
+    if (!iter_done(item)) return item;
+    if (iter_done(default_value)) raise_exception(create_exception(&Exc_StopIteration, None));
+    return default_value;
+}
+
+Value enumerate_val(Value iterable, Value start) {
+    Value it = create_iterator(ITER_ENUMERATE, iter_value(iterable));
+    it.iter_val->count = is_none(start) ? 0 : range_arg(start);
+    return it;
+}
+
+static Value iterator_tuple(Value iterables) {
+    Value iterators = create_tuple(iterables.list_val->count);
+    for (int i = 0; i < iterables.list_val->count; i++) {
+        iterators.tuple_val->items[i] = retain_value(iter_value(iterables.list_val->items[i]));
+    }
+    return iterators;
+}
+
+Value zip_val(Value iterables) {
+    return create_iterator(ITER_ZIP, iterator_tuple(iterables));
+}
+
+// `function` is a transpiled function or builtin taking one Value per iterable (at most three).
+Value map_val(void (*function)(void), Value iterables) {
+    if (iterables.list_val->count < 1 || iterables.list_val->count > 3) {
+        raise_error(&Exc_TypeError, "map() must have between one and three iterables");
+    }
+    Value it = create_iterator(ITER_MAP, iterator_tuple(iterables));
+    it.iter_val->function = function;
+    return it;
+}
+
+
 Value make_tuple(int lenght, Value* items) {
     Value tuple = create_tuple(lenght);
     for (int i = 0; i < lenght; i++) {
-        tuple.tuple_val.items[i] = items[i];
+        tuple.tuple_val->items[i] = retain_value(items[i]);
     }
     return tuple;
 }
@@ -439,7 +911,18 @@ bool is_int(Value v) {
 }
 
 bool is_true(Value v) {
-    return v.type == TYPE_INT && v.int_val != 0;
+    switch (v.type) {
+        case TYPE_BOOL:
+            return v.bool_val != 0;
+        case TYPE_INT:
+            return v.int_val != 0;
+        case TYPE_FLOAT:
+            return v.float_val != 0.0;
+        case TYPE_NONE:
+            return false;
+        default:
+            return bool_val(v).bool_val != 0;
+    }
 }
 
 bool is_false(Value v) {
@@ -1,9 +1,9 @@
 #ifndef TRYCATCH_C
 #define TRYCATCH_C
 
-#include <setjmp.h>
-#include <stdio.h>
-#include "../headers/exc.h"
 #include "../headers/try-catch.h"
 
+// Innermost active handler, NULL outside any `try`.
+TryFrame* try_top = NULL;
+
 #endif // TRYCATCH_C
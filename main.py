@@ -4,7 +4,16 @@ from io import BytesIO
 import os
 import subprocess
 import tempfile
+import glob
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 import PYTOCTranspiler
+import PYTOCBackend
+import PYTOCCache
+import PYTOCRuntime
+import PYTOCIncremental
+import PYTOCOptimizer
+import PYTOCInliner
 import sys
 import struct
 
@@ -36,29 +45,46 @@ def analyze_python_code(source_code):
     return tokens, tree
 
 
-def compile_c(source_code, output_file, compiler_flags=None, debug=False, arch='32'):
+def compile_c(source_code, output_file, compiler_flags=None, debug=False, arch='32', backend=None, opt=None,
+              shared_runtime=False, trace_alloc=False):
     """
-    Compiles C include code using TCC.
+    Compiles C include code using the selected backend.
 
     Args:
         source_code (str): The C include code to compile.
         output_file (str): The desired output binary file path.
-        compiler_flags (list, optional): Additional flags to pass to TCC.
+        compiler_flags (list, optional): Additional flags to pass to the compiler.
         debug (bool): If True, include debug symbols.
         arch (str): Target architecture mode ('32' or '64').
+        backend (str | PYTOCBackend.Backend, optional): Backend name or instance, probed if None.
+        opt (str, optional): Optimization level ('0', '1', '2', '3' or 'lto').
+        shared_runtime (bool): Link against the runtime as a shared library instead of a static archive.
+        trace_alloc (bool): Link against a runtime built with PYTOC_TRACE_ALLOC, which counts every
+            allocation and prints a summary when the program exits.
 
     Returns:
         tuple: (success: bool, message: str)
     """
     base_dir = os.path.abspath(os.path.dirname(__file__))
 
-    tcc_path = os.path.abspath(os.path.join(base_dir, f"tcc/tcc-win{arch}/tcc.exe"))
+    if not isinstance(backend, PYTOCBackend.Backend):
+        try:
+            backend = PYTOCBackend.find_backend(backend, arch)
+        except ValueError as e:
+            return False, str(e)
+    if backend is None:
+        return False, f"No C compiler found for {arch}-bit. Install tcc, gcc or clang."
+    if opt is not None and opt not in PYTOCBackend.OPT_LEVELS:
+        return False, f"Optimization level must be one of: {', '.join(PYTOCBackend.OPT_LEVELS)}."
+
+    success, runtime_library = PYTOCRuntime.build_runtime(backend, opt=opt, debug=debug, shared=shared_runtime,
+                                                          trace_alloc=trace_alloc)
+    if not success:
+        return False, runtime_library
+
     temp_dir = os.path.join(base_dir, "temp")
     os.makedirs(temp_dir, exist_ok=True)
 
-    if not os.path.isfile(tcc_path):
-        return False, f"TCC not found at {tcc_path}"
-
     try:
         with tempfile.NamedTemporaryFile(dir=temp_dir, delete=False, suffix='.c', mode='w', encoding='utf-8') as tmp:
             tmp.write(source_code)
@@ -68,20 +94,21 @@ def compile_c(source_code, output_file, compiler_flags=None, debug=False, arch='
 
     output_file = os.path.abspath(output_file)
 
-    cmd = [tcc_path, tmp_path, '-o', output_file]
-    if compiler_flags:
-        if not isinstance(compiler_flags, list):
-            return False, "Compiler flags must be a list."
-        cmd.extend(compiler_flags)
+    if compiler_flags and not isinstance(compiler_flags, list):
+        return False, "Compiler flags must be a list."
+    if trace_alloc:
+        compiler_flags = [*(compiler_flags or []), f"-D{PYTOCRuntime.TRACE_ALLOC_DEFINE}"]
+    cmd = backend.command([tmp_path], output_file, compiler_flags=compiler_flags, opt=opt, debug=debug,
+                          include_dirs=[PYTOCRuntime.HEADERS_DIR], libraries=[runtime_library])
     if debug:
-        cmd.append('-g')
-        print(f"[DEBUG] Using TCC: {tcc_path}")
+        print(f"[DEBUG] Using {backend.name}: {backend.path}")
+        print(f"[DEBUG] Runtime library: {runtime_library}")
         print(f"[DEBUG] Temp include file: {tmp_path}")
         print(f"[DEBUG] Output file: {output_file}")
         print(f"[DEBUG] Command: {' '.join(cmd)}")
         if compiler_flags:
             print(f"[DEBUG] Compiler flags: {compiler_flags}")
-        print(f"[DEBUG] TCC version: {os.popen(f'{tcc_path} -v').read()}")
+        print(f"[DEBUG] {backend.name} version: {backend.version()}")
 
     try:
         subprocess.check_output(cmd, stderr=subprocess.STDOUT)
@@ -93,26 +120,39 @@ def compile_c(source_code, output_file, compiler_flags=None, debug=False, arch='
             os.remove(tmp_path)
 
 
-def python_to_c(source_code, debug=False):
+def python_to_c(source_code, debug=False, tree=None, function_cache=None, fold=True, unbuffered=False, profile=False,
+                inline_threshold=PYTOCInliner.DEFAULT_THRESHOLD):
     """
     Converts Python include code to C code.
 
     Args:
         source_code (str): The Python code to convert.
         debug (bool): If True, print debug information.
+        tree (ast.Module, optional): Already parsed AST of `source_code`.
+        function_cache (dict, optional): Generated C of unchanged functions, kept between calls.
+        fold (bool): Run `PYTOCOptimizer` (constant folding and dead code elimination) first.
+        unbuffered (bool): Flush stdout after every print() instead of buffering output.
+        profile (bool): Time every user function and print a report when the program exits.
+        inline_threshold (int): Largest function body, in expression nodes, inlined at call sites; 0 disables inlining.
 
     Returns:
         str: The converted C code.
     """
-    tokens, tree = analyze_python_code(source_code)
+    # A tree parsed here is not shared, so the optimizer may rewrite it in place.
+    owned = tree is None
+    if owned:
+        tree = ast.parse(source_code)
+    if fold:
+        tree = PYTOCOptimizer.optimize(tree, copy_tree=not owned)
     if debug:
         print("[DEBUG] AST:")
         print(ast.dump(tree, indent=4))
-    transpiler = PYTOCTranspiler.PYTOCTranspiler()
+    transpiler = PYTOCTranspiler.PYTOCTranspiler(function_cache=function_cache, unbuffered=unbuffered, profile=profile,
+                                                 inline_threshold=inline_threshold)
     transpiler.debug = debug
     c_code = transpiler.visit(tree)["code"]
-    print("[DEBUG] C code generated:")
     if debug:
+        print("[DEBUG] C code generated:")
         print("\n")
         lines = c_code.splitlines()
         pad = len(str(len(lines)))
@@ -122,40 +162,356 @@ def python_to_c(source_code, debug=False):
     return c_code
 
 
-def compile_py_to_c(source_code, output_file, compiler_flags=None, debug=False, arch='32'):
+def compile_py_to_c(source_code, output_file, compiler_flags=None, debug=False, arch='32', backend=None, opt=None,
+                    shared_runtime=False, cache=None, fold=True, unbuffered=False, profile=False,
+                    trace_alloc=False, inline_threshold=PYTOCInliner.DEFAULT_THRESHOLD):
     """
     Compiles Python include code to C and then compiles the C code to an executable.
 
     Args:
         source_code (str): The Python code to compile.
         output_file (str): The desired output binary file path.
-        compiler_flags (list, optional): Additional flags to pass to TCC.
+        compiler_flags (list, optional): Additional flags to pass to the compiler.
         debug (bool): If True, include debug symbols.
         arch (str): Target architecture mode ('32' or '64').
+        backend (str | PYTOCBackend.Backend, optional): Backend name or instance, probed if None.
+        opt (str, optional): Optimization level ('0', '1', '2', '3' or 'lto').
+        shared_runtime (bool): Link against the runtime as a shared library instead of a static archive.
+        cache (PYTOCCache.BuildCache, optional): Build cache to consult before compiling.
+        fold (bool): Run constant folding and dead code elimination before transpiling.
+        unbuffered (bool): Flush stdout after every print() instead of buffering output.
+        profile (bool): Time every user function and print a report when the program exits.
+        inline_threshold (int): Largest function body, in expression nodes, inlined at call sites; 0 disables inlining.
+        trace_alloc (bool): Count every runtime allocation and print a summary when the program exits.
 
     Returns:
         tuple: (success: bool, message: str)
     """
-    c_code = python_to_c(source_code, debug=debug)
-    success, message = compile_c(c_code, output_file, compiler_flags=compiler_flags, debug=debug, arch=arch)
+    key = None
+    if cache is not None:
+        if not isinstance(backend, PYTOCBackend.Backend):
+            backend = PYTOCBackend.find_backend(backend, arch)
+        if backend is not None:
+            key = cache.key(source_code, backend, arch, compiler_flags=compiler_flags, opt=opt, debug=debug,
+                            shared_runtime=shared_runtime, fold=fold, unbuffered=unbuffered, profile=profile,
+                            trace_alloc=trace_alloc, inline_threshold=inline_threshold)
+            if cache.fetch(key, output_file):
+                return True, f"Compilation successful (cached): {os.path.abspath(output_file)}"
+            cache.prepare_output(output_file)
+
+    c_code = python_to_c(source_code, debug=debug, fold=fold, unbuffered=unbuffered, profile=profile,
+                         inline_threshold=inline_threshold)
+    success, message = compile_c(c_code, output_file, compiler_flags=compiler_flags, debug=debug, arch=arch,
+                                 backend=backend, opt=opt, shared_runtime=shared_runtime, trace_alloc=trace_alloc)
+    if success and key is not None:
+        cache.store(key, output_file)
     return success, message
 
 
+def watch(source_file, output_file, compiler_flags=None, debug=False, arch='32', backend=None, opt=None,
+          shared_runtime=False, cache=None, auto_run=False, interval=0.25, fold=True, unbuffered=False, profile=False,
+          trace_alloc=False, inline_threshold=PYTOCInliner.DEFAULT_THRESHOLD):
+    """
+    Rebuilds `output_file` every time `source_file` is saved, until interrupted.
+
+    Only the top-level statements whose text changed are re-parsed, and functions
+    whose AST is unchanged reuse their previously generated C.
+
+    Args:
+        source_file (str): The Python file to watch.
+        output_file (str): The desired output binary file path.
+        compiler_flags (list, optional): Additional flags to pass to the compiler.
+        debug (bool): If True, include debug symbols.
+        arch (str): Target architecture mode ('32' or '64').
+        backend (str | PYTOCBackend.Backend, optional): Backend name or instance, probed if None.
+        opt (str, optional): Optimization level ('0', '1', '2', '3' or 'lto').
+        shared_runtime (bool): Link against the runtime as a shared library.
+        cache (PYTOCCache.BuildCache, optional): Build cache to consult before compiling.
+        auto_run (bool): Run the program after every successful build.
+        interval (float): Seconds between checks for changes.
+        fold (bool): Run constant folding and dead code elimination before transpiling.
+        unbuffered (bool): Flush stdout after every print() instead of buffering output.
+        profile (bool): Time every user function and print a report when the program exits.
+        inline_threshold (int): Largest function body, in expression nodes, inlined at call sites; 0 disables inlining.
+        trace_alloc (bool): Count every runtime allocation and print a summary when the program exits.
+    """
+    parser = PYTOCIncremental.IncrementalParser()
+    function_cache = {}
+    last_mtime = None
+    print(f"Watching {os.path.abspath(source_file)} (Ctrl+C to stop)")
+    while True:
+        try:
+            mtime = os.stat(source_file).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime is None or mtime == last_mtime:
+            time.sleep(interval)
+            continue
+        last_mtime = mtime
+
+        start = time.perf_counter()
+        with open(source_file, 'r', encoding='utf-8') as f:
+            source_code = f.read()
+        try:
+            key = None
+            if cache is not None:
+                key = cache.key(source_code, backend, arch, compiler_flags=compiler_flags, opt=opt, debug=debug,
+                                shared_runtime=shared_runtime, fold=fold, unbuffered=unbuffered, profile=profile,
+                                trace_alloc=trace_alloc, inline_threshold=inline_threshold)
+            if key is not None and cache.fetch(key, output_file):
+                success, message = True, f"Compilation successful (cached): {os.path.abspath(output_file)}"
+            else:
+                tree = parser.parse(source_code)
+                c_code = python_to_c(source_code, debug=debug, tree=tree, function_cache=function_cache, fold=fold,
+                                     unbuffered=unbuffered, profile=profile, inline_threshold=inline_threshold)
+                if key is not None:
+                    cache.prepare_output(output_file)
+                success, message = compile_c(c_code, output_file, compiler_flags=compiler_flags, debug=debug,
+                                             arch=arch, backend=backend, opt=opt, shared_runtime=shared_runtime,
+                                             trace_alloc=trace_alloc)
+                if success and key is not None:
+                    cache.store(key, output_file)
+                message += f" (re-parsed {parser.parsed}, reused {parser.reused} top-level chunks)"
+        except Exception as e:
+            success = False
+            message = f"{os.path.abspath(source_file)}: {e.__class__.__name__}: {e}"
+        print(f"[{time.strftime('%H:%M:%S')}] {message} in {time.perf_counter() - start:.3f}s")
+        if cache is not None:
+            cache.save_stats()
+
+        if success and auto_run:
+            subprocess.run([os.path.abspath(output_file)])
+
+
+def collect_sources(spec):
+    """
+    Expands a batch specification into (source_file, relative_output_name) pairs.
+
+    Args:
+        spec (str): A directory (searched recursively for .py files), a glob pattern,
+            or a manifest file listing one source per line, optionally followed by
+            a tab and an output name. Blank lines and lines starting with '#' are ignored.
+
+    Returns:
+        list: Sorted list of (source_file, output_name) tuples.
+    """
+    sources = []
+    if os.path.isdir(spec):
+        for path in sorted(glob.glob(os.path.join(spec, "**", "*.py"), recursive=True)):
+            sources.append((path, os.path.splitext(os.path.relpath(path, spec))[0]))
+    elif glob.has_magic(spec):
+        for path in sorted(glob.glob(spec, recursive=True)):
+            if os.path.isfile(path):
+                sources.append((path, os.path.splitext(os.path.basename(path))[0]))
+    elif os.path.isfile(spec):
+        base = os.path.dirname(os.path.abspath(spec))
+        with open(spec, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.rstrip("\n")
+                if not line.strip() or line.lstrip().startswith("#"):
+                    continue
+                source, _, output = line.partition("\t")
+                source = os.path.join(base, source.strip())
+                output = output.strip() or os.path.splitext(os.path.basename(source))[0]
+                sources.append((source, output))
+    return sources
+
+
+def _transpile_job(source_file, debug=False, fold=True, unbuffered=False, profile=False,
+                   inline_threshold=PYTOCInliner.DEFAULT_THRESHOLD):
+    # Runs in a worker process; returns the C code and the time spent producing it.
+    start = time.perf_counter()
+    with open(source_file, 'r', encoding='utf-8') as f:
+        source_code = f.read()
+    c_code = python_to_c(source_code, debug=debug, fold=fold, unbuffered=unbuffered, profile=profile,
+                         inline_threshold=inline_threshold)
+    return source_code, c_code, time.perf_counter() - start
+
+
+def compile_batch(sources, output_dir, jobs=None, compiler_flags=None, debug=False, arch='32', backend=None, opt=None,
+                  shared_runtime=False, cache=None, fold=True, unbuffered=False, profile=False,
+                  trace_alloc=False, inline_threshold=PYTOCInliner.DEFAULT_THRESHOLD):
+    """
+    Compiles many Python scripts, overlapping transpilation and C compilation.
+
+    Transpilation fans out across a process pool; each finished file is handed to
+    a thread pool that drives the C compiler, so one file is compiled while others
+    are still being transpiled.
+
+    Args:
+        sources (list): (source_file, output_name) pairs, see `collect_sources`.
+        output_dir (str): Directory receiving the executables.
+        jobs (int, optional): Number of parallel workers (defaults to the CPU count).
+        compiler_flags (list, optional): Additional flags to pass to the compiler.
+        debug (bool): If True, include debug symbols.
+        arch (str): Target architecture mode ('32' or '64').
+        backend (str | PYTOCBackend.Backend, optional): Backend name or instance, probed if None.
+        opt (str, optional): Optimization level ('0', '1', '2', '3' or 'lto').
+        shared_runtime (bool): Link against the runtime as a shared library.
+        cache (PYTOCCache.BuildCache, optional): Build cache to consult before compiling.
+        fold (bool): Run constant folding and dead code elimination before transpiling.
+        unbuffered (bool): Flush stdout after every print() instead of buffering output.
+        profile (bool): Time every user function and print a report when the program exits.
+        inline_threshold (int): Largest function body, in expression nodes, inlined at call sites; 0 disables inlining.
+        trace_alloc (bool): Count every runtime allocation and print a summary when the program exits.
+
+    Returns:
+        list: One dict per source with keys 'source', 'output', 'success', 'message',
+            'cached', 'transpile_time', 'compile_time'.
+    """
+    jobs = jobs or os.cpu_count() or 1
+    if not isinstance(backend, PYTOCBackend.Backend):
+        backend = PYTOCBackend.find_backend(backend, arch)
+    if backend is None:
+        raise RuntimeError(f"No C compiler found for {arch}-bit. Install tcc, gcc or clang.")
+
+    # Build the runtime once up front instead of racing to build it in every job.
+    success, runtime_library = PYTOCRuntime.build_runtime(backend, opt=opt, debug=debug, shared=shared_runtime,
+                                                          trace_alloc=trace_alloc)
+    if not success:
+        raise RuntimeError(runtime_library)
+
+    results = []
+    pending = {}
+    compiles = {}
+
+    def finish_compile(result, key, c_code):
+        start = time.perf_counter()
+        result["success"], result["message"] = compile_c(
+            c_code, result["output"], compiler_flags=compiler_flags, debug=debug, arch=arch,
+            backend=backend, opt=opt, shared_runtime=shared_runtime, trace_alloc=trace_alloc)
+        result["compile_time"] = time.perf_counter() - start
+        if result["success"] and key is not None:
+            cache.store(key, result["output"])
+        return result
+
+    with ProcessPoolExecutor(max_workers=jobs) as transpilers, ThreadPoolExecutor(max_workers=jobs) as compilers:
+        for source_file, output_name in sources:
+            output_file = os.path.join(output_dir, output_name)
+            if not os.path.splitext(output_file)[1]:
+                output_file += backend.exe_suffix
+            os.makedirs(os.path.dirname(os.path.abspath(output_file)), exist_ok=True)
+            result = {"source": source_file, "output": output_file, "success": False, "message": "",
+                      "cached": False, "transpile_time": 0.0, "compile_time": 0.0}
+            results.append(result)
+
+            key = None
+            if cache is not None:
+                try:
+                    with open(source_file, 'r', encoding='utf-8') as f:
+                        source_code = f.read()
+                except OSError as e:
+                    result["message"] = f"{e.__class__.__name__}: {e}"
+                    continue
+                key = cache.key(source_code, backend, arch, compiler_flags=compiler_flags, opt=opt, debug=debug,
+                                shared_runtime=shared_runtime, fold=fold, unbuffered=unbuffered, profile=profile,
+                                trace_alloc=trace_alloc, inline_threshold=inline_threshold)
+                if cache.fetch(key, output_file):
+                    result["success"] = True
+                    result["cached"] = True
+                    result["message"] = f"Compilation successful (cached): {os.path.abspath(output_file)}"
+                    continue
+                cache.prepare_output(output_file)
+            pending[transpilers.submit(_transpile_job, source_file, debug, fold, unbuffered, profile,
+                                     inline_threshold)] = (result, key)
+
+        for future in as_completed(pending):
+            result, key = pending[future]
+            try:
+                _, c_code, result["transpile_time"] = future.result()
+            except Exception as e:
+                result["message"] = f"{os.path.abspath(result['source'])}: {e.__class__.__name__}: {e}"
+                continue
+            compiles[compilers.submit(finish_compile, result, key, c_code)] = result
+
+        for future in as_completed(compiles):
+            try:
+                future.result()
+            except Exception as e:
+                result = compiles[future]
+                result["message"] = f"{os.path.abspath(result['source'])}: {e.__class__.__name__}: {e}"
+
+    return results
+
+
+def print_batch_summary(results, wall_time):
+    width = max((len(r["source"]) for r in results), default=0)
+    print(f"{'Source'.ljust(width)}  Status   Transpile  Compile")
+    for r in results:
+        status = "cached" if r["cached"] else ("ok" if r["success"] else "FAILED")
+        print(f"{r['source'].ljust(width)}  {status.ljust(7)}  {r['transpile_time']:8.3f}s  {r['compile_time']:6.3f}s")
+    failures = [r for r in results if not r["success"]]
+    for r in failures:
+        print(f"\n{r['message']}")
+    transpile_total = sum(r["transpile_time"] for r in results)
+    compile_total = sum(r["compile_time"] for r in results)
+    print(f"\n{len(results) - len(failures)} succeeded, {len(failures)} failed, "
+          f"{sum(r['cached'] for r in results)} cached in {wall_time:.3f}s "
+          f"(cumulative transpile {transpile_total:.3f}s, compile {compile_total:.3f}s)")
+
+
 def main():
     args = sys.argv[1:]
     compiler_flags = []
     debug = False
     architecture = str(struct.calcsize("P") * 8)
     auto_run = False
+    backend_name = None
+    opt = None
+    use_cache = True
+    cache_dir = None
+    cache_size = PYTOCCache.DEFAULT_MAX_SIZE
+    shared_runtime = False
+    batch = False
+    watch_mode = False
+    jobs = None
+    fold = True
+    unbuffered = False
+    profile = False
+    trace_alloc = False
+    inline_threshold = PYTOCInliner.DEFAULT_THRESHOLD
     if "-h" in args or "--help" in args:
-        print("Usage: python main.py <source_file.py> <output_file.exe> [compiler_flags] [--debug] [--arch <32|64>] [--auto-run] [--version | -v]")
+        print("Usage: python main.py <source_file.py> <output_file.exe> [compiler_flags] [--debug] [--arch=<32|64>] "
+              f"[--backend=<auto|{'|'.join(PYTOCBackend.BACKENDS)}>] [--opt=<{'|'.join(PYTOCBackend.OPT_LEVELS)}>] "
+              "[--shared-runtime] [--no-fold] [--unbuffered] [--profile] [--trace-alloc] [--inline-threshold=N] [--no-cache] [--cache-dir=<dir>] [--cache-size=<MB>] [--cache-stats] [--watch] [--auto-run] [--version | -v]")
+        print("       python main.py <directory|glob|manifest> <output_dir> --batch [-j N] [options]")
         sys.exit(0)
+    for arg in args:
+        if arg.startswith("--arch="):
+            architecture = arg.split("=")[1]
+        elif arg.startswith("--backend="):
+            backend_name = arg.split("=")[1]
+        elif arg.startswith("--opt="):
+            opt = arg.split("=")[1]
+        elif arg == "--no-cache":
+            use_cache = False
+        elif arg.startswith("--cache-dir="):
+            cache_dir = arg.split("=", 1)[1]
+        elif arg.startswith("--cache-size="):
+            cache_size = int(float(arg.split("=")[1]) * 1024 * 1024)
+
+    if "--cache-stats" in args:
+        stats = PYTOCCache.BuildCache(cache_dir, max_size=cache_size).stats()
+        print(f"Cache directory: {stats['cache_dir']}")
+        print(f"Entries: {stats['entries']}, Size: {stats['size'] / (1024 * 1024):.1f} MB "
+              f"of {stats['max_size'] / (1024 * 1024):.1f} MB")
+        print(f"Hits: {stats['hits']}, Misses: {stats['misses']}, Hit rate: {stats['hit_rate']:.1%}, "
+              f"Stores: {stats['stores']}, Evictions: {stats['evictions']}")
+        sys.exit(0)
+
+    try:
+        backend = PYTOCBackend.find_backend(backend_name, architecture)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
     if "-v" in args or "--version" in args:
-        tcc_path = os.path.abspath(os.path.join(os.path.dirname(__file__), f"tcc/tcc-win{architecture}/tcc.exe"))
-        print(f"Version: {VERSION}, Recommended Python version: {REQUIRED_PYTHON_VERSION} (or higher), TCC version: {os.popen(f'{tcc_path} -v').read().removeprefix('tcc version ').removesuffix("\n")}")
+        backend_version = backend.version() if backend else "not found"
+        print(f"Version: {VERSION}, Recommended Python version: {REQUIRED_PYTHON_VERSION} (or higher), Backend version: {backend_version}")
         print(f"Python version: {sys.version}")
         print(f"Architecture: {architecture}-bit")
-        print(f"TCC path: {tcc_path}")
+        print(f"Backend: {backend.name if backend else 'none'}")
+        print(f"Backend path: {backend.path if backend else 'none'}")
         print(f"Using python at {sys.executable}")
         sys.exit(0)
     if len(args) < 2:
@@ -163,33 +519,91 @@ def main():
         sys.exit(1)
     source_file = args[0]
     output_file = args[1]
-    for arg in args[2:]:
+    rest = iter(args[2:])
+    for arg in rest:
         if arg.startswith("--"):
-            if arg == "--debug":
+            if arg == "--batch":
+                batch = True
+            elif arg == "--watch":
+                watch_mode = True
+            elif arg.startswith("--jobs="):
+                jobs = int(arg.split("=")[1])
+            elif arg == "--debug":
                 debug = True
-            elif arg.startswith("--arch"):
-                architecture = arg.split("=")[1]
+            elif arg.startswith(("--arch", "--backend=", "--opt=", "--cache-dir=", "--cache-size=")) or arg == "--no-cache":
+                pass
             elif arg == "--auto-run":
                 auto_run = True
+            elif arg == "--shared-runtime":
+                shared_runtime = True
+            elif arg == "--no-fold":
+                fold = False
+            elif arg == "--unbuffered":
+                unbuffered = True
+            elif arg == "--profile":
+                profile = True
+            elif arg == "--trace-alloc":
+                trace_alloc = True
+            elif arg.startswith("--inline-threshold="):
+                inline_threshold = int(arg.split("=")[1])
             else:
                 print(f"Error: Unknown argument '{arg}'.")
                 sys.exit(1)
+        elif arg == "-j":
+            jobs = int(next(rest, "0")) or None
+        elif arg.startswith("-j") and arg[2:].isdigit():
+            jobs = int(arg[2:])
         elif arg.startswith("-"):
             compiler_flags.append(arg)
         else:
             compiler_flags.append(arg)
 
-    if not os.path.isfile(source_file):
+    if not batch and not os.path.isfile(source_file):
         print(f"Error: Source file '{source_file}' not found.")
         sys.exit(1)
 
-    if not os.path.splitext(output_file)[1]:
-        output_file += ".exe"
-
     if architecture not in ['32', '64']:
         print("Error: Architecture must be '32' or '64'.")
         sys.exit(1)
 
+    if backend is None:
+        print(f"Error: No C compiler found for {architecture}-bit. Install tcc, gcc or clang, or pass --backend.")
+        sys.exit(1)
+
+    if opt is not None and opt not in PYTOCBackend.OPT_LEVELS:
+        print(f"Error: Optimization level must be one of: {', '.join(PYTOCBackend.OPT_LEVELS)}.")
+        sys.exit(1)
+
+    cache = PYTOCCache.BuildCache(cache_dir, max_size=cache_size) if use_cache else None
+
+    if batch:
+        sources = collect_sources(source_file)
+        if not sources:
+            print(f"Error: No Python sources found for '{source_file}'.")
+            sys.exit(1)
+        start = time.perf_counter()
+        try:
+            results = compile_batch(sources, output_file, jobs=jobs, compiler_flags=compiler_flags, debug=debug,
+                                    arch=architecture, backend=backend, opt=opt, shared_runtime=shared_runtime,
+                                    cache=cache, fold=fold, unbuffered=unbuffered, profile=profile,
+                                    trace_alloc=trace_alloc, inline_threshold=inline_threshold)
+        except RuntimeError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        print_batch_summary(results, time.perf_counter() - start)
+        if cache is not None:
+            cache.save_stats()
+        sys.exit(0 if all(r["success"] for r in results) else 1)
+
+    if not os.path.splitext(output_file)[1]:
+        output_file += backend.exe_suffix
+
+    if watch_mode:
+        watch(source_file, output_file, compiler_flags=compiler_flags, debug=debug, arch=architecture,
+              backend=backend, opt=opt, shared_runtime=shared_runtime, cache=cache, auto_run=auto_run, fold=fold,
+              unbuffered=unbuffered, profile=profile, trace_alloc=trace_alloc,
+              inline_threshold=inline_threshold)
+
     with open(source_file, 'r', encoding='utf-8') as f:
         source_code = f.read()
     if debug:
@@ -197,11 +611,19 @@ def main():
         print(source_code)
 
     try:
-        success, message = compile_py_to_c(source_code, output_file, compiler_flags=compiler_flags, debug=debug, arch=architecture)
+        success, message = compile_py_to_c(source_code, output_file, compiler_flags=compiler_flags, debug=debug,
+                                           arch=architecture, backend=backend, opt=opt,
+                                           shared_runtime=shared_runtime, cache=cache, fold=fold,
+                                           unbuffered=unbuffered, profile=profile, trace_alloc=trace_alloc,
+                                           inline_threshold=inline_threshold)
     except Exception as e:
         success = False
         message = f"{os.path.abspath(source_file)}: {e.__class__.__name__}: {e}"
     print(f"{message}")
+    if cache is not None:
+        if debug:
+            print(f"[DEBUG] Cache hits: {cache.hits}, misses: {cache.misses}, evictions: {cache.evictions}")
+        cache.save_stats()
 
     if not success:
         sys.exit(1)
@@ -209,7 +631,7 @@ def main():
     if auto_run:
         print(f"Running the compiled program: {output_file}")
         try:
-            subprocess.run([output_file], check=True)
+            subprocess.run([os.path.abspath(output_file)], check=True)
         except subprocess.CalledProcessError as e:
             print(f"Error running the compiled program: {e}")
             sys.exit(1)
@@ -12,9 +12,63 @@ def test_range_negative_step():
     assert list(range(5, -1, -1)) == [5, 4, 3, 2, 1, 0]
     assert list(range(0, -5, -1)) == [0, -1, -2, -3, -4]
 
+def test_string_iadd():
+    text = ""
+    for i in range(10000):
+        text += str(i % 10)
+    assert len(text) == 10000
+    assert text[0] == "0"
+    assert text[11] == "1"
+    assert text[9999] == "9"
+    copy = text
+    text += "!"
+    assert len(copy) == 10000
+    assert len(text) == 10001
+
+def test_rebound_variable():
+    total = 0
+    for i in range(10):
+        total += i
+    assert total == 45
+    total = "sum=" + str(total)
+    assert total == "sum=45"
+    scale = 2
+    scale = scale * 1.5
+    assert scale == 3.0
+
+def test_fstring_constants():
+    # Folded at compile time unless built with --no-fold; both must agree.
+    count = 3
+    flag = True
+    nothing = None
+    assert f"{count} {flag} {nothing} {'s'} {-7}" == "3 True None s -7"
+    assert f"{False}!" == "False!"
+
+def record_call(log):
+    log.append(len(log))
+    return (len(log), len(log) * 10)
+
+def test_map_unpacking_calls_once():
+    log = []
+    seen = []
+    for count, tens in map(record_call, [log, log, log]):
+        seen.append(count + tens)
+    assert len(log) == 3
+    assert seen == [11, 22, 33]
+    for i, (count, tens) in enumerate(map(record_call, [log, log])):
+        assert count == i + 4
+    assert len(log) == 5
+    pairs = [count * tens for count, tens in map(record_call, [log])]
+    assert pairs == [360]
+    assert len(log) == 6
+
 def run_all_tests():
     test_range_basic()
     test_range_negative_step()
+    test_string_iadd()
+    test_rebound_variable()
+    test_fstring_constants()
+    test_map_unpacking_calls_once()
     print("All range() tests passed!")
 
 run_all_tests()
\ No newline at end of file